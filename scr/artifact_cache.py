@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+产物缓存模块 - 按内容寻址持久化保存处理后的ICO/PNG
+
+缓存键由源文件内容、TARGET_SIZES、蒙版形状参数和流程版本共同决定，
+已处理过的图片再次处理时只需计算一次哈希并查找文件。
+多个进程（界面与批处理）通过文件锁安全共享同一缓存目录；结果在持有锁时复制到调用方的输出目录，
+之后其他进程淘汰缓存条目也不影响已返回的文件。
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+from config import (ARTIFACT_CACHE_DIR, ARTIFACT_CACHE_MAX_BYTES, PIPELINE_VERSION,
+                    TARGET_SIZES, MASK_SHAPE, MASK_SHAPE_PARAMS)
+from icon_processor import process_icon
+
+ICO_NAME = 'boot_icon.ico'
+PNG_NAME = 'boot_icon.png'
+LOCK_NAME = '.lock'
+TEMP_PREFIX = 'tmp-'
+STALE_TEMP_SECONDS = 3600
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def compute_cache_key(input_path, shape=MASK_SHAPE):
+    """计算缓存键：源文件内容 + 处理参数 + 流程版本"""
+    digest = hashlib.sha256()
+    with open(input_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    params = {
+        "sizes": [list(size) for size in TARGET_SIZES],
+        "shape": shape,
+        "shape_params": MASK_SHAPE_PARAMS.get(shape, {}),
+        "version": PIPELINE_VERSION,
+    }
+    digest.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+@contextmanager
+def cache_lock(cache_dir):
+    """跨进程独占锁（Windows使用msvcrt，其他平台使用fcntl）"""
+    os.makedirs(cache_dir, exist_ok=True)
+    fd = os.open(os.path.join(cache_dir, LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            while True:
+                try:
+                    # LK_LOCK 内部重试约10秒，仍失败时继续等待
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.1)
+        else:
+            import fcntl
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+
+def _entry_paths(entry_dir):
+    """返回缓存条目中的ICO与PNG路径"""
+    return os.path.join(entry_dir, ICO_NAME), os.path.join(entry_dir, PNG_NAME)
+
+
+def _entry_size(entry_dir):
+    """统计缓存条目占用的字节数"""
+    total = 0
+    for name in os.listdir(entry_dir):
+        try:
+            total += os.path.getsize(os.path.join(entry_dir, name))
+        except OSError:
+            pass
+    return total
+
+
+def lookup(key, cache_dir=ARTIFACT_CACHE_DIR, need_png=True):
+    """查找缓存条目，命中时更新其使用时间并返回 (ico, png)，否则返回None
+
+    条目可以只有ICO（交互流程不需要PNG），此时返回的png为None；need_png 为True时只有ICO视为未命中。
+    """
+    entry_dir = os.path.join(cache_dir, key)
+    ico_path, png_path = _entry_paths(entry_dir)
+    if not os.path.isfile(ico_path):
+        return None
+    if not os.path.isfile(png_path):
+        if need_png:
+            return None
+        png_path = None
+    try:
+        os.utime(entry_dir)
+    except OSError:
+        pass
+    return ico_path, png_path
+
+
+def evict(cache_dir=ARTIFACT_CACHE_DIR, max_bytes=ARTIFACT_CACHE_MAX_BYTES, keep=None):
+    """按最近使用时间淘汰缓存条目直至总大小不超过上限（需在持有锁时调用）"""
+    entries = []
+    now = time.time()
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if not os.path.isdir(path):
+            continue
+        mtime = os.path.getmtime(path)
+        if name.startswith(TEMP_PREFIX):
+            # 清理崩溃进程遗留的临时目录
+            if now - mtime > STALE_TEMP_SECONDS:
+                shutil.rmtree(path, ignore_errors=True)
+            continue
+        entries.append((mtime, name, _entry_size(path)))
+
+    total = sum(size for _, _, size in entries)
+    removed = []
+    for _, name, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        if name == keep:
+            continue
+        shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+        total -= size
+        removed.append(name)
+    return removed
+
+
+def _export(hit, output_dir):
+    """把缓存条目中的文件复制到输出目录（需在持有锁时调用），返回复制后的 (ico, png)
+
+    复制而不是硬链接：调用方可能原地修改结果（如批处理优化ICO），不能影响缓存。
+    """
+    exported = []
+    for path in hit:
+        if path is None:
+            exported.append(None)
+            continue
+        target = os.path.join(output_dir, os.path.basename(path))
+        shutil.copyfile(path, target)
+        exported.append(target)
+    return tuple(exported)
+
+
+def process_icon_cached(input_path, output_dir, session=None, cache_dir=ARTIFACT_CACHE_DIR,
+                        max_bytes=ARTIFACT_CACHE_MAX_BYTES, save_png=True):
+    """带缓存的process_icon，把结果复制到 output_dir 并返回其中的 (ico, png) 路径
+
+    save_png 为False时不要求也不生成PNG（已缓存的PNG仍会复制），没有PNG时png为None。
+    """
+    try:
+        key = compute_cache_key(input_path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"图片文件不存在: {input_path}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    with cache_lock(cache_dir):
+        hit = lookup(key, cache_dir, need_png=save_png)
+        if hit:
+            return _export(hit, output_dir)
+
+    # 在锁外处理图片，避免多个进程互相等待；完成后原子地移动到最终位置
+    temp_dir = tempfile.mkdtemp(prefix=TEMP_PREFIX, dir=cache_dir)
+    try:
+        process_icon(input_path, temp_dir, session=session, save_png=save_png)
+        with cache_lock(cache_dir):
+            entry_dir = os.path.join(cache_dir, key)
+            if lookup(key, cache_dir, need_png=save_png) is None:
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                os.replace(temp_dir, entry_dir)
+            evict(cache_dir, max_bytes, keep=key)
+            return _export(lookup(key, cache_dir, need_png=save_png), output_dir)
+    finally:
+        if os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir, ignore_errors=True)
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+备份仓库模块 - 按内容分块去重的系统文件持久化备份
+
+文件按滚动哈希（窗口为32字节的gear哈希）确定的内容边界切块，每个不同的块只保存一次，
+并在线程池中用zlib/lzma压缩。每次备份只是一份记录块列表的清单，
+因此同一DLL的多个版本几乎只占用一份空间；恢复时按清单顺序流式解压写回。
+
+目录结构:
+    chunks/ab/<sha256>              压缩后的块（首字节为压缩方式）
+    manifests/<文件名>/<时间>.json   备份清单
+"""
+
+import hashlib
+import json
+import lzma
+import mmap
+import os
+import random
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from config import (BACKUP_STORE_DIR, BACKUP_CHUNK_MIN_SIZE, BACKUP_CHUNK_AVG_BITS,
+                    BACKUP_CHUNK_MAX_SIZE, BACKUP_COMPRESSION, BACKUP_COMPRESSION_LEVEL,
+                    BACKUP_COMPRESS_WORKERS)
+
+CHUNKER_VERSION = 1
+HASH_WINDOW = 32
+HASH_SEGMENT_SIZE = 8 * 1024 * 1024
+MANIFEST_VERSION = 1
+
+# 固定种子生成的gear表，改变会导致分块边界变化，需同时修改 CHUNKER_VERSION
+_rng = random.Random(0x1C0AB)
+_GEAR = np.array([_rng.getrandbits(32) for _ in range(256)], dtype=np.uint32)
+del _rng
+
+CODEC_RAW = b'r'
+CODEC_ZLIB = b'z'
+CODEC_LZMA = b'x'
+
+
+def _window_hashes(data):
+    """计算每个位置上最近32字节的gear哈希
+
+    h[i] = sum(G[b[i-k]] << k, k=0..31)，用倍增法只需 log2(32) 次整体移位相加。
+    """
+    hashes = _GEAR.take(data)
+    shifted = np.empty_like(hashes)
+    shift = 1
+    while shift < HASH_WINDOW:
+        count = len(hashes) - shift
+        np.left_shift(hashes[:count], np.uint32(shift), out=shifted[:count])
+        np.add(hashes[shift:], shifted[:count], out=hashes[shift:])
+        shift *= 2
+    return hashes
+
+
+def find_boundaries(buffer, min_size=BACKUP_CHUNK_MIN_SIZE, avg_bits=BACKUP_CHUNK_AVG_BITS,
+                    max_size=BACKUP_CHUNK_MAX_SIZE):
+    """返回各块的结束偏移列表（最后一项为文件大小）"""
+    view = memoryview(buffer).cast('B')
+    size = len(view)
+    mask = np.uint32(((1 << avg_bits) - 1) << (32 - avg_bits))
+
+    # 分段计算候选边界，每段带上前一段末尾的窗口上下文，内存占用与文件大小无关
+    candidates = []
+    for start in range(0, size, HASH_SEGMENT_SIZE):
+        context = min(start, HASH_WINDOW - 1)
+        end = min(size, start + HASH_SEGMENT_SIZE)
+        data = np.frombuffer(view[start - context:end], dtype=np.uint8)
+        hashes = _window_hashes(data)[context:]
+        candidates.append(np.flatnonzero((hashes & mask) == 0) + start + 1)
+        del data, hashes
+    view.release()
+
+    boundaries = []
+    last = 0
+    for cut in (np.concatenate(candidates).tolist() if candidates else []):
+        while cut - last > max_size:
+            last += max_size
+            boundaries.append(last)
+        if cut - last >= min_size:
+            boundaries.append(cut)
+            last = cut
+    while size - last > max_size:
+        last += max_size
+        boundaries.append(last)
+    if last < size:
+        boundaries.append(size)
+    return boundaries
+
+
+def _chunk_path(store_dir, chunk_hash):
+    return os.path.join(store_dir, 'chunks', chunk_hash[:2], chunk_hash)
+
+
+def _compress(data, codec=BACKUP_COMPRESSION, level=BACKUP_COMPRESSION_LEVEL):
+    """压缩数据块，压缩无收益时原样保存"""
+    if codec == 'lzma':
+        packed = CODEC_LZMA + lzma.compress(data, preset=level)
+    elif codec == 'zlib':
+        packed = CODEC_ZLIB + zlib.compress(data, level)
+    else:
+        raise ValueError(f"不支持的压缩方式: {codec}")
+    if len(packed) >= len(data) + 1:
+        return CODEC_RAW + bytes(data)
+    return packed
+
+
+def _decompress(packed):
+    """解压数据块"""
+    codec, payload = packed[:1], packed[1:]
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(payload)
+    if codec == CODEC_LZMA:
+        return lzma.decompress(payload)
+    if codec == CODEC_RAW:
+        return payload
+    raise ValueError("备份块格式无效")
+
+
+def _store_chunk(store_dir, view, start, end):
+    """计算块哈希，仓库中不存在时压缩并写入，返回 (哈希, 新写入的字节数)"""
+    chunk = view[start:end]
+    try:
+        chunk_hash = hashlib.sha256(chunk).hexdigest()
+        path = _chunk_path(store_dir, chunk_hash)
+        if os.path.exists(path):
+            return chunk_hash, 0
+        packed = _compress(chunk)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(packed)
+        os.replace(temp_path, path)
+        return chunk_hash, len(packed)
+    finally:
+        chunk.release()
+
+
+def store_file(path, store_dir=BACKUP_STORE_DIR, name=None, progress_callback=None):
+    """把文件备份到仓库，返回 (清单路径, 统计信息)
+
+    progress_callback(已处理字节数, 总字节数) 在每个块处理完成后调用。
+    """
+    name = name or os.path.basename(path)
+    started = time.perf_counter()
+    size = os.path.getsize(path)
+    file_digest = hashlib.sha256()
+    chunks = []
+    stored_bytes = 0
+
+    with open(path, 'rb') as f:
+        if size:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(mm)
+        else:
+            mm, view = None, memoryview(b'')
+        try:
+            boundaries = find_boundaries(view)
+            with ThreadPoolExecutor(max_workers=BACKUP_COMPRESS_WORKERS) as executor:
+                futures = []
+                start = 0
+                for end in boundaries:
+                    futures.append((end - start, executor.submit(_store_chunk, store_dir, view, start, end)))
+                    start = end
+                # 整体哈希与块压缩并行进行（hashlib 和 zlib 都会释放GIL）
+                for offset in range(0, size, HASH_SEGMENT_SIZE):
+                    piece = view[offset:offset + HASH_SEGMENT_SIZE]
+                    file_digest.update(piece)
+                    piece.release()
+                done = 0
+                for chunk_size, future in futures:
+                    chunk_hash, written = future.result()
+                    chunks.append([chunk_hash, chunk_size])
+                    stored_bytes += written
+                    done += chunk_size
+                    if progress_callback:
+                        progress_callback(done, size)
+        finally:
+            view.release()
+            if mm is not None:
+                mm.close()
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "name": name,
+        "source": os.path.abspath(path),
+        "size": size,
+        "sha256": file_digest.hexdigest(),
+        "created": datetime.now().isoformat(timespec='seconds'),
+        "chunker": {
+            "version": CHUNKER_VERSION,
+            "min": BACKUP_CHUNK_MIN_SIZE,
+            "avg_bits": BACKUP_CHUNK_AVG_BITS,
+            "max": BACKUP_CHUNK_MAX_SIZE,
+        },
+        "chunks": chunks,
+    }
+    manifest_dir = os.path.join(store_dir, 'manifests', name)
+    os.makedirs(manifest_dir, exist_ok=True)
+    manifest_path = os.path.join(manifest_dir, datetime.now().strftime('%Y%m%d-%H%M%S-%f') + '.json')
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, manifest_path)
+
+    stats = {
+        "size": size,
+        "chunks": len(chunks),
+        "unique_chunks": len({h for h, _ in chunks}),
+        "stored_bytes": stored_bytes,
+        "seconds": round(time.perf_counter() - started, 4),
+    }
+    return manifest_path, stats
+
+
+def list_backups(store_dir=BACKUP_STORE_DIR, name=None):
+    """列出仓库中的备份清单路径（按时间从旧到新）"""
+    root = os.path.join(store_dir, 'manifests')
+    if not os.path.isdir(root):
+        return []
+    names = [name] if name else sorted(os.listdir(root))
+    result = []
+    for entry in names:
+        directory = os.path.join(root, entry)
+        if os.path.isdir(directory):
+            result.extend(os.path.join(directory, f) for f in sorted(os.listdir(directory)) if f.endswith('.json'))
+    return result
+
+
+def load_manifest(manifest_path):
+    """读取备份清单"""
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def restore_backup(manifest_path, destination, store_dir=BACKUP_STORE_DIR, progress_callback=None,
+                   expected_sha256=None):
+    """按清单流式恢复文件，逐块及整体校验SHA-256，返回目标路径
+
+    传入 expected_sha256 时整体哈希必须等于它，而不是清单中记录的值（清单所在目录可能被他人改写）。
+    """
+    manifest = load_manifest(manifest_path)
+    expected = expected_sha256 or manifest["sha256"]
+    file_digest = hashlib.sha256()
+    temp_path = destination + '.restoring'
+    done = 0
+    try:
+        with open(temp_path, 'wb') as output:
+            for chunk_hash, chunk_size in manifest["chunks"]:
+                try:
+                    with open(_chunk_path(store_dir, chunk_hash), 'rb') as f:
+                        data = _decompress(f.read())
+                except FileNotFoundError:
+                    raise FileNotFoundError(f"备份块缺失: {chunk_hash}")
+                if len(data) != chunk_size or hashlib.sha256(data).hexdigest() != chunk_hash:
+                    raise ValueError(f"备份块已损坏: {chunk_hash}")
+                file_digest.update(data)
+                output.write(data)
+                done += chunk_size
+                if progress_callback:
+                    progress_callback(done, manifest["size"])
+        if file_digest.hexdigest() != expected:
+            raise ValueError("恢复后的文件校验失败")
+        os.replace(temp_path, destination)
+        return destination
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
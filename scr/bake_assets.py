@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+资源烘焙脚本 - 预先生成界面启动时直接显示的资源
+
+界面启动时不再解码和缩放原图，而是直接显示已缩放到 PREVIEW_SIZE、铺好黑色背景的PNG，
+效果与界面中原来的绘制方式（等比缩放后居中绘制在黑色背景上）相同。
+原图或 PREVIEW_SIZE 变化后重新运行本脚本，并提交生成的文件。
+
+用法:
+    python bake_assets.py
+"""
+
+from PIL import Image
+
+from config import PREVIEW_SIZE, DEFAULT_PREVIEW_SOURCE, DEFAULT_PREVIEW_ASSET
+from utils import resource_path
+
+
+def bake_default_preview(source_path, output_path, size=PREVIEW_SIZE):
+    """把默认预览原图等比缩放后居中绘制在黑色背景上，保存为PNG"""
+    with Image.open(source_path) as image:
+        image = image.convert('RGBA')
+        image.thumbnail(size, Image.Resampling.LANCZOS)
+    canvas = Image.new('RGBA', size, (0, 0, 0, 255))
+    offset = ((size[0] - image.width) // 2, (size[1] - image.height) // 2)
+    canvas.alpha_composite(image, offset)
+    canvas.convert('RGB').save(output_path, 'PNG', optimize=True)
+    return output_path
+
+
+def main():
+    output = bake_default_preview(resource_path(*DEFAULT_PREVIEW_SOURCE), resource_path(*DEFAULT_PREVIEW_ASSET))
+    print(f"已生成: {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批处理入口 - 无界面批量生成系统图标
+
+用法示例:
+    python batch.py ~/Pictures/brands -o ./icons
+    python batch.py "assets/**/*.png" -o ./icons --workers 4
+
+不会导入PyQt5和ctypes.windll，可在Linux上直接运行。
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from config import BATCH_IMAGE_EXTENSIONS, BATCH_SUMMARY_FILENAME
+from icon_processor import process_icon
+from artifact_cache import process_icon_cached
+from image_probe import probe_image
+from ico_optimizer import optimize_ico_file
+
+# 退出码
+EXIT_OK = 0
+EXIT_PARTIAL_FAILURE = 1
+EXIT_NO_INPUT = 2
+
+
+def collect_sources(patterns):
+    """根据目录、通配符或文件路径收集源图片"""
+    sources = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, files in os.walk(pattern):
+                for name in files:
+                    if name.lower().endswith(BATCH_IMAGE_EXTENSIONS):
+                        sources.append(os.path.join(root, name))
+        elif os.path.isfile(pattern):
+            sources.append(pattern)
+        else:
+            for path in glob.glob(pattern, recursive=True):
+                if os.path.isfile(path) and path.lower().endswith(BATCH_IMAGE_EXTENSIONS):
+                    sources.append(path)
+
+    # 去重并保持稳定顺序
+    seen = set()
+    unique = []
+    for path in sorted(os.path.abspath(p) for p in sources):
+        if path not in seen:
+            seen.add(path)
+            unique.append(path)
+    return unique
+
+
+def assign_output_dirs(sources, output_root):
+    """为每个源图片分配独立的输出目录，同名文件追加序号"""
+    used = {}
+    assigned = []
+    for source in sources:
+        stem = os.path.splitext(os.path.basename(source))[0]
+        count = used.get(stem, 0) + 1
+        used[stem] = count
+        name = stem if count == 1 else f"{stem}_{count}"
+        assigned.append((source, os.path.join(output_root, name)))
+    return assigned
+
+
+def process_one(source, output_dir, use_cache=True, optimize=False):
+    """在工作进程中处理单个图片，所有异常都转换为结果记录"""
+    started = time.perf_counter()
+    result = {
+        "source": source,
+        "output_dir": output_dir,
+        "status": "ok",
+        "ico": None,
+        "png": None,
+        "error": None,
+    }
+    try:
+        # 损坏或被截断的文件只读取文件头就能排除，不必进入完整解码
+        probe_image(source)
+        os.makedirs(output_dir, exist_ok=True)
+        if use_cache:
+            # 命中缓存时只需计算哈希并复制结果
+            result["ico"], result["png"] = process_icon_cached(source, output_dir)
+        else:
+            result["ico"], result["png"] = process_icon(source, output_dir)
+        if optimize:
+            # 只优化输出目录中的副本，缓存中保留原始结果
+            result["optimize"] = optimize_ico_file(result["ico"])
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {str(e)}"
+    result["seconds"] = round(time.perf_counter() - started, 4)
+    return result
+
+
+def run_batch(sources, output_root, workers=None, use_cache=True, optimize=False):
+    """使用进程池并行处理所有源图片，返回汇总信息"""
+    workers = workers or os.cpu_count() or 1
+    workers = max(1, min(workers, len(sources)))
+    jobs = assign_output_dirs(sources, output_root)
+
+    started = time.perf_counter()
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(process_one, source, output_dir, use_cache, optimize): (source, output_dir)
+            for source, output_dir in jobs
+        }
+        for future in as_completed(futures):
+            source, output_dir = futures[future]
+            try:
+                results[source] = future.result()
+            except Exception as e:
+                # 工作进程异常退出等情况，同样只影响当前文件
+                results[source] = {
+                    "source": source,
+                    "output_dir": output_dir,
+                    "status": "error",
+                    "ico": None,
+                    "png": None,
+                    "error": f"{type(e).__name__}: {str(e)}",
+                    "seconds": None,
+                }
+
+    ordered = [results[source] for source, _ in jobs]
+    succeeded = sum(1 for r in ordered if r["status"] == "ok")
+    return {
+        "workers": workers,
+        "total": len(ordered),
+        "succeeded": succeeded,
+        "failed": len(ordered) - succeeded,
+        "wall_seconds": round(time.perf_counter() - started, 4),
+        "results": ordered,
+    }
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='批量将图片处理为Windows系统图标')
+    parser.add_argument('sources', nargs='+', help='源图片文件、目录或通配符')
+    parser.add_argument('-o', '--output', default='icon_output', help='输出根目录')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='工作进程数量（默认CPU核心数）')
+    parser.add_argument('--summary', default=None,
+                        help=f'JSON汇总文件路径（默认输出目录下的{BATCH_SUMMARY_FILENAME}，"-"表示标准输出）')
+    parser.add_argument('--no-cache', action='store_true', help='不使用持久化产物缓存，总是重新处理')
+    parser.add_argument('--optimize', action='store_true', help='优化输出ICO的体积（小尺寸调色板、PNG多策略压缩）')
+    parser.add_argument('--trace', metavar='PATH', help='记录各阶段耗时，写入 Chrome trace-event JSON（工作进程写入 PATH.<pid>.json）')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """批处理主函数，返回退出码"""
+    args = parse_args(argv)
+    if args.trace:
+        # 在创建进程池之前启用，工作进程通过环境变量继承
+        import tracing
+        tracing.enable(args.trace)
+
+    sources = collect_sources(args.sources)
+    if not sources:
+        print("未找到可处理的图片文件", file=sys.stderr)
+        return EXIT_NO_INPUT
+
+    output_root = os.path.abspath(args.output)
+    os.makedirs(output_root, exist_ok=True)
+
+    summary = run_batch(sources, output_root, args.workers, use_cache=not args.no_cache,
+                        optimize=args.optimize)
+    summary_text = json.dumps(summary, ensure_ascii=False, indent=2)
+
+    if args.summary == '-':
+        print(summary_text)
+    else:
+        summary_path = args.summary or os.path.join(output_root, BATCH_SUMMARY_FILENAME)
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            f.write(summary_text)
+        print(f"处理完成: 成功 {summary['succeeded']} / 共 {summary['total']}，汇总: {summary_path}",
+              file=sys.stderr)
+
+    return EXIT_OK if summary["failed"] == 0 else EXIT_PARTIAL_FAILURE
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+有界内存解码测量 - 验证超大源图片生成图标时的峰值内存不超过预算
+
+用法:
+    python bench_bounded_decode.py                     # 默认 12000x12000 PNG、50MP JPEG、BMP
+    python bench_bounded_decode.py --size 8000 --budget-mb 32 --skip-legacy
+
+每次测量在独立子进程中运行，峰值内存增量 = 最大常驻内存 - 导入模块后的常驻内存。
+任一输入的增量超过预算时退出码为1，可作为检查使用。
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_pyramid import peak_rss_mb
+
+SCRIPT = os.path.abspath(__file__)
+SCRIPT_DIR = os.path.dirname(SCRIPT)
+
+
+def current_rss_mb():
+    """返回当前常驻内存（MB），只支持Linux，其他平台返回None"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+    except (OSError, ValueError):
+        return None
+
+
+def measure(mode, path, budget_mb):
+    """在当前进程中生成一次图标并记录峰值内存"""
+    from PIL import Image
+    from bounded_decode import open_reduced
+    from icon_processor import largest_target_size, render_icon_images
+
+    # 导入和首次使用的开销计入基线
+    Image.new('RGBA', (16, 16)).reduce(2)
+    baseline = current_rss_mb() or peak_rss_mb()
+    started = time.perf_counter()
+    if mode == 'legacy':
+        with Image.open(path) as img:
+            render_icon_images(img.convert('RGBA'), img.size)
+    else:
+        # 与 process_icon 相同的流程（不写出文件）
+        img, source_size = open_reduced(path, largest_target_size(), budget=budget_mb * 1024 * 1024)
+        render_icon_images(img, source_size)
+    seconds = time.perf_counter() - started
+    peak = peak_rss_mb()
+    return {
+        "mode": mode,
+        "seconds": round(seconds, 3),
+        "baseline_rss_mb": baseline,
+        "peak_rss_mb": peak,
+        "delta_mb": round(peak - baseline, 1) if peak and baseline else None,
+    }
+
+
+def run_child(*args):
+    output = subprocess.run([sys.executable, SCRIPT] + [str(a) for a in args],
+                            capture_output=True, check=True, text=True, cwd=SCRIPT_DIR).stdout
+    return json.loads(output)
+
+
+def create_inputs(directory, size):
+    """生成超大测试图片：PNG（size x size）、约50MP的JPEG、BMP（size x size/2）"""
+    from PIL import Image
+
+    gradient = Image.linear_gradient('L').resize((size, size))
+    noise = Image.effect_noise((size, size), 24)
+    img = Image.merge('RGB', (gradient, noise, gradient.transpose(Image.Transpose.ROTATE_90)))
+    del gradient, noise
+    paths = {}
+    path = os.path.join(directory, f'giant_{size}.png')
+    img.save(path, 'PNG', compress_level=1)
+    paths['PNG'] = path
+
+    jpeg = img.resize((8660, 5773), Image.Resampling.NEAREST)
+    path = os.path.join(directory, 'giant_50mp.jpg')
+    jpeg.save(path, 'JPEG', quality=90)
+    paths['JPEG'] = path
+    del jpeg
+
+    path = os.path.join(directory, f'giant_{size}.bmp')
+    img.crop((0, 0, size, size // 2)).save(path, 'BMP')
+    paths['BMP'] = path
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='有界内存解码测量')
+    parser.add_argument('--size', type=int, default=12000, help='PNG测试图片边长')
+    parser.add_argument('--budget-mb', type=int, default=None, help='内存预算（MB），默认取配置值')
+    parser.add_argument('--skip-legacy', action='store_true', help='不测量完整解码的对照')
+    parser.add_argument('--child', nargs=3, metavar=('MODE', 'PATH', 'BUDGET'), help=argparse.SUPPRESS)
+    parser.add_argument('--make-inputs', metavar='DIR', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        mode, path, budget = args.child
+        print(json.dumps(measure(mode, path, int(budget))))
+        return
+    if args.make_inputs:
+        print(json.dumps(create_inputs(args.make_inputs, args.size)))
+        return
+
+    from config import DECODE_MEMORY_BUDGET
+    budget_mb = args.budget_mb or DECODE_MEMORY_BUDGET // (1024 * 1024)
+    exceeded = []
+    with tempfile.TemporaryDirectory(prefix='bench_bounded_') as directory:
+        # 测试图片在子进程中生成：Linux下fork出的子进程会继承父进程的峰值内存记录
+        inputs = run_child('--make-inputs', directory, '--size', args.size)
+        print(f"内存预算: {budget_mb}MB")
+        print(f"{'格式':<6}{'实现':<10}{'耗时(s)':>10}{'峰值增量(MB)':>16}{'结果':>8}")
+        for fmt, path in inputs.items():
+            modes = ['bounded'] if args.skip_legacy else ['legacy', 'bounded']
+            for mode in modes:
+                result = run_child('--child', mode, path, budget_mb)
+                verdict = ''
+                if mode == 'bounded':
+                    ok = result['delta_mb'] is not None and result['delta_mb'] <= budget_mb
+                    verdict = '通过' if ok else '超出'
+                    if not ok:
+                        exceeded.append(fmt)
+                print(f"{fmt:<6}{mode:<10}{result['seconds']:>10.3f}{result['delta_mb']:>16.1f}{verdict:>8}")
+    sys.exit(1 if exceeded else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PE校验和基准测试 - 对比NumPy分块实现与逐字循环参考实现
+
+用法:
+    python bench_checksum.py                       # 默认 1/8/64 MB 合成DLL
+    python bench_checksum.py --sizes 1 100 --reference-limit 8
+
+参考实现很慢，超过 --reference-limit（MB）的文件只测量NumPy实现。
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from pe_checksum import compute_checksum, checksum_reference
+from pe_fixtures import write_synthetic_dll
+
+
+def timed(func, *args):
+    """执行函数并返回 (结果, 耗时秒)"""
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PE校验和基准测试')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 8, 64], help='合成DLL大小（MB）')
+    parser.add_argument('--reference-limit', type=float, default=8, help='参考实现测量的最大文件大小（MB）')
+    args = parser.parse_args()
+
+    print(f"{'大小(MB)':>10}{'NumPy(s)':>12}{'吞吐(MB/s)':>14}{'参考(s)':>12}{'加速比':>10}{'一致':>6}")
+    with tempfile.TemporaryDirectory(prefix='bench_checksum_') as directory:
+        for size_mb in args.sizes:
+            path = os.path.join(directory, f'synthetic_{size_mb}.dll')
+            write_synthetic_dll(path, target_size=int(size_mb * 1024 * 1024))
+            actual_mb = os.path.getsize(path) / (1024 * 1024)
+
+            fast, fast_seconds = timed(compute_checksum, path)
+            if size_mb <= args.reference_limit:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                reference, reference_seconds = timed(checksum_reference, data)
+                print(f"{actual_mb:>10.1f}{fast_seconds:>12.4f}{actual_mb / fast_seconds:>14.1f}"
+                      f"{reference_seconds:>12.3f}{reference_seconds / fast_seconds:>10.1f}"
+                      f"{'是' if fast == reference else '否':>6}")
+            else:
+                print(f"{actual_mb:>10.1f}{fast_seconds:>12.4f}{actual_mb / fast_seconds:>14.1f}"
+                      f"{'-':>12}{'-':>10}{'-':>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图标处理基准测试 - 用确定性的合成图片语料测量 icon_processor 的主要函数
+
+用法:
+    python bench_icon_processor.py --quick                          # 小语料，输出结果表
+    python bench_icon_processor.py --save-baseline bench_baseline.json
+    python bench_icon_processor.py --compare bench_baseline.json    # 超出阈值时退出码为1
+
+语料覆盖方形和非方形、128~8192像素，RGB/RGBA/调色板/灰度，JPEG/PNG/BMP，
+由固定种子生成，同一Pillow版本下每次生成的文件完全相同，生成后缓存在 --corpus 目录。
+每个 (函数, 图片) 在独立子进程中测量：墙钟时间和CPU时间取多次运行中最快的一次，
+峰值内存为导入模块并准备好输入后的最大常驻内存增量。
+每次运行还会测量一个固定参考负载，对比时用它抵消机器整体变快或变慢的影响。
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_pyramid import peak_rss_mb
+from bench_bounded_decode import current_rss_mb
+
+SCRIPT = os.path.abspath(__file__)
+SCRIPT_DIR = os.path.dirname(SCRIPT)
+
+CORPUS_VERSION = 1
+CORPUS_SEED = 20240601
+SHAPES = [(128, 128), (512, 512), (2048, 2048), (8192, 8192), (384, 512), (2048, 1152), (8192, 4608)]
+QUICK_SHAPES = [(128, 128), (384, 512), (2048, 2048)]
+MODES = ('RGB', 'RGBA', 'P', 'L')
+# 各格式支持的模式
+FORMATS = {
+    'JPEG': ('jpg', ('RGB', 'L')),
+    'PNG': ('png', MODES),
+    'BMP': ('bmp', MODES),
+}
+FUNCTIONS = ('process_icon', 'create_rounded_icon', 'create_preview_icon')
+MANIFEST_NAME = 'corpus.json'
+
+# 回归判定：相对阈值之外再允许一点绝对误差，避免极小的数值因抖动误报
+TIME_SLACK_SECONDS = 0.005
+MEMORY_SLACK_MB = 2.0
+
+
+def corpus_spec(shapes):
+    """返回语料清单 [(名称, 宽, 高, 模式, 格式)]"""
+    spec = []
+    for width, height in shapes:
+        for fmt, (ext, modes) in FORMATS.items():
+            for mode in modes:
+                name = f"{fmt.lower()}_{mode.lower()}_{width}x{height}.{ext}"
+                spec.append((name, width, height, mode, fmt))
+    return spec
+
+
+def synthetic_image(width, height, mode, seed=CORPUS_SEED):
+    """生成确定性的测试图片：平滑色块 + 重复的细节纹理 + 渐变，RGBA带径向透明度"""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.RandomState(seed)
+    # 低频：小尺寸随机色块放大
+    coarse = Image.fromarray(rng.randint(0, 256, (12, 16, 3), dtype=np.uint8), 'RGB')
+    smooth = coarse.resize((width, height), Image.Resampling.BICUBIC)
+    # 高频：固定的噪声瓦片平铺
+    tile = Image.fromarray(rng.randint(0, 256, (256, 256), dtype=np.uint8), 'L')
+    detail = Image.new('L', (width, height))
+    for top in range(0, height, 256):
+        for left in range(0, width, 256):
+            detail.paste(tile, (left, top))
+    gradient = Image.linear_gradient('L').resize((width, height))
+    r, g, b = smooth.split()
+    image = Image.merge('RGB', (Image.blend(r, gradient, 0.5), Image.blend(g, detail, 0.3), b))
+    if mode == 'RGBA':
+        alpha = Image.radial_gradient('L').resize((width, height))
+        image.putalpha(alpha.point(lambda value: 255 - value))
+    elif mode == 'P':
+        image = image.convert('P', palette=Image.Palette.WEB, dither=Image.Dither.NONE)
+    elif mode == 'L':
+        image = image.convert('L')
+    return image
+
+
+def build_corpus(directory, shapes):
+    """生成语料（已存在且清单一致时直接复用），返回 {名称: 路径}"""
+    from PIL import __version__ as pillow_version
+
+    spec = corpus_spec(shapes)
+    manifest = {"version": CORPUS_VERSION, "seed": CORPUS_SEED, "pillow": pillow_version,
+                "images": [list(item) for item in spec]}
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    paths = {name: os.path.join(directory, name) for name, *_ in spec}
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            if json.load(f) == manifest and all(os.path.isfile(p) for p in paths.values()):
+                return paths
+    except (OSError, ValueError):
+        pass
+
+    os.makedirs(directory, exist_ok=True)
+    for name, width, height, mode, fmt in spec:
+        image = synthetic_image(width, height, mode)
+        options = {'quality': 90} if fmt == 'JPEG' else {}
+        image.save(paths[name], fmt, **options)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return paths
+
+
+def _prepare(function, path):
+    """准备输入并返回一次调用的函数（准备工作不计入测量）"""
+    from PIL import Image
+    from config import TARGET_SIZES
+    from shape_mask import get_mask
+    import icon_processor
+
+    # 蒙版缓存在实际使用中常驻，预先生成
+    for size in TARGET_SIZES + [(100, 100)]:
+        get_mask(size=size)
+
+    if function == 'process_icon':
+        output_dir = tempfile.mkdtemp(prefix='bench_icon_')
+        return lambda: icon_processor.process_icon(path, output_dir)
+    if function == 'create_rounded_icon':
+        with Image.open(path) as img:
+            source = img.convert('RGBA')
+        return lambda: icon_processor.create_rounded_icon(source, (256, 256))
+    if function == 'create_preview_icon':
+        return lambda: icon_processor.create_preview_icon(path)
+    raise ValueError(f"未知的函数: {function}")
+
+
+def calibrate(repeat):
+    """固定的参考负载（LANCZOS缩放 + zlib压缩）耗时，用于抵消机器整体快慢的漂移"""
+    import zlib
+    from PIL import Image
+
+    image = synthetic_image(1024, 1024, 'RGBA')
+    data = image.tobytes()
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        image.resize((256, 256), Image.Resampling.LANCZOS)
+        zlib.compress(data, 6)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return {"calibration_seconds": round(best, 4)}
+
+
+def measure(function, path, repeat):
+    """在当前进程中测量，返回 {wall_seconds, cpu_seconds, peak_mb}"""
+    call = _prepare(function, path)
+    baseline = current_rss_mb() or peak_rss_mb()
+    walls, cpus = [], []
+    for _ in range(repeat):
+        wall, cpu = time.perf_counter(), time.process_time()
+        call()
+        walls.append(time.perf_counter() - wall)
+        cpus.append(time.process_time() - cpu)
+    peak = peak_rss_mb()
+    return {
+        "wall_seconds": round(min(walls), 4),
+        "cpu_seconds": round(min(cpus), 4),
+        "peak_mb": round(max(peak - baseline, 0.0), 1) if peak and baseline else None,
+    }
+
+
+def run_child(*args):
+    output = subprocess.run([sys.executable, SCRIPT] + [str(a) for a in args],
+                            capture_output=True, check=True, text=True, cwd=SCRIPT_DIR).stdout
+    return json.loads(output)
+
+
+def environment():
+    """记录影响结果的环境信息"""
+    from PIL import __version__ as pillow_version
+    return {
+        "python": platform.python_version(),
+        "pillow": pillow_version,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_suite(paths, functions, repeat, progress=None):
+    """测量全部 (函数, 图片)，返回 {"environment", "calibration_seconds", "results": {函数/图片: 指标}}"""
+    calibration = run_child('--calibrate', max(repeat, 5))["calibration_seconds"]
+    results = {}
+    for function in functions:
+        for name, path in paths.items():
+            key = f"{function}/{name}"
+            try:
+                results[key] = run_child('--child', function, path, repeat)
+            except subprocess.CalledProcessError as e:
+                results[key] = {"error": (e.stderr or '').strip().splitlines()[-1:] or [str(e)]}
+            if progress:
+                progress(key, results[key])
+    return {"environment": environment(), "calibration_seconds": calibration, "results": results}
+
+
+def compare(current, baseline, time_threshold, memory_threshold):
+    """与基线对比，返回 [(键, 指标, 基线值, 当前值, 是否回归)]
+
+    基线的时间先按两次参考负载耗时之比换算到当前机器状态，再与当前值比较。
+    """
+    scale = 1.0
+    if baseline.get("calibration_seconds") and current.get("calibration_seconds"):
+        scale = current["calibration_seconds"] / baseline["calibration_seconds"]
+    rows = []
+    for key, before in sorted(baseline["results"].items()):
+        after = current["results"].get(key)
+        if after is None or "error" in before or "error" in after:
+            continue
+        for metric, threshold, slack in (("wall_seconds", time_threshold, TIME_SLACK_SECONDS),
+                                         ("cpu_seconds", time_threshold, TIME_SLACK_SECONDS),
+                                         ("peak_mb", memory_threshold, MEMORY_SLACK_MB)):
+            old, new = before.get(metric), after.get(metric)
+            if old is None or new is None:
+                continue
+            if metric != "peak_mb":
+                old = round(old * scale, 4)
+            regressed = new > old * (1 + threshold) + slack
+            rows.append((key, metric, old, new, regressed))
+    return rows
+
+
+def format_results(results):
+    lines = [f"{'函数/图片':<56}{'墙钟(s)':>10}{'CPU(s)':>10}{'峰值(MB)':>10}"]
+    for key, item in results["results"].items():
+        if "error" in item:
+            lines.append(f"{key:<56}  失败: {item['error'][0] if item['error'] else ''}")
+        else:
+            peak = item['peak_mb'] if item['peak_mb'] is not None else float('nan')
+            lines.append(f"{key:<56}{item['wall_seconds']:>10.4f}{item['cpu_seconds']:>10.4f}{peak:>10.1f}")
+    return '\n'.join(lines)
+
+
+def format_comparison(rows):
+    lines = [f"{'函数/图片':<56}{'指标':<14}{'基线':>10}{'当前':>10}{'变化':>9}"]
+    for key, metric, old, new, regressed in rows:
+        change = f"{(new - old) * 100 / old:+.0f}%" if old else 'n/a'
+        mark = '  回归' if regressed else ''
+        lines.append(f"{key:<56}{metric:<14}{old:>10}{new:>10}{change:>9}{mark}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='图标处理基准测试')
+    parser.add_argument('--quick', action='store_true', help=f'只使用较小的语料 {QUICK_SHAPES}')
+    parser.add_argument('--max-size', type=int, default=None, help='只测量边长不超过该值的图片')
+    parser.add_argument('--functions', nargs='+', choices=FUNCTIONS, default=list(FUNCTIONS))
+    parser.add_argument('--repeat', type=int, default=3, help='每种情况重复次数，取最快一次')
+    parser.add_argument('--corpus', default=os.path.join(tempfile.gettempdir(), 'icon_bench_corpus'),
+                        help='语料缓存目录')
+    parser.add_argument('--output', help='把结果写入JSON文件')
+    parser.add_argument('--save-baseline', metavar='PATH', help='把结果保存为基线')
+    parser.add_argument('--compare', metavar='PATH', help='与基线对比，存在回归时退出码为1')
+    parser.add_argument('--time-threshold', type=float, default=0.25, help='时间允许的相对增长（默认25%%）')
+    parser.add_argument('--memory-threshold', type=float, default=0.25, help='峰值内存允许的相对增长（默认25%%）')
+    parser.add_argument('--child', nargs=3, metavar=('FUNCTION', 'PATH', 'REPEAT'), help=argparse.SUPPRESS)
+    parser.add_argument('--make-corpus', metavar='DIR', help=argparse.SUPPRESS)
+    parser.add_argument('--calibrate', type=int, metavar='REPEAT', help=argparse.SUPPRESS)
+    parser.add_argument('--shapes', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        function, path, repeat = args.child
+        print(json.dumps(measure(function, path, int(repeat))))
+        return
+    if args.calibrate:
+        print(json.dumps(calibrate(args.calibrate)))
+        return
+    if args.make_corpus:
+        shapes = [tuple(shape) for shape in json.loads(args.shapes)]
+        print(json.dumps(build_corpus(args.make_corpus, shapes)))
+        return
+
+    shapes = QUICK_SHAPES if args.quick else SHAPES
+    if args.max_size:
+        shapes = [shape for shape in shapes if max(shape) <= args.max_size]
+    # 语料在子进程中生成，避免父进程的峰值内存被子进程继承
+    paths = run_child('--make-corpus', args.corpus, '--shapes', json.dumps(shapes))
+
+    def progress(key, item):
+        print(f"  {key}: {item}", file=sys.stderr)
+
+    results = run_suite(paths, args.functions, args.repeat, progress)
+    print(format_results(results))
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get("environment") != results["environment"]:
+            print("注意: 基线的运行环境与当前不同，结果仅供参考", file=sys.stderr)
+        rows = compare(results, baseline, args.time_threshold, args.memory_threshold)
+        print(f"参考负载: 基线 {baseline.get('calibration_seconds')}s，当前 {results['calibration_seconds']}s"
+              f"（基线时间按比例换算）")
+        print(format_comparison(rows))
+        regressions = [row for row in rows if row[-1]]
+        failed = [key for key, item in results["results"].items()
+                  if "error" in item and "error" not in baseline["results"].get(key, {"error": None})]
+        if regressions or failed:
+            print(f"发现 {len(regressions)} 项回归，{len(failed)} 项新增失败", file=sys.stderr)
+            sys.exit(1)
+        print("未发现回归", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+缩放金字塔测量 - 对比逐尺寸全分辨率LANCZOS与金字塔缩放的耗时和峰值内存
+
+用法:
+    python bench_pyramid.py            # 默认生成4096x4096的PNG与JPEG进行对比
+    python bench_pyramid.py --size 8192
+
+每次测量在独立子进程中运行，峰值内存取自进程的最大常驻内存。
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+from config import TARGET_SIZES
+from icon_processor import build_resize_pyramid
+
+
+def run_legacy(path):
+    """旧实现：每个尺寸都从全分辨率RGBA原图进行LANCZOS缩放"""
+    with Image.open(path) as img:
+        img = img.convert('RGBA')
+        return [img.resize(size, Image.Resampling.LANCZOS) for size in TARGET_SIZES]
+
+
+def run_pyramid(path):
+    """新实现：draft/reduce一次缩小后逐级派生"""
+    with Image.open(path) as img:
+        pyramid = build_resize_pyramid(img, TARGET_SIZES)
+        return [pyramid[size] for size in TARGET_SIZES]
+
+
+def peak_rss_mb():
+    """返回当前进程的峰值常驻内存（MB），不支持的平台返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以字节为单位，Linux 以KB为单位
+    if sys.platform == 'darwin':
+        return round(peak / (1024 * 1024), 1)
+    return round(peak / 1024, 1)
+
+
+def measure(mode, path):
+    """在当前进程中执行一次测量"""
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    if mode == 'legacy':
+        run_legacy(path)
+    else:
+        run_pyramid(path)
+    return {
+        "mode": mode,
+        "seconds": round(time.perf_counter() - started, 4),
+        "baseline_rss_mb": baseline,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def measure_in_subprocess(mode, path):
+    """在独立子进程中测量，保证峰值内存互不影响"""
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', mode, path],
+        capture_output=True, check=True, text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    ).stdout
+    return json.loads(output)
+
+
+def create_inputs(directory, size):
+    """生成带渐变和细节的测试图片"""
+    gradient = Image.linear_gradient('L').resize((size, size))
+    noise = Image.effect_noise((size, size), 64)
+    img = Image.merge('RGB', (gradient, noise, gradient.transpose(Image.Transpose.ROTATE_90)))
+    paths = {}
+    for fmt, ext in (('PNG', 'png'), ('JPEG', 'jpg')):
+        path = os.path.join(directory, f'source_{size}.{ext}')
+        img.save(path, fmt)
+        paths[fmt] = path
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='缩放金字塔耗时与内存对比')
+    parser.add_argument('--size', type=int, default=4096, help='测试图片边长')
+    parser.add_argument('--repeat', type=int, default=3, help='每种情况重复次数，取最快一次')
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'PATH'), help=argparse.SUPPRESS)
+    parser.add_argument('--make-inputs', metavar='DIR', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(*args.child)))
+        return
+    if args.make_inputs:
+        print(json.dumps(create_inputs(args.make_inputs, args.size)))
+        return
+
+    with tempfile.TemporaryDirectory(prefix='bench_pyramid_') as directory:
+        # 测试图片同样在子进程中生成：Linux下fork出的子进程会继承父进程的峰值内存记录
+        inputs = json.loads(subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--make-inputs', directory, '--size', str(args.size)],
+            capture_output=True, check=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout)
+        print(f"输入尺寸: {args.size}x{args.size}，目标尺寸: {[s[0] for s in TARGET_SIZES]}")
+        print(f"{'格式':<6}{'实现':<10}{'耗时(s)':>10}{'峰值内存(MB)':>16}")
+        for fmt, path in inputs.items():
+            for mode in ('legacy', 'pyramid'):
+                runs = [measure_in_subprocess(mode, path) for _ in range(args.repeat)]
+                best = min(runs, key=lambda r: r['seconds'])
+                peak = max((r['peak_rss_mb'] or 0) for r in runs)
+                print(f"{fmt:<6}{mode:<10}{best['seconds']:>10.3f}{peak:>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+端到端替换流程基准测试 - 在合成的 SystemRoot 目录树上无界面运行完整流程
+
+为每个场景生成 <临时目录>/Windows/System32/imageres.dll（合成PE，大小和图标组数量可变），
+然后在设置了 SystemRoot、LOCALAPPDATA 和替身命令 PATH 的子进程中运行与界面相同的流程：
+启动图片处理进程 → 选择图片（解码、预览、渲染图标）→ 依赖图（编码、优化、备份、
+存入备份仓库、生成新系统文件、还原点、替换脚本）。
+config.py 在导入时根据环境变量得到 TARGET_FILE，因此子进程中的流程只会接触合成目录树。
+--helper 时备份和还原点改由管理员助手进程（以普通用户身份运行的替身）执行，
+流程结束后再通过助手进程写入新系统文件并从备份还原，记录这两步的耗时。
+
+用法:
+    python bench_replace_e2e.py                                  # 1/10/50/100MB × 1/100个图标组
+    python bench_replace_e2e.py --sizes-mb 1 5 --groups 1 20 --json result.json
+    python bench_replace_e2e.py --helper                         # 经由管理员助手进程
+    python bench_replace_e2e.py --optimize                       # 加入ICO体积优化阶段
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPT = os.path.abspath(__file__)
+SCRIPT_DIR = os.path.dirname(SCRIPT)
+STANDIN_DIR = os.path.join(SCRIPT_DIR, 'standins')
+
+# 按处理的字节数计算吞吐量的阶段（其余阶段与DLL大小无关）
+THROUGHPUT_STAGES = ('backup', 'store', 'patch', 'write', 'restore')
+STAGE_ORDER = ('worker_start', 'helper_start', 'select', 'encode', 'optimize', 'backup', 'store', 'patch',
+               'restore_point', 'script', 'write', 'restore')
+
+
+def build_tree(root, size_mb, groups, seed=0):
+    """生成合成的 SystemRoot 目录树，返回 (SystemRoot, DLL路径)"""
+    from pe_fixtures import make_icon_groups, write_synthetic_dll
+
+    system_root = os.path.join(root, 'Windows')
+    system32 = os.path.join(system_root, 'System32')
+    os.makedirs(system32, exist_ok=True)
+    dll_path = os.path.join(system32, 'imageres.dll')
+    write_synthetic_dll(dll_path, make_icon_groups(groups, seed), int(size_mb * 1024 * 1024), seed=seed)
+    return system_root, dll_path
+
+
+def run_flow(source, output_dir, use_helper=False, optimize=False):
+    """在当前进程中运行完整流程（需已设置好环境变量），返回各阶段耗时和产物"""
+    from config import TARGET_FILE
+    from image_worker import ImageWorker
+    from privileged_helper import PrivilegedHelper
+    from replace_pipeline import build_replace_stages, run_pipeline
+
+    timings = {}
+    worker = ImageWorker()
+    helper = PrivilegedHelper(elevate=False) if use_helper else None
+    try:
+        if helper is not None:
+            started = time.perf_counter()
+            helper.ping()
+            timings['helper_start'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        worker.start()
+        worker.call('ping')
+        timings['worker_start'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        loaded = worker.load(source)
+        if loaded is None:
+            raise ValueError(f"图片无效: {source}")
+        timings['select'] = time.perf_counter() - started
+
+        stages = build_replace_stages(source, output_dir, encode_icon=worker.encode, helper=helper,
+                                      optimize=optimize)
+        results, report = run_pipeline(stages)
+
+        if helper is not None and results['patch']:
+            started = time.perf_counter()
+            helper.write(results['patch'], TARGET_FILE)
+            timings['write'] = time.perf_counter() - started
+            started = time.perf_counter()
+            helper.restore(results['store'], TARGET_FILE)
+            timings['restore'] = time.perf_counter() - started
+    finally:
+        worker.stop()
+        if helper is not None:
+            helper.stop()
+
+    for name, (begin, end) in report['stages'].items():
+        timings[name] = end - begin
+    artifacts = {
+        "script": results['script'],
+        "patched": results['patch'],
+        "manifest": results['store'],
+    }
+    return {
+        "target_file": TARGET_FILE,
+        "target_bytes": os.path.getsize(TARGET_FILE),
+        "stages": {name: round(seconds, 4) for name, seconds in timings.items()},
+        "pipeline_wall_seconds": round(report['wall_seconds'], 4),
+        "errors": report['errors'],
+        "artifacts_ok": all(path and os.path.exists(path) for path in artifacts.values()),
+    }
+
+
+def run_scenario(directory, size_mb, groups, source, restore_delay, use_helper=False, optimize=False):
+    """生成目录树并在子进程中运行一个场景"""
+    root = os.path.join(directory, f'{size_mb}mb_{groups}g')
+    started = time.perf_counter()
+    system_root, dll_path = build_tree(root, size_mb, groups)
+    build_seconds = time.perf_counter() - started
+
+    output_dir = os.path.join(root, 'output')
+    os.makedirs(output_dir)
+    env = dict(os.environ)
+    env.update({
+        'SystemRoot': system_root,
+        # 产物缓存、备份仓库和助手进程的备份放在场景目录中，互不影响，也不影响用户数据
+        'LOCALAPPDATA': os.path.join(root, 'appdata'),
+        'ProgramData': os.path.join(root, 'programdata'),
+        'PATH': STANDIN_DIR + os.pathsep + env.get('PATH', ''),
+        'STANDIN_DELAY': str(restore_delay),
+    })
+    try:
+        command = [sys.executable, SCRIPT, '--child', source, output_dir]
+        command += (['--helper'] if use_helper else []) + (['--optimize'] if optimize else [])
+        output = subprocess.run(command, capture_output=True, check=True, text=True, cwd=SCRIPT_DIR, env=env).stdout
+        # 流程中的模块可能向标准输出打印报告，结果在最后一行
+        result = json.loads(output.strip().splitlines()[-1])
+    finally:
+        # 大场景占用数百MB磁盘，测完即删
+        shutil.rmtree(root, ignore_errors=True)
+    result.update({"size_mb": size_mb, "groups": groups, "build_seconds": round(build_seconds, 3)})
+    return result
+
+
+def throughput(result, stage):
+    """阶段吞吐量（MB/s）"""
+    seconds = result['stages'].get(stage)
+    if not seconds:
+        return None
+    return result['target_bytes'] / (1024 * 1024) / seconds
+
+
+def format_results(results):
+    stages = [name for name in STAGE_ORDER if any(name in r['stages'] for r in results)]
+    lines = ['各阶段耗时 (s):',
+             f"{'场景':<14}" + ''.join(f'{name:>14}' for name in stages) + f"{'流程总耗时':>12}"]
+    for r in results:
+        label = f"{r['size_mb']}MB/{r['groups']}组"
+        row = ''.join(f"{r['stages'].get(name, float('nan')):>14.3f}" for name in stages)
+        lines.append(f'{label:<14}{row}{r["pipeline_wall_seconds"]:>16.3f}')
+    lines.append('')
+    lines.append('吞吐量 (MB/s):')
+    lines.append(f"{'场景':<14}" + ''.join(f'{name:>14}' for name in THROUGHPUT_STAGES) + f"{'产物':>8}")
+    for r in results:
+        label = f"{r['size_mb']}MB/{r['groups']}组"
+        row = ''
+        for name in THROUGHPUT_STAGES:
+            value = throughput(r, name)
+            row += f'{value:>14.1f}' if value is not None else f"{'-':>14}"
+        status = '完整' if r['artifacts_ok'] else '缺失'
+        lines.append(f'{label:<14}{row}{status:>8}')
+        for name, error in r['errors'].items():
+            lines.append(f'    {name} 失败: {error}')
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='端到端替换流程基准测试')
+    parser.add_argument('--sizes-mb', type=float, nargs='+', default=[1, 10, 50, 100], help='合成DLL大小（MB）')
+    parser.add_argument('--groups', type=int, nargs='+', default=[1, 100], help='图标组数量')
+    parser.add_argument('--image-size', type=int, default=2048, help='源图片边长')
+    parser.add_argument('--restore-delay', type=float, default=0.0, help='替身wmic模拟的还原点耗时（秒）')
+    parser.add_argument('--helper', action='store_true', help='备份、写入、还原经由管理员助手进程（普通用户替身）')
+    parser.add_argument('--optimize', action='store_true', help='加入ICO体积优化阶段（与批处理的 --optimize 相同）')
+    parser.add_argument('--json', metavar='PATH', help='把结果写入JSON文件')
+    parser.add_argument('--child', nargs=2, metavar=('SOURCE', 'OUTPUT_DIR'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_flow(*args.child, use_helper=args.helper, optimize=args.optimize)))
+        return
+
+    from bench_replace_pipeline import make_source_image
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='bench_e2e_') as directory:
+        source = os.path.join(directory, 'source.png')
+        make_source_image(source, args.image_size)
+        for size_mb in args.sizes_mb:
+            for groups in args.groups:
+                result = run_scenario(directory, size_mb, groups, source, args.restore_delay, args.helper,
+                                      args.optimize)
+                print(f"  {size_mb}MB/{groups}组: 流程 {result['pipeline_wall_seconds']:.3f}s", file=sys.stderr)
+                results.append(result)
+
+    print(format_results(results))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if not all(r['artifacts_ok'] for r in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
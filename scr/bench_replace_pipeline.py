@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+替换流程基准测试 - 对比依赖图并发执行与顺序执行的总耗时
+
+在临时目录中生成合成的 imageres.dll 和源图片，把 standins 目录加入 PATH，
+用替身 wmic.exe 模拟创建还原点的耗时，因此在Linux上也可以运行。
+
+用法:
+    python bench_replace_pipeline.py
+    python bench_replace_pipeline.py --size-mb 100 --restore-delay 5
+"""
+
+import argparse
+import os
+import tempfile
+
+STANDIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'standins')
+
+
+def make_source_image(path, size=1024, blue=128):
+    """生成带渐变的源图片（不同的 blue 值得到内容不同的图片，避免命中产物缓存）"""
+    import numpy as np
+    from PIL import Image
+
+    ramp = np.linspace(0, 255, size, dtype=np.uint8)
+    pixels = np.dstack([np.tile(ramp, (size, 1)), np.tile(ramp[:, None], (1, size)),
+                        np.full((size, size), blue, dtype=np.uint8)])
+    Image.fromarray(pixels, 'RGB').save(path)
+
+
+def run_once(directory, label, source, target, max_workers):
+    """在独立的输出目录和缓存中运行一次完整流程"""
+    from replace_pipeline import build_replace_stages, run_pipeline
+
+    output_dir = os.path.join(directory, label)
+    os.makedirs(output_dir)
+    stages = build_replace_stages(source, output_dir, target_path=target,
+                                  store_dir=os.path.join(output_dir, 'store'))
+    return run_pipeline(stages, max_workers=max_workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='替换流程基准测试')
+    parser.add_argument('--size-mb', type=float, default=64, help='合成DLL大小（MB）')
+    parser.add_argument('--restore-delay', type=float, default=3.0, help='替身wmic模拟的还原点耗时（秒）')
+    parser.add_argument('--image-size', type=int, default=2048, help='源图片边长')
+    args = parser.parse_args()
+
+    os.environ['PATH'] = STANDIN_DIR + os.pathsep + os.environ.get('PATH', '')
+    os.environ['STANDIN_DELAY'] = str(args.restore_delay)
+
+    with tempfile.TemporaryDirectory(prefix='bench_pipeline_') as directory:
+        # 产物缓存和备份仓库都放在临时目录中，不影响用户数据
+        os.environ['LOCALAPPDATA'] = os.path.join(directory, 'appdata')
+        from pe_fixtures import write_synthetic_dll
+        from replace_pipeline import format_report
+
+        target = os.path.join(directory, 'imageres.dll')
+        write_synthetic_dll(target, target_size=int(args.size_mb * 1024 * 1024))
+        sources = []
+        for index, label in enumerate(('sequential', 'concurrent')):
+            source = os.path.join(directory, f'{label}.png')
+            make_source_image(source, args.image_size, blue=128 + index)
+            sources.append(source)
+
+        _, sequential = run_once(directory, 'sequential', sources[0], target, max_workers=1)
+        _, concurrent = run_once(directory, 'concurrent', sources[1], target, max_workers=None)
+
+        print('顺序执行:')
+        print(format_report(sequential))
+        print('\n依赖图并发执行:')
+        print(format_report(concurrent))
+        print(f"\n实际顺序执行 {sequential['wall_seconds']:.3f}s -> 并发执行 {concurrent['wall_seconds']:.3f}s"
+              f"（{sequential['wall_seconds'] / concurrent['wall_seconds']:.2f}x）")
+
+
+if __name__ == '__main__':
+    main()
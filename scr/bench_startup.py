@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动时间基准测试 - 在 QT_QPA_PLATFORM=offscreen 下测量从启动进程到主窗口首次绘制的时间
+
+每次测量启动一个新的解释器，按 main.py 的顺序导入模块、创建 QApplication 和主窗口，
+主窗口收到第一个绘制事件时记录各阶段耗时以及此时已经导入的重模块。
+墙钟时间从父进程启动子进程开始计算，包含解释器自身的启动。
+
+用法:
+    python bench_startup.py                 # 测量5次，输出各阶段中位数
+    python bench_startup.py --repeat 10 --json startup.json
+    python bench_startup.py --check         # 首次绘制前导入了重模块时退出码为1
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SCRIPT = os.path.abspath(__file__)
+SCRIPT_DIR = os.path.dirname(SCRIPT)
+
+# 首次绘制前不应导入的模块（在第一次使用时才导入）
+DEFERRED_MODULES = ('PIL', 'numpy', 'system_ops', 'icon_processor', 'replace_pipeline', 'pe_resources',
+                    'rgba_buffer', 'dialogs')
+PHASES = ('imports', 'application', 'window', 'first_paint')
+
+
+def run_child():
+    """在当前进程中启动界面，首次绘制后输出JSON结果并退出"""
+    started = time.perf_counter()
+    import main  # noqa: F401  与正式启动相同的导入
+    from PyQt5.QtCore import QObject, QEvent
+    from PyQt5.QtWidgets import QApplication
+    import gui
+    imported = time.perf_counter()
+
+    app = QApplication(sys.argv[:1])
+    app.setStyle('Fusion')
+    created = time.perf_counter()
+
+    window = gui.SystemIconReplacer()
+    constructed = time.perf_counter()
+
+    class FirstPaint(QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Paint and obj is window and not result:
+                painted = time.perf_counter()
+                result.update({
+                    "phases": {
+                        "imports": imported - started,
+                        "application": created - imported,
+                        "window": constructed - created,
+                        "first_paint": painted - constructed,
+                    },
+                    "loaded": [name for name in DEFERRED_MODULES if name in sys.modules],
+                })
+                print(json.dumps(result), flush=True)
+                app.quit()
+            return False
+
+    result = {}
+    first_paint = FirstPaint()
+    window.installEventFilter(first_paint)
+    window.show()
+    app.exec_()
+    window.close()
+
+
+def measure_once():
+    """启动一次子进程，返回结果（含父进程测得的墙钟时间）"""
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, SCRIPT, '--child'], stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL, text=True, cwd=SCRIPT_DIR, env=env)
+    line = process.stdout.readline()
+    wall = time.perf_counter() - started
+    process.communicate(timeout=30)
+    if not line:
+        raise RuntimeError(f"子进程未能完成首次绘制（退出码 {process.returncode}）")
+    result = json.loads(line)
+    result["wall"] = wall
+    return result
+
+
+def format_results(results):
+    lines = [f"{'阶段':<14}{'中位数(ms)':>12}{'最快(ms)':>12}{'最慢(ms)':>12}"]
+    rows = [(phase, [r["phases"][phase] for r in results]) for phase in PHASES]
+    rows.append(('wall', [r["wall"] for r in results]))
+    for name, values in rows:
+        lines.append(f"{name:<14}{statistics.median(values) * 1000:>12.1f}"
+                     f"{min(values) * 1000:>12.1f}{max(values) * 1000:>12.1f}")
+    loaded = sorted({name for r in results for name in r["loaded"]})
+    lines.append(f"首次绘制前已导入的延迟模块: {', '.join(loaded) if loaded else '无'}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='启动到首次绘制的时间')
+    parser.add_argument('--repeat', type=int, default=5, help='测量次数')
+    parser.add_argument('--json', metavar='PATH', help='把结果写入JSON文件')
+    parser.add_argument('--check', action='store_true', help='首次绘制前导入了延迟模块时退出码为1')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child()
+        return
+
+    # 第一次运行会生成字节码缓存，不计入结果
+    measure_once()
+    results = [measure_once() for _ in range(args.repeat)]
+    print(format_results(results))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.check and any(r["loaded"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+有界内存解码模块 - 超大源图片按条带解码并缩小，峰值内存不超过预算
+
+图标最大只需要256x256，完整解码一张12000x12000的PNG却需要数百MB。
+- JPEG：draft() 在解码阶段直接按1/2、1/4、1/8缩放；
+- 预计完整解码不超过预算的图片：直接解码后 reduce()；
+- 非交错PNG：自行读取IDAT数据流，按条带解压并借助PIL的zip解码器反滤波，
+  每个条带转换为RGBA后立即 reduce()，只保留缩小后的结果；
+- 未压缩的raw数据（BMP等）：按行偏移只读取当前条带的字节。
+其他超出预算的情况抛出 ValueError。
+"""
+
+import struct
+import zlib
+
+from PIL import Image
+
+from config import DECODE_MEMORY_BUDGET, PYRAMID_BASE_OVERSAMPLE
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+# 反滤波只与每像素字节数有关，用字节原样保存的模式解码即可还原原始行数据
+PNG_IDENTITY_MODES = {1: 'L', 2: 'LA', 3: 'RGB', 4: 'RGBA'}
+READ_SIZE = 1024 * 1024
+
+
+def reduce_for_target(image, target_size, oversample=PYRAMID_BASE_OVERSAMPLE):
+    """利用draft/reduce快速缩小图片，保留不低于目标尺寸oversample倍的分辨率，并转换为RGBA"""
+    min_width = target_size[0] * oversample
+    min_height = target_size[1] * oversample
+    
+    # JPEG可在解码阶段直接按1/2、1/4、1/8缩放，未解码时才生效
+    if image.format == 'JPEG' and image.mode in ('RGB', 'L', 'CMYK'):
+        image.draft(image.mode, (min_width, min_height))
+    
+    # 调色板等模式无法直接整数缩小，需先转换
+    if image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        image = image.convert('RGBA')
+    
+    factor_x = max(1, image.width // min_width)
+    factor_y = max(1, image.height // min_height)
+    if factor_x > 1 or factor_y > 1:
+        image = image.reduce((factor_x, factor_y))
+    
+    if image.mode != 'RGBA':
+        image = image.convert('RGBA')
+    return image
+
+
+def reduction_factors(size, target_size, oversample=PYRAMID_BASE_OVERSAMPLE):
+    """与 reduce_for_target 相同的整数缩小倍数"""
+    factor_x = max(1, size[0] // (target_size[0] * oversample))
+    factor_y = max(1, size[1] // (target_size[1] * oversample))
+    return factor_x, factor_y
+
+
+def estimate_decode_bytes(size, mode):
+    """估算完整解码并转换为RGBA所需的内存"""
+    bands = Image.getmodebands(mode)
+    # PIL中3通道图片每像素同样占4字节，32位整数/浮点模式每像素4字节
+    stored = 4 if bands >= 3 or mode.startswith('I') or mode == 'F' else bands
+    # 转换为RGBA时还需要一份副本
+    return size[0] * size[1] * (stored + (0 if mode == 'RGBA' else 4))
+
+
+def _strip_rows(width, bytes_per_row, factor_y, budget):
+    """根据预算计算条带行数（factor_y 的整数倍）"""
+    # 条带中同时存在：压缩前后的行数据、原始字节、解码图片和RGBA副本
+    per_row = 4 * bytes_per_row + 8 * width
+    rows = max(1, budget // 2 // max(per_row, 1))
+    return max(factor_y, rows // factor_y * factor_y)
+
+
+def _to_rgba(strip, image):
+    """把条带转换为RGBA，沿用原图的调色板和透明色"""
+    if strip.mode == 'P' and image.palette is not None:
+        strip.putpalette(image.palette.palette, image.palette.rawmode or 'RGB')
+    if 'transparency' in image.info:
+        strip.info['transparency'] = image.info['transparency']
+    return strip if strip.mode == 'RGBA' else strip.convert('RGBA')
+
+
+class _ReducedCanvas:
+    """逐条带接收RGBA数据并缩小拼接"""
+
+    def __init__(self, size, factors):
+        self.factors = factors
+        self.canvas = Image.new('RGBA', (-(-size[0] // factors[0]), -(-size[1] // factors[1])))
+
+    def add(self, strip, top):
+        reduced = strip.reduce(self.factors) if self.factors != (1, 1) else strip
+        self.canvas.paste(reduced, (0, top // self.factors[1]))
+
+
+def _png_header(f):
+    """读取IHDR，返回 (宽, 高, 位深, 颜色类型, 是否交错)"""
+    if f.read(8) != PNG_SIGNATURE:
+        raise ValueError("不是有效的PNG文件")
+    length, chunk_type = struct.unpack('>I4s', f.read(8))
+    if chunk_type != b'IHDR' or length != 13:
+        raise ValueError("PNG文件头无效")
+    width, height, bit_depth, color_type, _, _, interlace = struct.unpack('>IIBBBBB', f.read(13))
+    return width, height, bit_depth, color_type, interlace
+
+
+def _png_idat_stream(f):
+    """依次产出IDAT数据（每次最多 READ_SIZE 字节）"""
+    f.seek(8)
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise ValueError("PNG文件被截断")
+        length, chunk_type = struct.unpack('>I4s', header)
+        if chunk_type == b'IDAT':
+            remaining = length
+            while remaining:
+                data = f.read(min(remaining, READ_SIZE))
+                if not data:
+                    raise ValueError("PNG文件被截断")
+                remaining -= len(data)
+                yield data
+            f.seek(4, 1)
+        elif chunk_type == b'IEND':
+            return
+        else:
+            f.seek(length + 4, 1)
+
+
+def _decode_png_strips(path, image, target_size, oversample, budget):
+    """按条带解码非交错PNG"""
+    with open(path, 'rb') as f:
+        width, height, bit_depth, color_type, interlace = _png_header(f)
+        if interlace:
+            raise ValueError("交错PNG无法按条带解码")
+        bits_per_pixel = PNG_CHANNELS[color_type] * bit_depth
+        bytes_per_pixel = max(1, bits_per_pixel // 8)
+        if bytes_per_pixel not in PNG_IDENTITY_MODES:
+            raise ValueError("16位RGB/RGBA的PNG无法按条带解码")
+        identity_mode = PNG_IDENTITY_MODES[bytes_per_pixel]
+        row_bytes = (width * bits_per_pixel + 7) // 8
+        stride = row_bytes + 1
+        args = image.tile[0][3]
+        rawmode = args if isinstance(args, str) else args[0]
+
+        factors = reduction_factors((width, height), target_size, oversample)
+        canvas = _ReducedCanvas((width, height), factors)
+        strip_rows = _strip_rows(width, stride, factors[1], budget)
+
+        inflater = zlib.decompressobj()
+        source = _png_idat_stream(f)
+        pending = b''
+        previous = None
+        top = 0
+        while top < height:
+            rows = min(strip_rows, height - top)
+            needed = rows * stride
+            chunks = [pending] if pending else []
+            available = len(pending)
+            pending = b''
+            while available < needed:
+                data = inflater.unconsumed_tail or next(source, b'')
+                if not data:
+                    raise ValueError("PNG图像数据不完整")
+                out = inflater.decompress(data, needed - available)
+                chunks.append(out)
+                available += len(out)
+            filtered = b''.join(chunks)
+            filtered, pending = filtered[:needed], filtered[needed:]
+            del chunks
+
+            # 在条带前补一行上一条带最后一行的原始数据（滤波类型0），使Up/Average/Paeth滤波可以正确还原
+            prefix = b'\x00' + previous if previous is not None else b''
+            decoded_rows = rows + (1 if previous is not None else 0)
+            identity = Image.frombytes(identity_mode, (row_bytes // bytes_per_pixel, decoded_rows),
+                                       zlib.compress(prefix + filtered, 0), 'zip', identity_mode)
+            del filtered
+            raw = identity.tobytes('raw', identity_mode)
+            del identity
+            if previous is not None:
+                raw = raw[row_bytes:]
+            previous = raw[-row_bytes:]
+
+            strip = Image.frombytes(image.mode, (width, rows), raw, 'raw', rawmode)
+            del raw
+            canvas.add(_to_rgba(strip, image), top)
+            del strip
+            top += rows
+    return canvas.canvas
+
+
+def _decode_raw_strips(path, image, target_size, oversample, budget):
+    """按条带读取未压缩的raw数据（BMP、PPM等）"""
+    _, extents, offset, args = image.tile[0][:4]
+    args = args if isinstance(args, tuple) else (args,)
+    rawmode = args[0]
+    width, height = image.size
+    stride = args[1] if len(args) > 1 else 0
+    orientation = args[2] if len(args) > 2 else 1
+    if tuple(extents) != (0, 0, width, height):
+        raise ValueError("分块存储的图片无法按条带解码")
+    if not stride:
+        # 未声明行宽时按单行打包后的长度计算
+        stride = len(Image.new(image.mode, (width, 1)).tobytes('raw', rawmode))
+
+    factors = reduction_factors(image.size, target_size, oversample)
+    canvas = _ReducedCanvas(image.size, factors)
+    strip_rows = _strip_rows(width, stride, factors[1], budget)
+
+    with open(path, 'rb') as f:
+        top = 0
+        while top < height:
+            rows = min(strip_rows, height - top)
+            # 自下而上存储时，图片顶部的条带位于文件末尾
+            first_row = height - top - rows if orientation < 0 else top
+            f.seek(offset + first_row * stride)
+            data = f.read(rows * stride)
+            if len(data) < rows * stride:
+                raise ValueError("图像数据不完整")
+            strip = Image.frombytes(image.mode, (width, rows), data, 'raw', rawmode, stride, orientation)
+            del data
+            canvas.add(_to_rgba(strip, image), top)
+            del strip
+            top += rows
+    return canvas.canvas
+
+
+def open_reduced(path, target_size, oversample=PYRAMID_BASE_OVERSAMPLE, budget=DECODE_MEMORY_BUDGET):
+    """在内存预算内解码并缩小图片，返回 (RGBA图片, 原始尺寸)
+
+    返回图片的边长不低于目标尺寸的oversample倍（原图更小时保持原尺寸）。
+    """
+    with Image.open(path) as image:
+        source_size = image.size
+        if image.format == 'JPEG' and image.mode in ('RGB', 'L', 'CMYK'):
+            min_size = (target_size[0] * oversample, target_size[1] * oversample)
+            image.draft(image.mode, min_size)
+
+        if estimate_decode_bytes(image.size, image.mode) <= budget:
+            reduced = reduce_for_target(image, target_size, oversample)
+            reduced.load()
+            return reduced, source_size
+
+        codec = image.tile[0][0] if len(image.tile) == 1 else None
+        if image.format == 'PNG' and codec == 'zip':
+            return _decode_png_strips(path, image, target_size, oversample, budget), source_size
+        if codec == 'raw':
+            return _decode_raw_strips(path, image, target_size, oversample, budget), source_size
+    raise ValueError(f"图片过大（{source_size[0]}x{source_size[1]}），无法在 "
+                     f"{budget // (1024 * 1024)}MB 内存预算内解码")
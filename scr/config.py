@@ -16,19 +16,109 @@ ICON_RESOURCE_ID = 84  # Windows启动图标资源ID
 # 图标配置
 TARGET_SIZES = [(256, 256), (128, 128), (64, 64), (48, 48), (32, 32), (16, 16)]
 DEFAULT_ICON_SIZE = (128, 128)
+ICO_PNG_MIN_SIZE = 256  # 边长不小于该值的条目以PNG存储，较小的条目以32位BMP（DIB）存储
+ICON_RENDER_WORKERS = min(len(TARGET_SIZES), os.cpu_count() or 2)  # 各尺寸并行缩放、蒙版和编码的线程数
+
+# ICO体积优化配置
+ICO_PALETTE_MAX_SIZE = 48  # 边长不超过该值的条目尝试调色板+1位透明掩码
+ICO_PALETTE_MAX_RMSE = 0.0  # 调色板编码允许的颜色误差（预乘透明度后的均方根误差，0~255），默认只接受无损结果
+ICO_PALETTE_ALPHA_THRESHOLD = 128  # 透明度不低于该值的像素在1位掩码中视为不透明
+ICO_PNG_LEVELS = (6, 9)  # PNG条目尝试的zlib压缩级别
+ICO_PNG_STRATEGIES = ('default', 'filtered', 'huffman', 'rle')  # PNG条目尝试的zlib策略
+ICO_OPTIMIZE_WORKERS = os.cpu_count() or 2
+
+# 缩放金字塔配置
+PYRAMID_BASE_OVERSAMPLE = 2  # draft/reduce 粗缩放后保留的最大目标尺寸倍数，最终再用LANCZOS精确缩放
+PYRAMID_MIN_SOURCE_RATIO = 2.0  # 小尺寸只从边长至少为其该倍数的中间层派生，避免多次重采样累积模糊
+DECODE_MEMORY_BUDGET = 64 * 1024 * 1024  # 解码源图片时的峰值内存预算，超出时按条带解码并缩小
+
+# 内存预算配置（memory_profile.py --check 使用，按各档位实测峰值加约50%余量设定）
+# {源图片像素数上限（百万像素）: {阶段: (tracemalloc峰值MB, 常驻内存峰值MB)}}
+# 解码阶段的常驻内存取决于 DECODE_MEMORY_BUDGET：预计不超过预算的图片整体解码，
+# RGBA 图片 reduce() 时还会生成一份预乘透明度的副本，峰值约为预算的两倍
+_SMALL_STAGE_BUDGETS = {'convert': (1, 8), 'resize': (1, 8), 'mask': (1, 8), 'write_ico': (2, 8), 'save_png': (1, 8)}
+MEMORY_BUDGETS = {
+    4: {'decode': (2, 52), 'process_icon': (2, 52), **_SMALL_STAGE_BUDGETS},
+    16: {'decode': (2, 190), 'process_icon': (2, 190), **_SMALL_STAGE_BUDGETS},
+    64: {'decode': (32, 190), 'process_icon': (32, 190), **_SMALL_STAGE_BUDGETS},
+}
+
+# 蒙版配置
+MASK_SHAPE = 'circle'  # 可选: circle, rounded_rect, squircle, ring
+MASK_SHAPE_PARAMS = {
+    'circle': {},
+    'rounded_rect': {'radius': 0.2},  # 圆角半径占短边一半的比例
+    'squircle': {'exponent': 4.0},  # 超椭圆指数，越大越接近方形
+    'ring': {'thickness': 0.25},  # 环宽占半径的比例
+}
+MASK_CACHE_SIZE = 64  # 蒙版LRU缓存条目数
+
+# PE文件配置
+PE_CHECKSUM_CHUNK_SIZE = 8 * 1024 * 1024  # 计算校验和时每次映射处理的字节数（需为偶数）
+
+# 文件复制配置
+COPY_CHUNK_SIZE = 8 * 1024 * 1024  # 每次复制和哈希的字节数，也是进度回调的粒度
 
 # 路径配置
 DEFAULT_IMAGE_DIR = str(Path.home() / 'Pictures')
 TEMP_DIR_PREFIX = 'icon_replacer_'
+APP_DATA_DIR = os.path.join(os.environ.get('LOCALAPPDATA', str(Path.home() / '.cache')), 'icon_replacer')
+
+# 产物缓存配置
+ARTIFACT_CACHE_DIR = os.path.join(APP_DATA_DIR, 'artifacts')
+ARTIFACT_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 超过后按最近使用时间淘汰
+PIPELINE_VERSION = 2  # 图标处理流程的输出发生变化时递增，使旧缓存失效
+
+# 备份仓库配置（按内容分块去重的持久化备份）
+BACKUP_STORE_DIR = os.path.join(APP_DATA_DIR, 'backups')
+BACKUP_CHUNK_MIN_SIZE = 16 * 1024
+BACKUP_CHUNK_AVG_BITS = 16  # 平均块大小约为 2^16 = 64KB
+BACKUP_CHUNK_MAX_SIZE = 512 * 1024
+BACKUP_COMPRESSION = 'zlib'  # 可选: zlib, lzma
+BACKUP_COMPRESSION_LEVEL = 6
+BACKUP_COMPRESS_WORKERS = os.cpu_count() or 2
+
+# 管理员助手进程记录的系统文件备份：只有这里记录过SHA-256的内容才允许写回系统文件
+# Windows上直接放在ProgramData下（上一级目录由系统所有），由助手进程限制为只有管理员可写，普通用户进程无法伪造记录
+SYSTEM_BACKUP_DIR = (os.path.join(os.environ['ProgramData'], 'icon_replacer_system_backups')
+                     if 'ProgramData' in os.environ else os.path.join(APP_DATA_DIR, 'system_backups'))
+SYSTEM_BACKUP_KEEP = 2  # 保留完整副本的数量（最早的一份即原始系统文件始终保留），校验记录永久保留
+
+# 后台任务配置（界面中的耗时操作都在线程池中执行）
+JOB_MAX_THREADS = max(2, min(4, os.cpu_count() or 2))
+JOB_PRIORITY_LOW = 0
+JOB_PRIORITY_NORMAL = 5
+JOB_PRIORITY_HIGH = 10  # 用户正在等待的操作（如选择图片后的解码）
+JOB_SHUTDOWN_TIMEOUT_MS = 3000  # 关闭窗口时等待后台任务退出的上限（毫秒）
+
+# 图片处理进程配置（解码和图标处理在独立进程中执行，崩溃或超时后自动重启）
+IMAGE_WORKER_TIMEOUT = 60  # 单个请求的超时（秒）
+IMAGE_WORKER_START_TIMEOUT = 30  # 等待进程启动并完成预热的超时（秒）
+IMAGE_WORKER_MEMORY_LIMIT = 2048 * 1024 * 1024  # 进程地址空间上限（仅POSIX），0 表示不限制
+
+# 管理员助手进程配置（只执行备份、写入、还原系统文件和创建还原点，界面进程无需管理员权限）
+PRIVILEGED_HELPER_START_TIMEOUT = 120  # 等待助手进程启动并连接的超时（秒），包含用户确认UAC提示的时间
+PRIVILEGED_HELPER_MAX_MESSAGE = 64 * 1024  # 单条请求或响应的最大字节数
+PRIVILEGED_HELPER_CONNECTIONS = 2  # 助手进程建立的连接数，即可以同时执行的请求数（备份与创建还原点并行）
+
+# 追踪配置（设置该环境变量为输出文件路径即启用，见 tracing.py）
+TRACE_ENV_VAR = 'ICON_REPLACER_TRACE'
+TRACE_OWNER_ENV_VAR = 'ICON_REPLACER_TRACE_OWNER'  # 启用追踪的主进程pid，由 tracing.py 设置
+
+# 外部命令超时（秒）
+RESTORE_POINT_TIMEOUT = 180  # wmic 创建还原点通常需要数十秒
+ICON_CACHE_TIMEOUT = 30
 
 # UI配置
-WINDOW_TITLE = 'Windows开机图标替换工具 - 管理员模式'
+WINDOW_TITLE = 'Windows开机图标替换工具'
 WINDOW_SIZE = (700, 600)
 PREVIEW_SIZE = (150, 150)
+DEFAULT_PREVIEW_SOURCE = ('image', 'OIP-C.jpg')  # 默认预览图的原图（相对程序资源目录）
+DEFAULT_PREVIEW_ASSET = ('image', 'default_preview.png')  # 由 bake_assets.py 预先缩放到 PREVIEW_SIZE
 
 # 消息配置
 WARNING_MESSAGES = {
-    'admin_required': '此程序需要管理员权限才能替换系统文件。',
+    'admin_required': '备份、替换和还原系统文件时会请求管理员权限。',
     'backup_required': '请先创建系统还原点并确保有系统备份。',
     'system_file': '目标文件: C:\\Windows\\System32\\imageres.dll',
     'icon_info': '图标编号: 84 (Windows启动图标)'
@@ -37,6 +127,10 @@ WARNING_MESSAGES = {
 # 文件过滤器
 FILE_FILTERS = '图片文件 (*.png *.jpg *.jpeg *.bmp);;所有文件 (*.*)'
 
+# 批处理配置
+BATCH_IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+BATCH_SUMMARY_FILENAME = 'batch_summary.json'
+
 # 样式配置
 STYLES = {
     'title': '''
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对话框模块 - 预览效果和替换完成对话框
+
+只在用户第一次打开对话框时才由界面导入，不占用程序启动时间。
+"""
+
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QLabel, QPushButton, QTextEdit
+from PyQt5.QtCore import Qt, QRect, QPropertyAnimation
+from PyQt5.QtGui import QColor, QPainter, QPen, QPixmap
+
+from config import STYLES, TARGET_FILE, ICON_RESOURCE_ID
+from utils import format_file_size
+
+
+def show_preview_dialog(parent, icon_image):
+    """显示模拟的启动画面预览（icon_image 为处理好的正式图标 QImage）"""
+    # 创建预览对话框
+    preview_dialog = QDialog(parent)
+    preview_dialog.setWindowTitle('预览启动效果')
+    preview_dialog.setModal(True)
+    preview_dialog.resize(450, 350)
+    preview_dialog.setStyleSheet('background-color: #f8f9fa; border-radius: 10px;')
+    
+    layout = QVBoxLayout(preview_dialog)
+    layout.setSpacing(15)
+    layout.setContentsMargins(20, 20, 20, 20)
+    
+    # 模拟Windows启动界面
+    preview_label = QLabel('Windows启动画面预览')
+    preview_label.setAlignment(Qt.AlignCenter)
+    preview_label.setStyleSheet('font-size: 18px; font-weight: bold; padding: 10px; color: #2c3e50;')
+    layout.addWidget(preview_label)
+    
+    # 创建黑色背景的预览
+    preview_area = QLabel()
+    preview_area.setAlignment(Qt.AlignCenter)
+    preview_area.setMinimumSize(380, 220)
+    preview_area.setStyleSheet('background-color: black; border: 3px solid #ddd; border-radius: 8px;')
+    
+    # 直接显示内存中处理好的正式图标（已带形状蒙版），与写入系统的效果一致
+    icon_pixmap = QPixmap.fromImage(icon_image)
+    if not icon_pixmap.isNull():
+        pixmap = QPixmap(120, 120)
+        pixmap.fill(Qt.transparent)
+        
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform)
+        
+        # 绘制图标
+        painter.drawPixmap(QRect(0, 0, 120, 120), icon_pixmap)
+        
+        # 绘制圆圈
+        painter.setPen(QPen(QColor(0, 120, 215), 4))
+        painter.setBrush(Qt.NoBrush)
+        painter.drawEllipse(1, 1, 118, 118)
+        
+        painter.end()
+        
+        preview_area.setPixmap(pixmap)
+        
+    layout.addWidget(preview_area)
+    
+    # 加载动画
+    loading_label = QLabel('●')
+    loading_label.setAlignment(Qt.AlignCenter)
+    loading_label.setStyleSheet('color: white; font-size: 24px;')
+    layout.addWidget(loading_label)
+    
+    # 创建加载动画（由对话框持有引用）
+    preview_dialog.animation = QPropertyAnimation(loading_label, b"opacity")
+    preview_dialog.animation.setDuration(1000)
+    preview_dialog.animation.setStartValue(1.0)
+    preview_dialog.animation.setEndValue(0.3)
+    preview_dialog.animation.setLoopCount(-1)
+    preview_dialog.animation.start()
+    
+    close_btn = QPushButton('关闭预览')
+    close_btn.clicked.connect(preview_dialog.accept)
+    close_btn.setMinimumHeight(35)
+    close_btn.setStyleSheet(STYLES['button'])
+    layout.addWidget(close_btn)
+    
+    preview_dialog.exec_()
+
+
+def show_completion_dialog(parent, ico_path, script_path, backup_path, patched_path=None, manifest_path=None,
+                           restore_point=None, report=None, optimize_report=None, on_apply=None):
+    """显示完成对话框，给出 on_apply 时显示“立即替换”按钮，点击后关闭对话框并调用 on_apply()"""
+    backup_lines = f'• 备份文件: {backup_path}'
+    if manifest_path:
+        backup_lines += f'\n• 备份清单: {manifest_path}'
+    if restore_point is not None:
+        backup_lines += f"\n• 系统还原点: {'已创建' if restore_point else '创建失败，请手动创建'}"
+    if report:
+        backup_lines += (f"\n• 准备耗时: {report['wall_seconds']:.1f} 秒"
+                         f"（顺序执行约 {report['sequential_seconds']:.1f} 秒）")
+    if optimize_report:
+        before, after = optimize_report['before'], optimize_report['after']
+        backup_lines += f"\n• 图标优化: {format_file_size(before)} -> {format_file_size(after)}"
+    result_dialog = QDialog(parent)
+    result_dialog.setWindowTitle('替换完成')
+    result_dialog.setModal(True)
+    result_dialog.resize(550, 500)
+    result_dialog.setStyleSheet('background-color: #f8f9fa; border-radius: 10px;')
+    
+    layout = QVBoxLayout(result_dialog)
+    layout.setSpacing(15)
+    layout.setContentsMargins(20, 20, 20, 20)
+    
+    info_label = QLabel('✅ 图标处理完成！')
+    info_label.setStyleSheet('font-size: 20px; font-weight: bold; color: #27ae60; padding: 10px;')
+    info_label.setAlignment(Qt.AlignCenter)
+    layout.addWidget(info_label)
+    
+    # 显示下一步操作
+    steps = QTextEdit()
+    steps.setReadOnly(True)
+    steps.setStyleSheet('''
+        QTextEdit {
+            border: 1px solid #ddd;
+            border-radius: 8px;
+            padding: 15px;
+            font-size: 14px;
+            background-color: #ffffff;
+        }
+    ''')
+    if patched_path:
+        steps.setPlainText(f'''
+图标已处理完成，并已生成替换了启动图标的新系统文件。
+
+🔧 替换步骤：
+
+1. 点击下方「立即替换」并在权限请求中选择「是」，
+   或右键点击替换脚本，选择「以管理员身份运行」
+   {script_path}
+
+2. 原文件改名保留后，用新文件替换:
+   {TARGET_FILE}
+
+3. 重启电脑使新图标生效
+
+⚠️ 注意事项:
+• 操作前务必创建系统还原点
+• 替换失败时脚本会自动恢复原文件
+• 建议在虚拟机中测试
+
+📁 生成的文件:
+• 图标文件: {ico_path}
+• 新系统文件: {patched_path}
+{backup_lines}
+• 替换脚本: {script_path}
+''')
+    else:
+        steps.setPlainText(f'''
+图标已处理完成，但需要手动完成以下步骤：
+
+🔧 手动替换步骤：
+
+1. 下载 Resource Hacker 工具
+   https://www.angusj.com/resourcehacker/
+
+2. 以管理员身份运行 Resource Hacker
+
+3. 打开文件: {TARGET_FILE}
+
+4. 定位到图标组: Icon Group -> {ICON_RESOURCE_ID} -> 1033
+
+5. 删除现有图标
+
+6. 从操作菜单中选择: "添加图标资源"
+   选择文件: {ico_path}
+
+7. 保存为新的 DLL 文件
+
+8. 清除图标缓存:
+   a. 按 Win+R，输入: ie4uinit.exe -show
+   b. 重启电脑
+
+⚠️ 注意事项:
+• 操作前务必创建系统还原点
+• 替换失败可能导致系统异常
+• 建议在虚拟机中测试
+
+📁 生成的文件:
+• 图标文件: {ico_path}
+{backup_lines}
+• 替换脚本: {script_path}
+''')
+    layout.addWidget(steps)
+    
+    if on_apply is not None:
+        apply_btn = QPushButton('⚡ 立即替换')
+        apply_btn.setToolTip('由管理员助手进程写入新系统文件，原文件改名保留（会请求管理员权限）')
+        apply_btn.clicked.connect(result_dialog.accept)
+        apply_btn.clicked.connect(on_apply)
+        apply_btn.setMinimumHeight(35)
+        apply_btn.setStyleSheet(STYLES['replace_button'])
+        layout.addWidget(apply_btn)
+    
+    close_btn = QPushButton('关闭')
+    close_btn.clicked.connect(result_dialog.accept)
+    close_btn.setMinimumHeight(35)
+    close_btn.setStyleSheet(STYLES['button'])
+    layout.addWidget(close_btn)
+    
+    result_dialog.exec_()
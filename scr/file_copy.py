@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件复制模块 - 单遍复制并同时计算SHA-256
+
+有 os.copy_file_range / os.sendfile 时由内核完成复制，哈希直接读取源文件的内存映射
+（与内核复制共用页缓存，磁盘只读一遍）；其他平台使用大缓冲区读写。
+每个数据块完成后通过回调报告已复制的字节数。
+"""
+
+import hashlib
+import mmap
+import os
+import shutil
+
+from config import COPY_CHUNK_SIZE
+
+
+def _kernel_copy_functions():
+    """返回当前平台可用的内核复制方式（按优先级）"""
+    functions = []
+    if hasattr(os, 'copy_file_range'):
+        functions.append('copy_file_range')
+    if hasattr(os, 'sendfile') and os.name != 'nt':
+        functions.append('sendfile')
+    return functions
+
+
+def _kernel_copy(method, source_fd, destination_fd, offset, count):
+    """用内核复制一段数据，返回实际复制的字节数"""
+    if method == 'copy_file_range':
+        return os.copy_file_range(source_fd, destination_fd, count, offset, offset)
+    # sendfile 写入目标文件的当前位置，调用方保证按顺序复制
+    return os.sendfile(destination_fd, source_fd, offset, count)
+
+
+def _copy_kernel(source_file, destination_file, size, digest, progress_callback, chunk_size):
+    """内存映射哈希 + 内核复制"""
+    methods = _kernel_copy_functions()
+    source_fd = source_file.fileno()
+    destination_fd = destination_file.fileno()
+
+    with mmap.mmap(source_fd, 0, access=mmap.ACCESS_READ) as mm:
+        view = memoryview(mm)
+        try:
+            offset = 0
+            while offset < size:
+                count = min(chunk_size, size - offset)
+                # 出错时也要释放切片，否则关闭映射时会因仍有导出的缓冲区而失败
+                with view[offset:offset + count] as chunk:
+                    digest.update(chunk)
+
+                    copied = 0
+                    while copied < count:
+                        done = 0
+                        while methods:
+                            try:
+                                os.lseek(destination_fd, offset + copied, os.SEEK_SET)
+                                done = _kernel_copy(methods[0], source_fd, destination_fd,
+                                                    offset + copied, count - copied)
+                                break
+                            except OSError:
+                                # 跨文件系统或文件系统不支持时换下一种方式
+                                methods.pop(0)
+                        if not methods:
+                            os.lseek(destination_fd, offset + copied, os.SEEK_SET)
+                            with chunk[copied:] as rest:
+                                done = os.write(destination_fd, rest)
+                        if done <= 0:
+                            raise IOError(f"复制中断: 偏移 {offset + copied}")
+                        copied += done
+
+                offset += count
+                if progress_callback:
+                    progress_callback(offset, size)
+        finally:
+            view.release()
+
+
+def _copy_buffered(source_file, destination_file, size, digest, progress_callback, chunk_size):
+    """大缓冲区读写（同时哈希）"""
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    copied = 0
+    while True:
+        count = source_file.readinto(buffer)
+        if not count:
+            break
+        digest.update(view[:count])
+        destination_file.write(view[:count])
+        copied += count
+        if progress_callback:
+            progress_callback(copied, size)
+    return copied
+
+
+def copy_file_hashed(source, destination, progress_callback=None, chunk_size=COPY_CHUNK_SIZE):
+    """单遍复制文件（保留元数据，同shutil.copy2），返回 (字节数, SHA-256十六进制)
+
+    progress_callback(已复制字节数, 总字节数) 在每个数据块完成后调用。
+    """
+    size = os.path.getsize(source)
+    digest = hashlib.sha256()
+
+    with open(source, 'rb') as source_file, open(destination, 'wb') as destination_file:
+        if size and _kernel_copy_functions():
+            _copy_kernel(source_file, destination_file, size, digest, progress_callback, chunk_size)
+            copied = size
+        else:
+            copied = _copy_buffered(source_file, destination_file, size, digest, progress_callback, chunk_size)
+            if progress_callback and not size:
+                progress_callback(0, 0)
+
+    shutil.copystat(source, destination)
+    return copied, digest.hexdigest()
+
+
+def sha256_file(path, chunk_size=COPY_CHUNK_SIZE):
+    """计算文件的SHA-256"""
+    digest = hashlib.sha256()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(path, 'rb') as f:
+        while True:
+            count = f.readinto(buffer)
+            if not count:
+                break
+            digest.update(view[:count])
+    return digest.hexdigest()
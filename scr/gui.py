@@ -4,26 +4,67 @@
 GUI模块 - 分离界面和逻辑
 """
 
+from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QGroupBox, QLabel, QPushButton,
+                             QProgressBar, QSizePolicy, QFileDialog, QCheckBox)
+from PyQt5.QtCore import Qt, QEvent, QObject, QRect, QTimer
+from PyQt5.QtGui import QColor, QFont, QIcon, QImage, QPainter, QPixmap
 import os
-from PyQt5.QtWidgets import *
-from PyQt5.QtCore import *
-from PyQt5.QtGui import *
 from pathlib import Path
 
-from config import *
-from utils import *
-from icon_processor import *
-from system_ops import *
+from config import (WINDOW_TITLE, WINDOW_SIZE, PREVIEW_SIZE, STYLES, WARNING_MESSAGES, FILE_FILTERS,
+                    DEFAULT_IMAGE_DIR, DEFAULT_ICON_SIZE, DEFAULT_PREVIEW_ASSET, TEMP_DIR_PREFIX,
+                    TARGET_FILE, ICON_RESOURCE_ID, BACKUP_STORE_DIR, JOB_PRIORITY_HIGH, JOB_PRIORITY_LOW,
+                    JOB_SHUTDOWN_TIMEOUT_MS)
+from utils import create_temp_dir, cleanup_temp_dir, show_message, show_confirmation, resource_path
+from image_worker import ImageWorker
+from privileged_helper import PrivilegedHelper, recorded_backup_hashes
+from job_scheduler import JobScheduler
+from tracing import span
+
+# 启动时只导入显示窗口所需的模块；Pillow、PE文件处理、替换流程（含subprocess）和对话框
+# 在第一次使用时才导入，缩短启动到首次绘制的时间（打包为单文件exe时尤其明显）
+
+
+class _AfterFirstPaint(QObject):
+    """一次性事件过滤器：窗口第一次绘制后移除自身，并把回调排到事件循环中"""
+
+    def __init__(self, window, callback):
+        super().__init__(window)
+        self.callback = callback
+        window.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            obj.removeEventFilter(self)
+            QTimer.singleShot(0, self.callback)
+        return False
 
 
 class SystemIconReplacer(QMainWindow):
     def __init__(self):
         super().__init__()
+        self.scheduler = JobScheduler(self)
+        # 图片解码和图标处理在独立进程中执行，窗口显示后启动预热
+        self.image_worker = ImageWorker()
+        # 需要管理员权限的文件操作在助手进程中执行，第一次用到时才启动（此时弹出UAC提示）
+        self.privileged_helper = PrivilegedHelper()
+        self.select_job = None
+        self.replace_job = None
+        self.restore_backup = None  # (备份清单路径, 备份时间)，可以还原时才显示还原按钮
         self.initUI()
         self.source_image_path = None
+        self.image_session = None
         self.temp_dir = create_temp_dir(TEMP_DIR_PREFIX)
         self.processed_ico_path = None
         self.processed_png_path = None
+        # 其余启动工作在窗口完成首次绘制之后才开始
+        _AfterFirstPaint(self, self.finish_startup)
+        
+    def finish_startup(self):
+        """窗口显示后执行的启动工作：预热图片处理进程、读取系统文件中的启动图标"""
+        self.image_worker.start()
+        self.load_default_icon()
+        self.refresh_restore_backup()
         
     def initUI(self):
         """初始化界面"""
@@ -73,17 +114,13 @@ class SystemIconReplacer(QMainWindow):
         layout.addWidget(self.progress_bar)
         
         # 状态信息
-        self.status_label = QLabel('就绪 - 请以管理员身份运行此程序')
+        self.status_label = QLabel('就绪 - 请选择图片')
         self.status_label.setAlignment(Qt.AlignCenter)
         self.status_label.setStyleSheet(STYLES['status_bar'])
         layout.addWidget(self.status_label)
         
-        # 加载默认图标预览
-        self.load_default_icon()
-        
-        # 检查管理员权限
-        if not is_admin():
-            self.show_admin_warning()
+        # 先显示预先缩放好的默认预览图，系统文件中的图标稍后在后台读取
+        self.show_baked_preview()
             
     def create_warning_box(self, layout):
         """创建警告框"""
@@ -176,6 +213,11 @@ class SystemIconReplacer(QMainWindow):
         self.requirements.setStyleSheet('font-size: 12px; color: #666; font-weight: bold;')
         new_layout.addWidget(self.requirements)
         
+        # 与批处理的 --optimize 相同，默认不优化
+        self.optimize_check = QCheckBox('优化图标体积（无损）')
+        self.optimize_check.setToolTip('小尺寸使用调色板、PNG尝试多种压缩策略，显示效果不变')
+        new_layout.addWidget(self.optimize_check, 0, Qt.AlignCenter)
+        
         new_box.setLayout(new_layout)
         image_layout.addWidget(new_box)
         
@@ -211,25 +253,67 @@ class SystemIconReplacer(QMainWindow):
         self.replace_btn.setToolTip('开始替换系统图标')
         self.replace_btn.setStyleSheet(STYLES['replace_button'])
         
+        self.restore_btn = QPushButton('↩ 还原系统文件')
+        self.restore_btn.clicked.connect(self.restore_system_file)
+        self.restore_btn.setMinimumHeight(50)
+        self.restore_btn.setVisible(False)
+        self.restore_btn.setToolTip('用替换前的备份还原系统文件')
+        self.restore_btn.setStyleSheet(STYLES['button'])
+        
+        self.cancel_btn = QPushButton('取消')
+        self.cancel_btn.clicked.connect(self.cancel_replace)
+        self.cancel_btn.setMinimumHeight(50)
+        self.cancel_btn.setVisible(False)
+        self.cancel_btn.setToolTip('取消正在进行的替换操作')
+        self.cancel_btn.setStyleSheet(STYLES['button'])
+        
         # 分配按钮宽度
         button_layout.addWidget(self.select_btn)
         button_layout.addWidget(self.preview_btn)
         button_layout.addWidget(self.replace_btn)
+        button_layout.addWidget(self.restore_btn)
+        button_layout.addWidget(self.cancel_btn)
         button_layout.setStretch(0, 1)
         button_layout.setStretch(1, 1)
         button_layout.setStretch(2, 2)
         
         layout.addLayout(button_layout)
         
+    @staticmethod
+    def read_default_icon(context):
+        """后台任务：读取系统文件中的启动图标，返回 (QImage, 图标信息)，读取失败时返回 (None, None)"""
+        try:
+            from pe_resources import extract_icon_group
+            with span('gui:read_default_icon', cat='gui'):
+                ico_data = extract_icon_group(TARGET_FILE, ICON_RESOURCE_ID, largest_only=True)
+            image = QImage.fromData(ico_data, 'ICO')
+            if not image.isNull():
+                return image, f"资源ID: {ICON_RESOURCE_ID}\n尺寸: {image.width()}x{image.height()}\n格式: ICO（系统文件）"
+        except Exception:
+            pass
+        return None, None
+        
     def load_default_icon(self):
-        """加载默认Windows图标预览（使用image文件夹中的图片）"""
-        # 尝试从image文件夹加载图片
-        image_path = os.path.join(os.path.dirname(__file__), '../image/OIP-C.jpg')
-        
-        if os.path.exists(image_path):
-            # 加载图片并调整大小
-            pixmap = QPixmap(image_path)
-            scaled_pixmap = pixmap.scaled(*PREVIEW_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        """加载默认Windows图标预览（在后台读取，完成后显示）"""
+        self.scheduler.submit(self.read_default_icon, priority=JOB_PRIORITY_HIGH, on_result=self.show_default_icon)
+        
+    def show_baked_preview(self):
+        """显示随程序分发的默认预览图（已缩放为预览尺寸并铺好黑色背景，见 bake_assets.py）"""
+        pixmap = QPixmap(resource_path(*DEFAULT_PREVIEW_ASSET))
+        if not pixmap.isNull():
+            self.original_preview.setPixmap(pixmap)
+        else:
+            self.show_default_icon((None, None))
+        
+    def show_default_icon(self, loaded):
+        """显示默认图标预览（没有读取到系统图标时保留当前预览，尚无预览时绘制Windows标志）"""
+        image, info = loaded
+        if info:
+            self.original_info.setText(info)
+        
+        if image is not None:
+            # 调整大小
+            scaled_pixmap = QPixmap.fromImage(image).scaled(*PREVIEW_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation)
             
             # 创建黑色背景
             final_pixmap = QPixmap(*PREVIEW_SIZE)
@@ -244,7 +328,7 @@ class SystemIconReplacer(QMainWindow):
             painter.end()
             
             self.original_preview.setPixmap(final_pixmap)
-        else:
+        elif self.original_preview.pixmap() is None or self.original_preview.pixmap().isNull():
             # 如果图片不存在，使用默认绘制
             pixmap = QPixmap(*PREVIEW_SIZE)
             pixmap.fill(Qt.black)
@@ -275,7 +359,7 @@ class SystemIconReplacer(QMainWindow):
             self.original_preview.setPixmap(pixmap)
         
     def select_image(self):
-        """选择图片文件"""
+        """选择图片文件（解码和预览缩放在后台进行）"""
         file_path, _ = QFileDialog.getOpenFileName(
             self, '选择图标图片',
             DEFAULT_IMAGE_DIR,
@@ -283,109 +367,63 @@ class SystemIconReplacer(QMainWindow):
         )
         
         if file_path:
-            if not check_image_validity(file_path):
-                show_message(self, '图片无效', '选择的图片文件无效或损坏，请重新选择。', 'warning')
-                return
-                
-            self.source_image_path = file_path
+            # 新的选择取代尚未完成的上一次
+            if self.select_job is not None:
+                self.scheduler.cancel(self.select_job)
+            with span('gui:select_image', cat='gui'):
+                self.status_label.setText(f'正在读取: {Path(file_path).name}...')
+                self.select_job = self.scheduler.submit(
+                    self.load_image_session, self.image_worker, file_path, priority=JOB_PRIORITY_HIGH,
+                    on_result=self.on_image_loaded, on_error=self.on_image_error)
+            
+    @staticmethod
+    def load_image_session(context, worker, file_path):
+        """后台任务：在图片处理进程中解码图片，生成预览图和正式图标，图片无效时返回None"""
+        # 同一次解码提供有效性、预览和图片信息；取消时处理进程会被重启
+        with span('gui:load_image_session', cat='gui'):
+            return worker.load(file_path, PREVIEW_SIZE, check=context.raise_if_cancelled)
+        
+    def on_image_loaded(self, session):
+        """图片读取完成"""
+        self.select_job = None
+        if session is None:
+            self.status_label.setText('图片无效')
+            show_message(self, '图片无效', '选择的图片文件无效或损坏，请重新选择。', 'warning')
+            return
             
-            # 显示预览
-            pixmap = QPixmap(file_path)
-            if not pixmap.isNull():
-                scaled = pixmap.scaled(*PREVIEW_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-                self.new_preview.setPixmap(scaled)
-                self.preview_btn.setEnabled(True)
-                self.replace_btn.setEnabled(True)
-                
-                # 显示图片信息
-                try:
-                    info = get_file_info(file_path)
-                    info_text = f"尺寸: {info['size'][0]}x{info['size'][1]}\n格式: {info['format']}\n模式: {info['mode']}"
-                    self.requirements.setText(info_text)
-                    self.status_label.setText(f'已选择: {Path(file_path).name}')
-                except Exception as e:
-                    show_message(self, '信息获取失败', f'获取图片信息失败: {str(e)}', 'warning')
+        self.source_image_path = session.file_path
+        self.image_session = session
+        
+        # 显示预览
+        with span('gui:on_image_loaded', cat='gui'):
+            pixmap = QPixmap.fromImage(session.preview_qimage(PREVIEW_SIZE))
+        if not pixmap.isNull():
+            self.new_preview.setPixmap(pixmap)
+            self.preview_btn.setEnabled(True)
+            self.replace_btn.setEnabled(True)
+            
+            # 显示图片信息
+            info = session.info()
+            info_text = f"尺寸: {info['size'][0]}x{info['size'][1]}\n格式: {info['format']}\n模式: {info['mode']}"
+            self.requirements.setText(info_text)
+            self.status_label.setText(f'已选择: {Path(session.file_path).name}')
+            
+    def on_image_error(self, error):
+        """图片读取失败"""
+        self.select_job = None
+        self.status_label.setText('信息获取失败')
+        show_message(self, '信息获取失败', f'获取图片信息失败: {str(error)}', 'warning')
                     
     def preview_effect(self):
         """预览效果"""
         if not self.source_image_path:
             return
-            
-        # 创建预览对话框
-        preview_dialog = QDialog(self)
-        preview_dialog.setWindowTitle('预览启动效果')
-        preview_dialog.setModal(True)
-        preview_dialog.resize(450, 350)
-        preview_dialog.setStyleSheet('background-color: #f8f9fa; border-radius: 10px;')
-        
-        layout = QVBoxLayout(preview_dialog)
-        layout.setSpacing(15)
-        layout.setContentsMargins(20, 20, 20, 20)
+        from dialogs import show_preview_dialog
         
-        # 模拟Windows启动界面
-        preview_label = QLabel('Windows启动画面预览')
-        preview_label.setAlignment(Qt.AlignCenter)
-        preview_label.setStyleSheet('font-size: 18px; font-weight: bold; padding: 10px; color: #2c3e50;')
-        layout.addWidget(preview_label)
-        
-        # 创建黑色背景的预览
-        preview_area = QLabel()
-        preview_area.setAlignment(Qt.AlignCenter)
-        preview_area.setMinimumSize(380, 220)
-        preview_area.setStyleSheet('background-color: black; border: 3px solid #ddd; border-radius: 8px;')
-        
-        # 加载并处理图片
-        source_pixmap = QPixmap(self.source_image_path)
-        if not source_pixmap.isNull():
-            # 创建圆形图标
-            pixmap = QPixmap(120, 120)
-            pixmap.fill(Qt.transparent)
-            
-            painter = QPainter(pixmap)
-            painter.setRenderHint(QPainter.Antialiasing)
-            
-            # 设置圆形裁剪
-            path = QPainterPath()
-            path.addEllipse(0, 0, 120, 120)
-            painter.setClipPath(path)
-            
-            # 绘制图片
-            painter.drawPixmap(0, 0, 120, 120, source_pixmap.scaled(
-                120, 120, Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation))
-            
-            # 绘制圆圈
-            painter.setClipping(False)
-            painter.setPen(QPen(QColor(0, 120, 215), 4))
-            painter.setBrush(Qt.NoBrush)
-            painter.drawEllipse(1, 1, 118, 118)
-            
-            painter.end()
-            
-            preview_area.setPixmap(pixmap)
-            
-        layout.addWidget(preview_area)
-        
-        # 加载动画
-        loading_label = QLabel('●')
-        loading_label.setAlignment(Qt.AlignCenter)
-        loading_label.setStyleSheet('color: white; font-size: 24px;')
-        layout.addWidget(loading_label)
-        
-        # 创建加载动画
-        self.animation = QPropertyAnimation(loading_label, b"opacity")
-        self.animation.setDuration(1000)
-        self.animation.setStartValue(1.0)
-        self.animation.setEndValue(0.3)
-        self.animation.setLoopCount(-1)
-        self.animation.start()
-        
-        close_btn = QPushButton('关闭预览')
-        close_btn.clicked.connect(preview_dialog.accept)
-        close_btn.setMinimumHeight(35)
-        close_btn.setStyleSheet(STYLES['button'])
-        layout.addWidget(close_btn)
-        
-        preview_dialog.exec_()
+        # 直接显示内存中处理好的正式图标（已带形状蒙版），与写入系统的效果一致
+        with span('gui:preview_effect', cat='gui'):
+            icon_image = self.image_session.icon_qimage((120, 120))
+        show_preview_dialog(self, icon_image)
         
     def replace_system_icon(self):
         """实际替换系统图标"""
@@ -405,41 +443,76 @@ class SystemIconReplacer(QMainWindow):
         ):
             return
             
-        try:
-            self.progress_bar.setVisible(True)
-            self.status_label.setText('正在处理图标...')
-            QApplication.processEvents()
-            
-            # 处理图标
-            self.progress_bar.setValue(20)
-            self.processed_ico_path, self.processed_png_path = process_icon(self.source_image_path, self.temp_dir)
-            
-            self.progress_bar.setValue(40)
-            self.status_label.setText('正在备份系统文件...')
-            QApplication.processEvents()
-            
-            # 系统文件路径
-            backup_file = os.path.join(self.temp_dir, 'imageres.dll.backup')
-            backup_path = backup_system_file(TARGET_FILE, self.temp_dir)
-            
-            self.progress_bar.setValue(60)
-            self.status_label.setText('正在创建替换脚本...')
-            QApplication.processEvents()
-            
-            # 创建替换脚本
-            script_path = create_replace_script(self.processed_ico_path, backup_path, TARGET_FILE, self.temp_dir)
-            
-            self.progress_bar.setValue(80)
-            self.status_label.setText('正在准备替换说明...')
-            QApplication.processEvents()
-            
-            # 显示完成信息
-            self.show_completion_dialog(script_path, backup_path)
-            
-            self.progress_bar.setValue(100)
+        self.set_busy(True)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(True)
+        self.status_label.setText('正在处理图标...')
+        self.replace_job = self.scheduler.submit(
+            self.build_replacement, self.source_image_path, self.image_session, self.optimize_check.isChecked(),
+            on_progress=self.on_job_progress,
+            on_result=self.on_replace_finished,
+            on_error=self.on_replace_error,
+            on_cancelled=lambda: self.status_label.setText('已取消'),
+            on_finished=self.on_replace_done)
+        
+    def build_replacement(self, context, source_path, session, optimize):
+        """后台任务：按依赖图并发处理图标、备份系统文件、创建还原点并生成替换脚本（不访问界面）"""
+        from replace_pipeline import build_replace_stages, run_pipeline
+        
+        stages = build_replace_stages(source_path, self.temp_dir, session=session,
+                                      encode_icon=self.image_worker.encode, helper=self.privileged_helper,
+                                      optimize=optimize)
+        with span('gui:build_replacement', cat='gui'):
+            results, report = run_pipeline(
+                stages,
+                progress=lambda fraction, text: context.report(90 * fraction, text),
+                check=context.raise_if_cancelled)
+        
+        context.report(90, '正在准备替换说明...')
+        ico_path, png_path = results['encode']
+        # 优化成功时使用体积更小的ICO
+        optimized = results.get('optimize')
+        if optimized:
+            ico_path = optimized[0]
+        return {
+            "ico_path": ico_path,
+            "png_path": png_path,
+            "script_path": results['script'],
+            "backup_path": results['backup'],
+            "patched_path": results['patch'],
+            "manifest_path": results['store'],
+            "restore_point": results['restore_point'],
+            "report": report,
+            "optimize_report": optimized[1] if optimized else None,
+        }
+        
+    def on_job_progress(self, percent, text):
+        """后台任务进度"""
+        self.progress_bar.setValue(percent)
+        if text:
+            self.status_label.setText(text)
+        
+    def on_replace_finished(self, result):
+        """替换准备完成"""
+        self.processed_ico_path = result["ico_path"]
+        self.processed_png_path = result["png_path"]
+        
+        # 先更新状态，对话框中选择立即替换时由替换任务接着更新
+        self.progress_bar.setValue(100)
+        if result["patched_path"]:
+            self.status_label.setText('图标处理完成，可以立即替换，或以管理员身份运行替换脚本')
+        else:
             self.status_label.setText('图标处理完成，请查看上方说明进行手动替换')
+        
+        # 显示完成信息（对话框为模态，区间包含用户阅读的时间）
+        with span('gui:show_completion_dialog', cat='gui'):
+            self.show_completion_dialog(
+                result["script_path"], result["backup_path"], result["patched_path"], result["manifest_path"],
+                result["restore_point"], result["report"], result["optimize_report"])
             
-        except FileNotFoundError as e:
+    def on_replace_error(self, e):
+        """替换过程出错"""
+        if isinstance(e, FileNotFoundError):
             show_message(
                 self, '文件不存在', 
                 '无法找到指定的文件', 
@@ -447,15 +520,15 @@ class SystemIconReplacer(QMainWindow):
                 details=str(e)
             )
             self.status_label.setText('文件不存在')
-        except PermissionError as e:
+        elif isinstance(e, PermissionError):
             show_message(
                 self, '权限不足', 
-                '操作失败，请确保以管理员身份运行程序', 
+                '操作失败，请在权限请求中允许以管理员身份运行', 
                 'critical',
                 details=str(e)
             )
             self.status_label.setText('权限不足')
-        except ValueError as e:
+        elif isinstance(e, ValueError):
             show_message(
                 self, '参数错误', 
                 '输入参数有误', 
@@ -463,7 +536,7 @@ class SystemIconReplacer(QMainWindow):
                 details=str(e)
             )
             self.status_label.setText('参数错误')
-        except Exception as e:
+        else:
             show_message(
                 self, '替换失败', 
                 '替换过程中出错', 
@@ -471,98 +544,138 @@ class SystemIconReplacer(QMainWindow):
                 details=str(e)
             )
             self.status_label.setText('替换失败')
-        finally:
-            self.progress_bar.setVisible(False)
             
-    def show_completion_dialog(self, script_path, backup_path):
-        """显示完成对话框"""
-        result_dialog = QDialog(self)
-        result_dialog.setWindowTitle('替换完成')
-        result_dialog.setModal(True)
-        result_dialog.resize(550, 500)
-        result_dialog.setStyleSheet('background-color: #f8f9fa; border-radius: 10px;')
-        
-        layout = QVBoxLayout(result_dialog)
-        layout.setSpacing(15)
-        layout.setContentsMargins(20, 20, 20, 20)
-        
-        info_label = QLabel('✅ 图标处理完成！')
-        info_label.setStyleSheet('font-size: 20px; font-weight: bold; color: #27ae60; padding: 10px;')
-        info_label.setAlignment(Qt.AlignCenter)
-        layout.addWidget(info_label)
-        
-        # 显示下一步操作
-        steps = QTextEdit()
-        steps.setReadOnly(True)
-        steps.setStyleSheet('''
-            QTextEdit {
-                border: 1px solid #ddd;
-                border-radius: 8px;
-                padding: 15px;
-                font-size: 14px;
-                background-color: #ffffff;
-            }
-        ''')
-        steps.setPlainText(f'''
-图标已处理完成，但需要手动完成以下步骤：
-
-🔧 手动替换步骤：
-
-1. 下载 Resource Hacker 工具
-   https://www.angusj.com/resourcehacker/
-
-2. 以管理员身份运行 Resource Hacker
-
-3. 打开文件: {TARGET_FILE}
-
-4. 定位到图标组: Icon Group -> {ICON_RESOURCE_ID} -> 1033
-
-5. 删除现有图标
-
-6. 从操作菜单中选择: "添加图标资源"
-   选择文件: {self.processed_ico_path}
-
-7. 保存为新的 DLL 文件
-
-8. 清除图标缓存:
-   a. 按 Win+R，输入: ie4uinit.exe -show
-   b. 重启电脑
-
-⚠️ 注意事项:
-• 操作前务必创建系统还原点
-• 替换失败可能导致系统异常
-• 建议在虚拟机中测试
+    def on_replace_done(self):
+        """替换任务结束（无论成功、失败或取消）"""
+        self.replace_job = None
+        self.progress_bar.setVisible(False)
+        self.set_busy(False)
+        
+    def cancel_replace(self):
+        """取消正在进行的替换"""
+        if self.replace_job is not None:
+            self.status_label.setText('正在取消...')
+            self.scheduler.cancel(self.replace_job)
+            
+    def set_busy(self, busy):
+        """任务进行中禁用会改变状态的按钮"""
+        self.select_btn.setEnabled(not busy)
+        self.preview_btn.setEnabled(not busy and self.source_image_path is not None)
+        self.replace_btn.setEnabled(not busy and self.source_image_path is not None)
+        self.restore_btn.setEnabled(not busy)
+        self.cancel_btn.setVisible(busy)
+        
+    def show_completion_dialog(self, script_path, backup_path, patched_path=None, manifest_path=None,
+                               restore_point=None, report=None, optimize_report=None):
+        """显示完成对话框（已生成新系统文件时可以直接替换）"""
+        from dialogs import show_completion_dialog
+        on_apply = None
+        if patched_path:
+            # 等替换准备任务结束后再开始写入，避免两个任务的忙碌状态交错
+            on_apply = lambda: QTimer.singleShot(0, lambda: self.apply_replacement(patched_path))
+        show_completion_dialog(self, self.processed_ico_path, script_path, backup_path, patched_path,
+                               manifest_path, restore_point, report, optimize_report, on_apply=on_apply)
+        
+    @staticmethod
+    def write_system_file(context, helper, patched_path):
+        """后台任务：由管理员助手进程写入新系统文件，然后刷新图标缓存"""
+        from system_ops import clear_icon_cache
+        
+        context.report(0, '正在替换系统文件（请在权限请求中选择“是”）...')
+        old_path, _ = helper.write(patched_path, TARGET_FILE)
+        context.report(90, '正在刷新图标缓存...')
+        clear_icon_cache()
+        return old_path
+        
+    def apply_replacement(self, patched_path):
+        """用生成的新系统文件替换系统文件"""
+        self.set_busy(True)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(True)
+        self.replace_job = self.scheduler.submit(
+            self.write_system_file, self.privileged_helper, patched_path,
+            on_progress=self.on_job_progress,
+            on_result=lambda old_path: self.on_apply_finished(),
+            on_error=self.on_replace_error,
+            on_finished=self.on_replace_done)
+        
+    def on_apply_finished(self):
+        """系统文件替换完成"""
+        self.refresh_restore_backup()
+        self.status_label.setText('系统文件已替换，重启电脑后生效')
+        show_message(self, '替换完成', f'系统文件已替换:\n{TARGET_FILE}\n\n重启电脑后新图标生效。', 'information')
+        
+    @staticmethod
+    def find_restore_backup(context):
+        """后台任务：在备份仓库中查找替换前的系统文件，返回 (清单路径, 备份时间)，不需要或无法还原时返回None
 
-📁 生成的文件:
-• 图标文件: {self.processed_ico_path}
-• 备份文件: {backup_path}
-• 替换脚本: {script_path}
-''')
-        layout.addWidget(steps)
-        
-        close_btn = QPushButton('关闭')
-        close_btn.clicked.connect(result_dialog.accept)
-        close_btn.setMinimumHeight(35)
-        close_btn.setStyleSheet(STYLES['button'])
-        layout.addWidget(close_btn)
-        
-        result_dialog.exec_()
-        
-    def show_admin_warning(self):
-        """显示管理员权限警告"""
-        show_message(
-            self, '权限警告',
-            '当前程序可能没有管理员权限！\n\n' +
-            '替换系统图标需要管理员权限。\n\n' +
-            '请关闭程序，然后：\n' +
-            '1. 右键点击程序图标\n' +
-            '2. 选择"以管理员身份运行"\n\n' +
-            '否则可能无法替换系统文件。',
-            'warning'
-        )
+        系统文件与最早的备份（原始文件）相同时不需要还原；否则取与当前文件不同的最新一份，
+        且必须是管理员助手进程记录过的备份（助手进程只接受这样的备份）。
+        """
+        from backup_store import list_backups, load_manifest
+        from file_copy import sha256_file
+        
+        try:
+            recorded = recorded_backup_hashes()
+            current = sha256_file(TARGET_FILE)
+            if not recorded or current == recorded[0]:
+                return None
+            for manifest_path in reversed(list_backups(BACKUP_STORE_DIR, os.path.basename(TARGET_FILE))):
+                manifest = load_manifest(manifest_path)
+                if manifest["sha256"] != current and manifest["sha256"] in recorded:
+                    return manifest_path, manifest["created"]
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+        
+    def refresh_restore_backup(self):
+        """在后台查找可还原的备份，更新还原按钮"""
+        self.scheduler.submit(self.find_restore_backup, priority=JOB_PRIORITY_LOW, on_result=self.show_restore_backup)
+        
+    def show_restore_backup(self, backup):
+        """显示或隐藏还原按钮"""
+        self.restore_backup = backup
+        self.restore_btn.setVisible(backup is not None)
+        
+    @staticmethod
+    def restore_from_backup(context, helper, manifest_path):
+        """后台任务：由管理员助手进程从备份仓库校验并还原系统文件"""
+        from system_ops import clear_icon_cache
+        
+        context.report(0, '正在还原系统文件...')
+        helper.restore(manifest_path, TARGET_FILE)
+        context.report(90, '正在刷新图标缓存...')
+        clear_icon_cache()
+        
+    def restore_system_file(self):
+        """用备份仓库中替换前的系统文件还原"""
+        if not self.restore_backup:
+            return
+        manifest_path, created = self.restore_backup
+        if not show_confirmation(self, '还原系统文件', f'确定要用 {created} 的备份还原系统文件吗？\n\n{manifest_path}'):
+            return
+        self.set_busy(True)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(True)
+        self.replace_job = self.scheduler.submit(
+            self.restore_from_backup, self.privileged_helper, manifest_path,
+            on_progress=self.on_job_progress,
+            on_result=lambda _: self.on_restore_finished(),
+            on_error=self.on_replace_error,
+            on_finished=self.on_replace_done)
+        
+    def on_restore_finished(self):
+        """系统文件还原完成"""
+        self.refresh_restore_backup()
+        self.status_label.setText('系统文件已还原，重启电脑后生效')
         
     def closeEvent(self, event):
-        """清理临时文件"""
+        """取消后台任务并清理临时文件（等待时间有上限）"""
+        self.scheduler.cancel_all()
+        # 先关闭两个子进程的客户端，正在等待它们（UAC提示、复制大文件）的任务立即失败
+        self.privileged_helper.close()
+        self.image_worker.stop()
+        self.scheduler.shutdown(JOB_SHUTDOWN_TIMEOUT_MS)
         if self.temp_dir:
             cleanup_temp_dir(self.temp_dir)
         event.accept()
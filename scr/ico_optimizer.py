@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ICO体积优化模块 - 在显示效果不变（或误差低于阈值）的前提下缩小ICO
+
+ICO最终写入系统DLL的资源节，开机和每次加载图标时都要读取，每KB都有I/O成本。
+- 16~48像素的条目尝试8位/4位调色板加1位透明掩码，只用于没有半透明像素的条目（1位掩码无法表示抗锯齿边缘），
+  颜色默认必须无损；
+- PNG条目先清空完全透明像素的颜色（不可见），再用多种zlib压缩级别和策略并行编码，保留最小的结果；
+- 其他条目和没有变小的条目保持原样。
+"""
+
+import io
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from config import (ICO_PALETTE_MAX_SIZE, ICO_PALETTE_MAX_RMSE, ICO_PALETTE_ALPHA_THRESHOLD,
+                    ICO_PNG_LEVELS, ICO_PNG_STRATEGIES, ICO_OPTIMIZE_WORKERS)
+from pe_resources import IconEntry, parse_ico, build_ico
+from ico_writer import BITMAPINFOHEADER, pad_dib_rows, and_mask
+from bounded_decode import PNG_SIGNATURE
+from utils import format_file_size
+from tracing import traced
+
+ZLIB_STRATEGIES = {
+    'default': zlib.Z_DEFAULT_STRATEGY,
+    'filtered': zlib.Z_FILTERED,
+    'huffman': zlib.Z_HUFFMAN_ONLY,
+    'rle': zlib.Z_RLE,
+    'fixed': zlib.Z_FIXED,
+}
+
+
+def decode_entry(entry):
+    """把PNG或32位DIB条目解码为RGBA图片，其他格式返回None"""
+    data = bytes(entry.data)
+    if data.startswith(PNG_SIGNATURE):
+        image = Image.open(io.BytesIO(data))
+        return image.convert('RGBA')
+    if len(data) < BITMAPINFOHEADER.size:
+        return None
+    header_size, width, height, _, bit_count, compression = BITMAPINFOHEADER.unpack_from(data)[:6]
+    if header_size != BITMAPINFOHEADER.size or bit_count != 32 or compression != 0:
+        return None
+    height //= 2
+    pixels = data[header_size:header_size + width * height * 4]
+    if len(pixels) < width * height * 4:
+        return None
+    return Image.frombuffer('RGBA', (width, height), pixels, 'raw', 'BGRA', 0, -1).copy()
+
+
+def premultiplied_rmse(original, candidate):
+    """按预乘透明度比较两张RGBA图片的均方根误差（0~255），完全透明像素的颜色不影响结果"""
+    a = np.asarray(original, dtype=np.float32)
+    b = np.asarray(candidate, dtype=np.float32)
+    a[..., :3] *= a[..., 3:] / 255.0
+    b[..., :3] *= b[..., 3:] / 255.0
+    return float(np.sqrt(np.mean((a - b) ** 2)))
+
+
+def clear_transparent(image):
+    """把完全透明像素的颜色清零（显示效果不变，压缩率更高）"""
+    pixels = np.array(image)
+    pixels[pixels[..., 3] == 0] = 0
+    return Image.fromarray(pixels, 'RGBA')
+
+
+def encode_palette_entry(image, bits, alpha_threshold=ICO_PALETTE_ALPHA_THRESHOLD):
+    """编码为调色板DIB条目（透明度按阈值二值化为AND掩码）
+
+    返回 (IconEntry, 解码后的RGBA图片)。颜色数不超过调色板容量时颜色无损，否则用中位切分量化。
+    """
+    pixels = np.asarray(image)
+    opaque = pixels[..., 3] >= alpha_threshold
+    # 最后一个调色板项保留为黑色，供透明像素使用（AND掩码为1时XOR部分必须为0）
+    slots = (1 << bits) - 1
+    rgb = pixels[..., :3]
+    keys = (rgb[..., 0].astype(np.uint32) << 16) | (rgb[..., 1].astype(np.uint32) << 8) | rgb[..., 2]
+    colors, inverse = np.unique(keys[opaque], return_inverse=True)
+    indices = np.full(keys.shape, slots, dtype=np.uint8)
+    if len(colors) <= slots:
+        palette = np.stack([(colors >> 16) & 0xFF, (colors >> 8) & 0xFF, colors & 0xFF], axis=1).astype(np.uint8)
+        indices[opaque] = inverse
+    else:
+        # 透明像素填充为不透明部分的某个颜色，避免占用调色板
+        filled = rgb.copy()
+        filled[~opaque] = rgb[opaque][0] if opaque.any() else 0
+        quantized = Image.fromarray(filled, 'RGB').quantize(
+            slots, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
+        palette = np.array(quantized.getpalette()[:slots * 3], dtype=np.uint8).reshape(-1, 3)
+        indices[opaque] = np.asarray(quantized)[opaque]
+    palette = np.vstack([palette, np.zeros((slots + 1 - len(palette), 3), dtype=np.uint8)])
+    palette[slots] = 0
+
+    width, height = image.size
+    index_image = Image.fromarray(indices, 'P').transpose(Image.Transpose.FLIP_TOP_BOTTOM)
+    rawmode = 'P' if bits == 8 else f'P;{bits}'
+    xor = pad_dib_rows(index_image.tobytes('raw', rawmode), (width * bits + 7) // 8)
+    alpha = Image.fromarray(np.where(opaque, 255, 0).astype(np.uint8), 'L')
+    mask = and_mask(alpha)
+    header = BITMAPINFOHEADER.pack(BITMAPINFOHEADER.size, width, height * 2, 1, bits, 0,
+                                   len(xor) + len(mask), 0, 0, slots + 1, 0)
+    # 调色板按 BGRX 存储
+    bgrx = np.zeros((slots + 1, 4), dtype=np.uint8)
+    bgrx[:, :3] = palette[:, ::-1]
+    data = header + bgrx.tobytes() + xor + mask
+
+    decoded = np.zeros(pixels.shape, dtype=np.uint8)
+    decoded[..., :3] = palette[indices]
+    decoded[..., 3] = np.where(opaque, 255, 0)
+    color_count = (slots + 1) % 256
+    return IconEntry(width, height, color_count, 1, bits, None, data), Image.fromarray(decoded, 'RGBA')
+
+
+def has_partial_alpha(image):
+    """是否有半透明像素（透明度既不是0也不是255）"""
+    alpha = np.asarray(image)[..., 3]
+    return bool(np.any((alpha != 0) & (alpha != 255)))
+
+
+def _palette_candidate(image, bits, max_rmse):
+    """调色板候选，有半透明像素或颜色误差超过阈值时返回None"""
+    if has_partial_alpha(image):
+        return None
+    entry, decoded = encode_palette_entry(image, bits)
+    error = premultiplied_rmse(image, decoded)
+    if error > max_rmse:
+        return None
+    return entry, f'{bits}位调色板（误差 {error:.2f}）'
+
+
+def _png_candidate(image, level, strategy):
+    """按指定压缩级别和策略编码PNG"""
+    output = io.BytesIO()
+    image.save(output, 'PNG', compress_level=level, compress_type=ZLIB_STRATEGIES[strategy])
+    width, height = image.size
+    return IconEntry(width, height, 0, 1, 32, None, output.getvalue()), f'PNG level={level} {strategy}'
+
+
+@traced()
+def optimize_ico(data, max_workers=ICO_OPTIMIZE_WORKERS, max_rmse=ICO_PALETTE_MAX_RMSE,
+                 palette_max_size=ICO_PALETTE_MAX_SIZE, levels=ICO_PNG_LEVELS, strategies=ICO_PNG_STRATEGIES):
+    """优化ICO数据，返回 (新的ICO数据, 报告)
+
+    报告为 {"entries": [{size, before, after, encoding}], "before", "after"}，
+    所有候选编码在线程池中并行生成（PIL编码PNG和zlib压缩时会释放GIL）。
+    """
+    entries = parse_ico(data)
+    images = [decode_entry(entry) for entry in entries]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        candidates = []
+        for entry, image in zip(entries, images):
+            futures = []
+            if image is None:
+                pass
+            elif bytes(entry.data[:8]) == PNG_SIGNATURE:
+                cleared = clear_transparent(image)
+                futures = [executor.submit(_png_candidate, cleared, level, strategy)
+                           for level in levels for strategy in strategies]
+            elif entry.width <= palette_max_size and entry.height <= palette_max_size:
+                futures = [executor.submit(_palette_candidate, image, bits, max_rmse) for bits in (4, 8)]
+            candidates.append(futures)
+
+        optimized = []
+        report_entries = []
+        for entry, futures in zip(entries, candidates):
+            best, encoding = entry, '原样保留'
+            for future in futures:
+                result = future.result()
+                if result is not None and len(result[0].data) < len(best.data):
+                    best, encoding = result
+            optimized.append(best)
+            report_entries.append({
+                "size": (entry.width, entry.height),
+                "before": len(entry.data),
+                "after": len(best.data),
+                "encoding": encoding,
+            })
+
+    output = build_ico(optimized)
+    report = {"entries": report_entries, "before": len(data), "after": len(output)}
+    return output, report
+
+
+def optimize_ico_file(input_path, output_path=None, **options):
+    """优化ICO文件（默认原地覆盖），返回报告"""
+    with open(input_path, 'rb') as f:
+        data = f.read()
+    output, report = optimize_ico(data, **options)
+    output_path = output_path or input_path
+    with open(output_path, 'wb') as f:
+        f.write(output)
+    return report
+
+
+def format_optimize_report(report):
+    """把优化报告格式化为文本"""
+    lines = [f"{'尺寸':<10}{'优化前':>12}{'优化后':>12}{'节省':>12}  编码"]
+    for item in report["entries"]:
+        size = f"{item['size'][0]}x{item['size'][1]}"
+        saved = item["before"] - item["after"]
+        lines.append(f"{size:<10}{item['before']:>12}{item['after']:>12}{saved:>12}  {item['encoding']}")
+    saved = report["before"] - report["after"]
+    lines.append(f"ICO {format_file_size(report['before'])} -> {format_file_size(report['after'])}，"
+                 f"节省 {format_file_size(saved)}（{saved * 100 / report['before'] if report['before'] else 0:.1f}%）")
+    return '\n'.join(lines)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ICO写入模块 - 把已处理好的各尺寸图标原样写入ICO
+
+PIL 的 ICO 编码器会从第一张图片重新缩放出其他尺寸，丢掉逐尺寸生成的蒙版。
+这里每个条目直接编码对应尺寸的图片：大尺寸为PNG，小尺寸为32位BMP（DIB，带AND掩码），
+各条目在线程池中并行编码（PIL编码PNG时会释放GIL），最后按顺序拼接。
+"""
+
+import io
+import struct
+from concurrent.futures import Future
+
+from PIL import Image
+
+from config import ICO_PNG_MIN_SIZE
+from pe_resources import IconEntry, build_ico
+from tracing import span
+
+BITMAPINFOHEADER = struct.Struct('<IiiHHIIiiII')
+
+
+def _resolve(item):
+    """取出图片（也接受尚未完成的 Future）"""
+    image = item.result() if isinstance(item, Future) else item
+    # RGBABuffer 等包装对象
+    return getattr(image, 'image', image)
+
+
+def encode_png_entry(image):
+    """编码为PNG条目数据"""
+    output = io.BytesIO()
+    image.save(output, 'PNG')
+    return output.getvalue()
+
+
+def pad_dib_rows(packed, row_bytes):
+    """把紧密排列的行数据补齐为DIB要求的4字节对齐"""
+    stride = (row_bytes + 3) // 4 * 4
+    if stride == row_bytes:
+        return packed
+    padding = b'\x00' * (stride - row_bytes)
+    return b''.join(packed[i:i + row_bytes] + padding for i in range(0, len(packed), row_bytes))
+
+
+def and_mask(alpha):
+    """生成AND掩码：完全透明的像素置1，自下而上，每行按4字节对齐"""
+    mask = alpha.point(lambda value: 255 if value == 0 else 0, '1').transpose(Image.Transpose.FLIP_TOP_BOTTOM)
+    return pad_dib_rows(mask.tobytes('raw', '1'), (alpha.width + 7) // 8)
+
+
+def encode_dib_entry(image):
+    """编码为32位BMP条目数据（BITMAPINFOHEADER + 自下而上的BGRA像素 + AND掩码）"""
+    if image.mode != 'RGBA':
+        image = image.convert('RGBA')
+    width, height = image.size
+    pixels = image.tobytes('raw', 'BGRA', 0, -1)
+    mask = and_mask(image.getchannel('A'))
+    # ICO中的DIB高度为XOR与AND两部分之和
+    header = BITMAPINFOHEADER.pack(BITMAPINFOHEADER.size, width, height * 2, 1, 32, 0,
+                                   len(pixels) + len(mask), 0, 0, 0, 0)
+    return header + pixels + mask
+
+
+def encode_entry(image, png_min_size=ICO_PNG_MIN_SIZE):
+    """把一张图标编码为 IconEntry（icon_id为None）"""
+    image = _resolve(image)
+    width, height = image.size
+    png = width >= png_min_size or height >= png_min_size
+    with span('encode', size=f'{width}x{height}', format='PNG' if png else 'DIB') as current:
+        data = encode_png_entry(image) if png else encode_dib_entry(image)
+        current.set(bytes=len(data))
+    return IconEntry(width, height, 0, 1, 32, None, data)
+
+
+def write_ico(path, images, executor=None, png_min_size=ICO_PNG_MIN_SIZE):
+    """按给定顺序把图标写入ICO文件，返回 [IconEntry]
+
+    images 可以是PIL图片、RGBABuffer 或它们的 Future；传入线程池时各条目并行编码，
+    尚在渲染的图片一完成即开始编码。
+    """
+    if executor is None:
+        entries = [encode_entry(image, png_min_size) for image in images]
+    else:
+        futures = [executor.submit(encode_entry, image, png_min_size) for image in images]
+        entries = [future.result() for future in futures]
+    with open(path, 'wb') as f:
+        f.write(build_ico(entries))
+    return entries
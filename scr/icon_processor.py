@@ -5,49 +5,52 @@
 """
 
 import os
-from PIL import Image, ImageDraw
-from config import TARGET_SIZES
+from concurrent.futures import Future, ThreadPoolExecutor
+from PIL import Image, ImageChops
+from config import TARGET_SIZES, PYRAMID_MIN_SOURCE_RATIO, MASK_SHAPE, ICON_RENDER_WORKERS
+from shape_mask import get_mask
+from image_probe import probe_image
+from bounded_decode import open_reduced, reduce_for_target
+from rgba_buffer import RGBABuffer
+from ico_writer import write_ico
+from tracing import span
 
 
-def process_icon(input_path, output_dir):
-    """处理图标为系统格式"""
+def process_icon(input_path, output_dir=None, session=None, save_png=True, return_images=False):
+    """处理图标为系统格式（传入ImageSession时复用其解码结果）
+
+    只有指定 output_dir 时才写出文件（save_png 控制是否额外保存预览PNG），未写出的路径为None；
+    return_images 为True时额外返回各尺寸图标的 RGBABuffer 列表（顺序同TARGET_SIZES）。
+    各尺寸在线程池中并行缩放、蒙版并编码为ICO条目，每个条目直接使用对应尺寸的图片，不再重新缩放。
+    """
     try:
-        # 输出文件路径
-        output_ico = os.path.join(output_dir, 'boot_icon.ico')
-        output_png = os.path.join(output_dir, 'boot_icon.png')
-        
-        # 打开并处理图片
-        with Image.open(input_path) as img:
-            # 验证图片有效性
-            img.verify()
-            
-            # 重新打开图片
-            img = Image.open(input_path)
+        with span('process_icon', path=os.path.basename(input_path)), \
+                ThreadPoolExecutor(max_workers=ICON_RENDER_WORKERS) as executor:
+            if session is not None:
+                # 复用会话中已渲染的图标
+                buffers = session.icon_images()
+            else:
+                # 在内存预算内解码并缩小到工作分辨率，损坏的图片会在解码像素时报错
+                with span('decode'):
+                    img, source_size = open_reduced(input_path, largest_target_size())
+                buffers = render_icon_images(img, source_size, as_buffers=True, executor=executor)
             
-            # 检查图片尺寸
-            if img.size[0] < 128 or img.size[1] < 128:
-                raise ValueError("图片尺寸过小。建议使用至少256x256像素的图片")
+            output_ico = output_png = None
+            if output_dir is not None:
+                # 保存为ICO（多尺寸），某个尺寸渲染完成即开始编码
+                output_ico = os.path.join(output_dir, 'boot_icon.ico')
+                with span('write_ico'):
+                    write_ico(output_ico, buffers, executor)
             
-            # 转换为RGBA
-            if img.mode != 'RGBA':
-                img = img.convert('RGBA')
-            
-            # 处理不同尺寸的图标
-            processed_images = []
-            for size in TARGET_SIZES:
-                rounded_icon = create_rounded_icon(img, size)
-                processed_images.append(rounded_icon)
-            
-            # 保存为PNG（用于预览）
-            processed_images[0].save(output_png, 'PNG')
-            
-            # 保存为ICO（多尺寸）
-            processed_images[0].save(
-                output_ico, 
-                'ICO', 
-                sizes=[(size[0], size[1]) for size in TARGET_SIZES]
-            )
+            buffers = [_result(buffer) for buffer in buffers]
+            if output_dir is not None and save_png:
+                # 保存为PNG（持久化的预览图）
+                output_png = os.path.join(output_dir, 'boot_icon.png')
+                with span('save_png'):
+                    buffers[0].image.save(output_png, 'PNG')
         
+        if return_images:
+            return output_ico, output_png, buffers
         return output_ico, output_png
         
     except FileNotFoundError:
@@ -60,20 +63,116 @@ def process_icon(input_path, output_dir):
         raise Exception(f"处理图标时出错: {str(e)}")
 
 
-def create_rounded_icon(image, size):
-    """创建圆形图标"""
+def largest_target_size():
+    """返回TARGET_SIZES中面积最大的尺寸"""
+    return max(TARGET_SIZES, key=lambda size: size[0] * size[1])
+
+
+class _InlineExecutor:
+    """在调用线程中立即执行的执行器，接口与线程池相同"""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+def _result(item):
+    """取出结果（也接受普通值）"""
+    return item.result() if isinstance(item, Future) else item
+
+
+def render_icon_images(image, source_size, as_buffers=False, executor=None):
+    """按TARGET_SIZES生成处理后的图标图片列表（as_buffers为True时直接渲染到 RGBABuffer）
+
+    传入线程池时各尺寸并行缩放和蒙版，返回 Future 列表（顺序同TARGET_SIZES）。
+    """
+    # 检查图片尺寸
+    if source_size[0] < 128 or source_size[1] < 128:
+        raise ValueError("图片尺寸过小。建议使用至少256x256像素的图片")
+    
+    # 构建缩放金字塔（一次高质量缩小，其余尺寸逐级派生）
+    pyramid = build_resize_pyramid(image, TARGET_SIZES, executor=executor)
+    
+    # 处理不同尺寸的图标
+    if executor is not None:
+        return [executor.submit(_finish_icon, pyramid[size], size, as_buffers) for size in TARGET_SIZES]
+    return [_finish_icon(pyramid[size], size, as_buffers) for size in TARGET_SIZES]
+
+
+def _finish_icon(layer, size, as_buffers):
+    """对金字塔中的一层应用形状蒙版"""
+    layer = _result(layer)
+    into = RGBABuffer(size) if as_buffers else None
+    with span('mask', size=f'{size[0]}x{size[1]}'):
+        rounded_icon = create_rounded_icon(layer, size, into=into)
+    return into if as_buffers else rounded_icon
+
+
+def _resize_layer(source, size):
+    """从来源层缩放出一层（来源层可以是尚未完成的 Future）"""
+    source = _result(source)
+    if source.size == tuple(size):
+        return source
+    with span('resize', size=f'{size[0]}x{size[1]}', source=f'{source.width}x{source.height}'):
+        return source.resize(size, Image.Resampling.LANCZOS)
+
+
+def build_resize_pyramid(image, sizes, min_source_ratio=PYRAMID_MIN_SOURCE_RATIO, executor=None):
+    """构建缩放金字塔，返回 {尺寸: RGBA图片}
+    
+    只对最大尺寸从原图做一次高质量缩小，较小尺寸从满足质量保护比例的最近中间层派生。
+    传入线程池时返回 {尺寸: Future}，每层在其来源层完成后立即开始缩放。
+    """
+    ordered = sorted(set(sizes), key=lambda size: size[0] * size[1], reverse=True)
+    largest = ordered[0]
+    submit = (executor or _InlineExecutor()).submit
+    
+    with span('convert'):
+        # draft/reduce 粗缩放并转换为RGBA
+        base = reduce_for_target(image, largest)
+    pyramid = {largest: submit(_resize_layer, base, largest)}
+    
+    for index, size in enumerate(ordered[1:], start=1):
+        # 从最接近的较大层开始向上查找，直到比例满足质量保护
+        source = base
+        for candidate in reversed(ordered[:index]):
+            if (candidate[0] >= size[0] * min_source_ratio and
+                    candidate[1] >= size[1] * min_source_ratio):
+                source = pyramid[candidate]
+                break
+        # 来源层先于本层提交，线程池按提交顺序取任务，等待来源层不会死锁
+        pyramid[size] = submit(_resize_layer, source, size)
+    
+    if executor is None:
+        return {size: future.result() for size, future in pyramid.items()}
+    return pyramid
+
+
+def create_rounded_icon(image, size, shape=MASK_SHAPE, into=None, **shape_params):
+    """创建圆形（或其他形状）图标（传入 RGBABuffer 时直接写入该缓冲区）"""
     try:
-        # 调整尺寸
-        resized = image.resize(size, Image.Resampling.LANCZOS)
+        # 调整尺寸（金字塔中已是目标尺寸时直接使用）
+        if image.size == tuple(size):
+            resized = image
+        else:
+            resized = image.resize(size, Image.Resampling.LANCZOS)
+        if resized.mode != 'RGBA':
+            resized = resized.convert('RGBA')
         
-        # 创建圆形蒙版
-        mask = Image.new('L', size, 0)
-        draw = ImageDraw.Draw(mask)
-        draw.ellipse([(0, 0), size], fill=255)
+        # 获取缓存的抗锯齿蒙版
+        mask = get_mask(shape, size, **shape_params)
         
-        # 应用圆形
-        rounded = Image.new('RGBA', size)
-        rounded.paste(resized, mask=mask)
+        # 将蒙版乘到透明通道上，边缘颜色不会被黑色背景污染
+        if into is not None:
+            rounded = into.image
+            rounded.paste(resized, (0, 0))
+        else:
+            rounded = resized.copy()
+        rounded.putalpha(ImageChops.multiply(resized.getchannel('A'), mask))
         
         return rounded
         
@@ -81,26 +180,26 @@ def create_rounded_icon(image, size):
         raise Exception(f"创建圆形图标失败: {str(e)}")
 
 
-def create_preview_icon(image_path, size=(100, 100)):
+def create_preview_icon(image_path, size=(100, 100), shape=MASK_SHAPE, **shape_params):
     """创建预览图标"""
     try:
-        with Image.open(image_path) as img:
-            # 转换为RGBA
-            if img.mode != 'RGBA':
-                img = img.convert('RGBA')
-            
-            # 创建圆形图标
-            rounded = create_rounded_icon(img, size)
-            
-            return rounded
+        # 在内存预算内快速缩小并转换为RGBA
+        img, _ = open_reduced(image_path, size)
+        
+        # 创建圆形图标（与正式图标共用蒙版缓存）
+        rounded = create_rounded_icon(img, size, shape, **shape_params)
+        
+        return rounded
             
     except Exception as e:
         raise Exception(f"创建预览图标失败: {str(e)}")
 
 
 def check_image_validity(image_path):
-    """检查图片有效性"""
+    """检查图片有效性（只读取文件头和文件尾，未知格式才交给PIL）"""
     try:
+        if probe_image(image_path) is not None:
+            return True
         with Image.open(image_path) as img:
             # 检查是否为有效的图片
             img.verify()
@@ -110,8 +209,11 @@ def check_image_validity(image_path):
 
 
 def get_image_info(image_path):
-    """获取图片信息"""
+    """获取图片信息（只读取文件头，未知格式才交给PIL）"""
     try:
+        probe = probe_image(image_path)
+        if probe is not None:
+            return probe.to_dict()
         with Image.open(image_path) as img:
             return {
                 "size": img.size,
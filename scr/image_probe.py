@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片探测模块 - 只读取文件头（和少量文件尾）获取图片信息
+
+支持 PNG、JPEG、BMP、GIF、WebP、ICO，返回格式、尺寸、模式、是否有透明通道和帧数，
+并通过文件尾标记或声明的数据长度快速识别被截断的文件。不依赖第三方库；
+完整解码仍然交给PIL。格式名和模式与PIL保持一致，便于替换 Image.open 的元数据用法。
+"""
+
+import os
+import struct
+from collections import namedtuple
+
+HEAD_SIZE = 512
+TAIL_SIZE = 1024
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_IEND = b'\x00\x00\x00\x00IEND\xaeB`\x82'
+PNG_MODES = {0: 'L', 2: 'RGB', 3: 'P', 4: 'LA', 6: 'RGBA'}
+
+# 除DHT(C4)、JPG(C8)、DAC(CC)以外的 SOF0-SOF15
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+JPEG_MODES = {1: 'L', 3: 'RGB', 4: 'CMYK'}
+
+BMP_COMPRESSION_RGB = 0
+BMP_COMPRESSION_BITFIELDS = 3
+BMP_COMPRESSION_ALPHABITFIELDS = 6
+
+
+class ImageProbe(namedtuple('ImageProbe', 'format width height mode has_alpha frames')):
+    """探测结果"""
+    __slots__ = ()
+
+    @property
+    def size(self):
+        return (self.width, self.height)
+
+    def to_dict(self):
+        """转换为与 get_image_info 相同的字典格式"""
+        return {
+            "size": self.size,
+            "format": self.format,
+            "mode": self.mode,
+            "width": self.width,
+            "height": self.height,
+            "has_alpha": self.has_alpha,
+            "frames": self.frames
+        }
+
+
+class _Reader:
+    """按需读取文件头和文件尾"""
+
+    def __init__(self, f):
+        self.f = f
+        self.file_size = os.fstat(f.fileno()).st_size
+        self.head = f.read(HEAD_SIZE)
+        self._tail = None
+
+    def read_at(self, offset, count):
+        """读取任意位置的数据（头部范围内直接返回缓冲）"""
+        if offset + count <= len(self.head):
+            return self.head[offset:offset + count]
+        self.f.seek(offset)
+        data = self.f.read(count)
+        if len(data) < count:
+            raise ValueError("文件被截断")
+        return data
+
+    def tail(self):
+        if self._tail is None:
+            start = max(0, self.file_size - TAIL_SIZE)
+            self.f.seek(start)
+            self._tail = self.f.read()
+        return self._tail
+
+
+def _probe_png(reader):
+    head = reader.head
+    if len(head) < 33 or head[12:16] != b'IHDR':
+        raise ValueError("PNG文件头不完整")
+    width, height, bit_depth, color_type = struct.unpack_from('>IIBB', head, 16)
+    if color_type not in PNG_MODES:
+        raise ValueError(f"PNG颜色类型无效: {color_type}")
+    if not reader.tail().endswith(PNG_IEND):
+        raise ValueError("PNG文件被截断（缺少IEND）")
+
+    mode = PNG_MODES[color_type]
+    if color_type == 0 and bit_depth == 1:
+        mode = '1'
+    elif color_type == 0 and bit_depth == 16:
+        mode = 'I;16'
+    elif color_type == 2 and bit_depth == 16:
+        mode = 'RGB'
+
+    # 只遍历IDAT之前的块头，查找透明(tRNS)和动画(acTL)信息
+    has_alpha = color_type in (4, 6)
+    frames = 1
+    offset = 8
+    while offset + 8 <= reader.file_size:
+        length, chunk_type = struct.unpack('>I4s', reader.read_at(offset, 8))
+        if chunk_type in (b'IDAT', b'IEND'):
+            break
+        if chunk_type == b'tRNS':
+            has_alpha = True
+        elif chunk_type == b'acTL' and length >= 8:
+            frames = struct.unpack('>I', reader.read_at(offset + 8, 4))[0] or 1
+        offset += 12 + length
+    return ImageProbe('PNG', width, height, mode, has_alpha, frames)
+
+
+def _probe_jpeg(reader):
+    offset = 2
+    while True:
+        marker = reader.read_at(offset, 2)
+        if marker[0] != 0xFF:
+            raise ValueError("JPEG标记无效")
+        code = marker[1]
+        if code == 0xFF:
+            # 填充字节
+            offset += 1
+            continue
+        if code in (0xD8, 0x01) or 0xD0 <= code <= 0xD7:
+            offset += 2
+            continue
+        if code in (0xD9, 0xDA):
+            raise ValueError("JPEG缺少SOF标记")
+        length = struct.unpack('>H', reader.read_at(offset + 2, 2))[0]
+        if code in JPEG_SOF_MARKERS:
+            _, height, width, components = struct.unpack('>BHHB', reader.read_at(offset + 4, 6))
+            break
+        offset += 2 + length
+
+    if width == 0 or height == 0:
+        raise ValueError("JPEG尺寸无效")
+    if components not in JPEG_MODES:
+        raise ValueError(f"JPEG颜色分量数无效: {components}")
+    if b'\xff\xd9' not in reader.tail():
+        raise ValueError("JPEG文件被截断（缺少EOI）")
+    return ImageProbe('JPEG', width, height, JPEG_MODES[components], False, 1)
+
+
+def _probe_bmp(reader):
+    head = reader.head
+    if len(head) < 26:
+        raise ValueError("BMP文件头不完整")
+    data_offset, header_size = struct.unpack_from('<II', head, 10)
+    if header_size == 12:
+        width, height, _, bit_count = struct.unpack_from('<HHHH', head, 18)
+        compression = BMP_COMPRESSION_RGB
+        colors_used = 0
+        alpha_mask = 0
+    elif header_size >= 40 and len(head) >= 14 + header_size:
+        width, height, _, bit_count, compression = struct.unpack_from('<iiHHI', head, 18)
+        colors_used = struct.unpack_from('<I', head, 46)[0]
+        alpha_mask = 0
+        if header_size >= 56:
+            alpha_mask = struct.unpack_from('<I', head, 66)[0]
+        elif compression in (BMP_COMPRESSION_BITFIELDS, BMP_COMPRESSION_ALPHABITFIELDS):
+            # BITMAPINFOHEADER 之后紧跟的颜色掩码
+            masks = reader.read_at(54, 16)
+            if compression == BMP_COMPRESSION_ALPHABITFIELDS:
+                alpha_mask = struct.unpack_from('<I', masks, 12)[0]
+    else:
+        raise ValueError(f"BMP信息头长度无效: {header_size}")
+
+    height = abs(height)
+    if width <= 0 or height == 0:
+        raise ValueError("BMP尺寸无效")
+    if bit_count not in (1, 4, 8, 16, 24, 32):
+        raise ValueError(f"BMP位深无效: {bit_count}")
+    if compression in (BMP_COMPRESSION_RGB, BMP_COMPRESSION_BITFIELDS, BMP_COMPRESSION_ALPHABITFIELDS):
+        stride = (width * bit_count + 31) // 32 * 4
+        if data_offset + stride * height > reader.file_size:
+            raise ValueError("BMP文件被截断")
+    elif data_offset >= reader.file_size:
+        raise ValueError("BMP文件被截断")
+
+    bitfields = compression in (BMP_COMPRESSION_BITFIELDS, BMP_COMPRESSION_ALPHABITFIELDS)
+    has_alpha = bit_count == 32 and bitfields and alpha_mask != 0
+    if bit_count <= 8:
+        mode = _bmp_palette_mode(reader, header_size, bit_count, colors_used)
+    else:
+        mode = 'RGBA' if has_alpha else 'RGB'
+    return ImageProbe('BMP', width, height, mode, has_alpha, 1)
+
+
+def _bmp_palette_mode(reader, header_size, bit_count, colors_used):
+    """与PIL一致：灰度调色板为L（黑白两色为1），否则为P"""
+    colors = colors_used or (1 << bit_count)
+    # OS/2 1.x 信息头的调色板项为3字节，其余为4字节
+    entry_size = 3 if header_size == 12 else 4
+    palette = reader.read_at(14 + header_size, colors * entry_size)
+    levels = (0, 255) if colors == 2 else range(colors)
+    for index, level in enumerate(levels):
+        start = index * entry_size
+        if palette[start:start + 3] != bytes((level, level, level)):
+            return 'P'
+    return '1' if colors == 2 else 'L'
+
+
+def _skip_sub_blocks(data, offset):
+    """跳过GIF数据子块序列，返回终止块之后的位置"""
+    while True:
+        if offset >= len(data):
+            raise ValueError("GIF文件被截断")
+        count = data[offset]
+        offset += 1 + count
+        if count == 0:
+            return offset
+
+
+def _probe_gif(reader):
+    head = reader.head
+    if len(head) < 13:
+        raise ValueError("GIF文件头不完整")
+    width, height, flags = struct.unpack_from('<HHB', head, 6)
+    if width == 0 or height == 0:
+        raise ValueError("GIF尺寸无效")
+
+    # 帧数需要遍历块结构，只读取块长度字节，不解压图像数据
+    reader.f.seek(0)
+    data = reader.f.read()
+    offset = 13
+    if flags & 0x80:
+        offset += 3 << ((flags & 0x07) + 1)
+    frames = 0
+    has_alpha = False
+    while True:
+        if offset >= len(data):
+            raise ValueError("GIF文件被截断（缺少结束标记）")
+        block = data[offset]
+        if block == 0x3B:
+            break
+        if block == 0x21:
+            if offset + 1 >= len(data):
+                raise ValueError("GIF文件被截断")
+            label = data[offset + 1]
+            if label == 0xF9 and offset + 3 < len(data) and data[offset + 3] & 0x01:
+                has_alpha = True
+            offset = _skip_sub_blocks(data, offset + 2)
+        elif block == 0x2C:
+            if offset + 10 > len(data):
+                raise ValueError("GIF文件被截断")
+            local_flags = data[offset + 9]
+            offset += 10
+            if local_flags & 0x80:
+                offset += 3 << ((local_flags & 0x07) + 1)
+            # LZW最小码长
+            offset = _skip_sub_blocks(data, offset + 1)
+            frames += 1
+        else:
+            raise ValueError(f"GIF块类型无效: {block:#x}")
+    if frames == 0:
+        raise ValueError("GIF不包含图像")
+    return ImageProbe('GIF', width, height, 'P', has_alpha, frames)
+
+
+def _probe_webp(reader):
+    head = reader.head
+    riff_size = struct.unpack_from('<I', head, 4)[0]
+    if riff_size + 8 > reader.file_size:
+        raise ValueError("WebP文件被截断")
+    if len(head) < 30:
+        raise ValueError("WebP文件头不完整")
+    chunk = head[12:16]
+    if chunk == b'VP8 ':
+        if head[23:26] != b'\x9d\x01\x2a':
+            raise ValueError("WebP(VP8)帧头无效")
+        width, height = struct.unpack_from('<HH', head, 26)
+        return ImageProbe('WEBP', width & 0x3FFF, height & 0x3FFF, 'RGB', False, 1)
+    if chunk == b'VP8L':
+        if head[20] != 0x2F:
+            raise ValueError("WebP(VP8L)签名无效")
+        bits = struct.unpack_from('<I', head, 21)[0]
+        width = (bits & 0x3FFF) + 1
+        height = ((bits >> 14) & 0x3FFF) + 1
+        has_alpha = bool((bits >> 28) & 1)
+        return ImageProbe('WEBP', width, height, 'RGBA' if has_alpha else 'RGB', has_alpha, 1)
+    if chunk == b'VP8X':
+        flags = head[20]
+        width = int.from_bytes(head[24:27], 'little') + 1
+        height = int.from_bytes(head[27:30], 'little') + 1
+        has_alpha = bool(flags & 0x10)
+        frames = 1
+        if flags & 0x02:
+            # 动画：只遍历块头统计ANMF帧
+            frames = 0
+            offset = 12
+            end = min(riff_size + 8, reader.file_size)
+            while offset + 8 <= end:
+                chunk_type, length = struct.unpack('<4sI', reader.read_at(offset, 8))
+                if chunk_type == b'ANMF':
+                    frames += 1
+                offset += 8 + length + (length & 1)
+            frames = max(frames, 1)
+        return ImageProbe('WEBP', width, height, 'RGBA' if has_alpha else 'RGB', has_alpha, frames)
+    raise ValueError("WebP数据块类型无效")
+
+
+def _probe_ico(reader):
+    head = reader.head
+    count = struct.unpack_from('<H', head, 4)[0]
+    if count == 0:
+        raise ValueError("ICO不包含图标")
+    directory = reader.read_at(6, 16 * count)
+    largest = None
+    for index in range(count):
+        width, height, _, _, _, _, size, offset = struct.unpack_from('<BBBBHHII', directory, index * 16)
+        if offset + size > reader.file_size:
+            raise ValueError("ICO文件被截断")
+        entry = (width or 256, height or 256)
+        if largest is None or entry[0] * entry[1] > largest[0] * largest[1]:
+            largest = entry
+    return ImageProbe('ICO', largest[0], largest[1], 'RGBA', True, count)
+
+
+def _detect(head):
+    """根据文件签名判断格式，未知格式返回None"""
+    if head.startswith(PNG_SIGNATURE):
+        return _probe_png
+    if head.startswith(b'\xff\xd8\xff'):
+        return _probe_jpeg
+    if head.startswith(b'BM'):
+        return _probe_bmp
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return _probe_gif
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return _probe_webp
+    if head[:4] == b'\x00\x00\x01\x00':
+        return _probe_ico
+    return None
+
+
+def probe_image(path):
+    """探测图片文件
+
+    返回 ImageProbe；不支持的格式返回None；文件损坏或被截断时抛出 ValueError。
+    """
+    with open(path, 'rb') as f:
+        reader = _Reader(f)
+        probe = _detect(reader.head)
+        if probe is None:
+            return None
+        try:
+            result = probe(reader)
+        except struct.error:
+            raise ValueError("文件头不完整")
+        except IndexError:
+            raise ValueError("文件被截断")
+    if result.width <= 0 or result.height <= 0:
+        raise ValueError("图片尺寸无效")
+    return result
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片会话模块 - 一次选择只探测一次文件头、最多解码一次像素
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from config import ICON_RENDER_WORKERS
+from image_probe import probe_image
+from bounded_decode import open_reduced
+from icon_processor import largest_target_size, render_icon_images
+from rgba_buffer import RGBABuffer
+from tracing import span
+
+
+class ImageSession:
+    """单张图片的解码会话
+
+    有效性、元数据、RGBA像素、处理后的图标和Qt预览图都由同一次解码提供；
+    文件的修改时间或大小变化后自动失效并重新读取。
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._signature = None
+        self._reset()
+
+    def _reset(self):
+        """清空所有缓存结果"""
+        self._header = None
+        self._header_error = None
+        self._rgba = None
+        self._decode_error = None
+        self._icons = None
+        self._previews = {}
+
+    def _ensure_fresh(self):
+        """文件变化时使缓存失效"""
+        stat = os.stat(self.file_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature != self._signature:
+            self._reset()
+            self._signature = signature
+
+    def info(self):
+        """读取文件头信息（只探测一次）"""
+        self._ensure_fresh()
+        if self._header is None and self._header_error is None:
+            try:
+                probe = probe_image(self.file_path)
+                if probe is not None:
+                    self._header = probe.to_dict()
+                else:
+                    with Image.open(self.file_path) as img:
+                        self._header = {
+                            "size": img.size,
+                            "format": img.format,
+                            "mode": img.mode,
+                            "width": img.width,
+                            "height": img.height
+                        }
+            except Exception as e:
+                self._header_error = e
+        if self._header_error is not None:
+            raise Exception(f"获取图片信息失败: {str(self._header_error)}")
+        return self._header
+
+    def rgba(self):
+        """返回解码后的RGBA图片（最多解码一次，调用方不得修改）
+
+        超大图片在内存预算内解码并缩小到最大图标尺寸的工作分辨率，预览和图标都由它生成。
+        """
+        self.info()
+        if self._rgba is None and self._decode_error is None:
+            try:
+                with span('decode', path=os.path.basename(self.file_path)):
+                    self._rgba, _ = open_reduced(self.file_path, largest_target_size())
+            except Exception as e:
+                self._decode_error = e
+        if self._decode_error is not None:
+            raise Exception(f"图片解码失败: {str(self._decode_error)}")
+        return self._rgba
+
+    def is_valid(self):
+        """检查图片是否可以完整解码"""
+        try:
+            self.rgba()
+            return True
+        except Exception:
+            return False
+
+    def icon_images(self):
+        """返回处理后的各尺寸图标（RGBABuffer列表，顺序同TARGET_SIZES，只渲染一次）"""
+        source = self.rgba()
+        if self._icons is None:
+            # 各尺寸在线程池中并行缩放和蒙版
+            with span('render_icons'), ThreadPoolExecutor(max_workers=ICON_RENDER_WORKERS) as executor:
+                futures = render_icon_images(source, self.info()['size'], as_buffers=True, executor=executor)
+                self._icons = [future.result() for future in futures]
+        return self._icons
+
+    def icon_qimage(self, min_size):
+        """返回不小于min_size的最小图标的QImage（都不够大时返回最大的），与缓冲区共享内存"""
+        icons = sorted(self.icon_images(), key=lambda icon: icon.width * icon.height)
+        for icon in icons:
+            if icon.width >= min_size[0] and icon.height >= min_size[1]:
+                return icon.qimage()
+        return icons[-1].qimage()
+
+    def preview_image(self, size, cover=False):
+        """返回缩放后的RGBA预览图，cover为True时按短边铺满并居中裁剪"""
+        size = (int(size[0]), int(size[1]))
+        key = (size, cover)
+        self._ensure_fresh()
+        if key not in self._previews:
+            source = self.rgba()
+            if cover:
+                scale = max(size[0] / source.width, size[1] / source.height)
+            else:
+                scale = min(size[0] / source.width, size[1] / source.height)
+            scaled_size = (max(1, round(source.width * scale)), max(1, round(source.height * scale)))
+            preview = source.resize(scaled_size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+            if cover:
+                left = (preview.width - size[0]) // 2
+                top = (preview.height - size[1]) // 2
+                preview = preview.crop((left, top, left + size[0], top + size[1]))
+            # 预览图保存在缓冲区中，Qt预览直接引用同一块内存
+            self._previews[key] = RGBABuffer.from_image(preview)
+        return self._previews[key].image
+
+    def preview_qimage(self, size, cover=False):
+        """返回Qt预览图（QImage，与会话持有的缓冲区共享内存）"""
+        self.preview_image(size, cover)
+        return self._previews[((int(size[0]), int(size[1])), cover)].qimage()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片处理进程模块 - 在常驻的独立进程中解码图片和生成图标
+
+恶意构造或超大的图片可能让Pillow长时间占用CPU或耗尽内存，放在独立进程中执行后
+只会拖垮工作进程：崩溃或超时时自动结束并重启，界面进程不受影响，也不与界面争抢GIL。
+- 进程启动时预先导入Pillow和图标处理模块（预热），第一次请求无需等待导入；
+- 像素数据通过 multiprocessing.shared_memory 传回，不经过pickle；
+- POSIX 上限制工作进程的地址空间，内存失控时在工作进程中抛出 MemoryError。
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from multiprocessing import shared_memory
+
+from config import (IMAGE_WORKER_TIMEOUT, IMAGE_WORKER_START_TIMEOUT, IMAGE_WORKER_MEMORY_LIMIT,
+                    PREVIEW_SIZE, TARGET_SIZES)
+from tracing import span
+
+POLL_INTERVAL = 0.1
+
+
+class WorkerCrashed(RuntimeError):
+    """工作进程意外退出"""
+
+
+def _limit_memory(limit):
+    """限制当前进程的地址空间（仅POSIX）"""
+    if not limit or os.name == 'nt':
+        return
+    import resource
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+class _WorkerState:
+    """工作进程内的状态：最近一次加载的会话和尚未被取走的共享内存"""
+
+    def __init__(self):
+        self.session = None
+        self.blocks = []
+
+    def release_blocks(self):
+        # 界面进程在取走像素后负责unlink，这里只关闭本进程的映射
+        for block in self.blocks:
+            block.close()
+        self.blocks = []
+
+    def session_for(self, path):
+        from image_session import ImageSession
+
+        if self.session is None or self.session.file_path != path:
+            self.session = ImageSession(path)
+        return self.session
+
+    def share(self, images):
+        """把多张RGBA图片依次写入一块共享内存，返回 {名称, 布局}"""
+        layout = []
+        total = 0
+        for image in images:
+            layout.append((image.size, total))
+            total += image.width * image.height * 4
+        block = shared_memory.SharedMemory(create=True, size=max(total, 1))
+        self.blocks.append(block)
+        for image, (size, offset) in zip(images, layout):
+            block.buf[offset:offset + size[0] * size[1] * 4] = image.tobytes('raw', 'RGBA')
+        return {"name": block.name, "layout": layout}
+
+
+def _handle_load(state, path, preview_size):
+    """解码图片并生成预览和全部尺寸的图标，图片无效时返回None"""
+    session = state.session_for(path)
+    if not session.is_valid():
+        return None
+    info = session.info()
+    images = [session.preview_image(preview_size)] + [icon.image for icon in session.icon_images()]
+    return {"info": info, "pixels": state.share(images)}
+
+
+def _handle_encode(state, path, output_dir):
+    """生成ICO（复用同一图片的会话），复制到 output_dir 并返回其中的 (ico, png)"""
+    from artifact_cache import process_icon_cached
+
+    return process_icon_cached(path, output_dir, session=state.session_for(path), save_png=False)
+
+
+def _handle_ping(state):
+    return os.getpid()
+
+
+_HANDLERS = {
+    "load": _handle_load,
+    "encode": _handle_encode,
+    "ping": _handle_ping,
+}
+
+
+def _worker_main(conn, memory_limit):
+    """工作进程入口"""
+    _limit_memory(memory_limit)
+    # 预热：导入Pillow和图标处理相关模块
+    import image_session  # noqa: F401
+    import artifact_cache  # noqa: F401
+    conn.send(("ready", os.getpid()))
+
+    state = _WorkerState()
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            break
+        # 收到下一个请求说明上一次的共享内存已被取走
+        state.release_blocks()
+        request_id, op, args = request
+        if op == "stop":
+            break
+        try:
+            with span(f'worker:{op}', cat='worker'):
+                result = _HANDLERS[op](state, *args)
+            reply = (request_id, True, result)
+        except BaseException as e:
+            reply = (request_id, False, e)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # 异常对象无法pickle时只传回文字说明
+            conn.send((request_id, False, Exception(f"{type(e).__name__}: {str(e)}")))
+    state.release_blocks()
+    conn.close()
+
+
+def _collect_pixels(pixels):
+    """从共享内存中取出像素并释放共享内存，返回 RGBABuffer 列表"""
+    # RGBABuffer 依赖Pillow，界面进程在第一次取回像素时才导入
+    from rgba_buffer import RGBABuffer
+
+    block = shared_memory.SharedMemory(name=pixels["name"])
+    try:
+        # 每张图片复制一次到本进程，之后即可unlink，不依赖工作进程的生命周期
+        return [RGBABuffer(size, bytearray(block.buf[offset:offset + size[0] * size[1] * 4]))
+                for size, offset in pixels["layout"]]
+    finally:
+        block.close()
+        block.unlink()
+
+
+class LoadedImage:
+    """工作进程加载完成的图片，提供与 ImageSession 相同的预览接口"""
+
+    def __init__(self, file_path, info, preview_size, preview, icons):
+        self.file_path = file_path
+        self._info = info
+        self._preview_size = tuple(preview_size)
+        self._preview = preview
+        self._icons = icons
+
+    def info(self):
+        return self._info
+
+    def preview_qimage(self, size=None, cover=False):
+        """返回预览图（只有加载时请求的尺寸）"""
+        if cover or (size is not None and tuple(size) != self._preview_size):
+            raise ValueError(f"只生成了 {self._preview_size[0]}x{self._preview_size[1]} 的预览图")
+        return self._preview.qimage()
+
+    def icon_images(self):
+        return self._icons
+
+    def icon_qimage(self, min_size):
+        """返回不小于min_size的最小图标的QImage（都不够大时返回最大的）"""
+        icons = sorted(self._icons, key=lambda icon: icon.width * icon.height)
+        for icon in icons:
+            if icon.width >= min_size[0] and icon.height >= min_size[1]:
+                return icon.qimage()
+        return icons[-1].qimage()
+
+
+class ImageWorker:
+    """常驻图片处理进程的客户端，可在多个线程中调用（请求依次执行）"""
+
+    def __init__(self, timeout=IMAGE_WORKER_TIMEOUT, start_timeout=IMAGE_WORKER_START_TIMEOUT,
+                 memory_limit=IMAGE_WORKER_MEMORY_LIMIT):
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+        self.memory_limit = memory_limit
+        # 界面进程中有Qt线程，使用spawn避免fork带来的锁状态问题
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._process = None
+        self._conn = None
+        self._ready = False
+        self._next_id = 0
+        self._stopping = False
+        self.restarts = 0
+
+    def start(self):
+        """启动（预热）工作进程，不等待其就绪"""
+        with self._lock:
+            if self._process is None:
+                self._spawn()
+
+    def _spawn(self):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_worker_main, args=(child_conn, self.memory_limit),
+                                        name="image-worker", daemon=True)
+        process.start()
+        child_conn.close()
+        self._process, self._conn, self._ready = process, parent_conn, False
+
+    def _kill(self):
+        """结束当前工作进程"""
+        process, conn = self._process, self._conn
+        self._process = self._conn = None
+        self._ready = False
+        if conn is not None:
+            conn.close()
+        if process is not None:
+            if process.is_alive():
+                process.kill()
+            process.join(5)
+
+    def _restart(self):
+        self._kill()
+        self.restarts += 1
+        self._spawn()
+
+    def _wait(self, timeout, check):
+        """等待工作进程的下一条消息，超时返回None；check() 抛出异常时中止等待"""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            if check:
+                check()
+            if self._stopping:
+                raise WorkerCrashed("图片处理进程已停止")
+            try:
+                if self._conn.poll(min(POLL_INTERVAL, remaining)):
+                    return self._conn.recv()
+            except (EOFError, OSError):
+                raise WorkerCrashed(f"图片处理进程意外退出（退出码 {self._exitcode()}）")
+            if not self._process.is_alive():
+                raise WorkerCrashed(f"图片处理进程意外退出（退出码 {self._exitcode()}）")
+
+    def _exitcode(self):
+        self._process.join(1)
+        return self._process.exitcode
+
+    def _ensure_ready(self, check):
+        if self._process is None:
+            self._spawn()
+        elif not self._process.is_alive():
+            # 空闲时退出的工作进程（如被系统结束）在发送请求之前换成新进程
+            self._restart()
+        if not self._ready:
+            message = self._wait(self.start_timeout, check)
+            if message is None:
+                raise TimeoutError(f"图片处理进程在 {self.start_timeout} 秒内未能启动")
+            self._ready = True
+
+    def call(self, op, *args, timeout=None, check=None):
+        """在工作进程中执行请求，返回结果或抛出工作进程中的异常
+
+        超时、工作进程崩溃或 check() 抛出异常（如任务被取消）时结束工作进程并立即重启预热，
+        然后抛出相应的异常。
+        """
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            try:
+                self._ensure_ready(check)
+                self._next_id += 1
+                request_id = self._next_id
+                try:
+                    self._conn.send((request_id, op, args))
+                except (EOFError, OSError):
+                    raise WorkerCrashed(f"图片处理进程意外退出（退出码 {self._exitcode()}）")
+                reply = self._wait(timeout, check)
+                if reply is None:
+                    raise TimeoutError(f"图片处理超过 {timeout} 秒未完成，已重启处理进程")
+            except BaseException:
+                if self._stopping:
+                    self._kill()
+                else:
+                    self._restart()
+                raise
+            _, ok, value = reply
+            if isinstance(value, MemoryError):
+                # 内存耗尽后工作进程的状态不可靠，换一个新进程
+                self._restart()
+        if not ok:
+            raise value
+        return value
+
+    def load(self, path, preview_size=PREVIEW_SIZE, check=None):
+        """加载图片，返回 LoadedImage，图片无效时返回None"""
+        with span('worker_call:load', cat='worker'):
+            result = self.call("load", path, tuple(preview_size), check=check)
+        if result is None:
+            return None
+        with span('collect_pixels', cat='worker'):
+            buffers = _collect_pixels(result["pixels"])
+        return LoadedImage(path, result["info"], preview_size, buffers[0], buffers[1:1 + len(TARGET_SIZES)])
+
+    def encode(self, path, output_dir, check=None):
+        """生成ICO，复制到 output_dir 并返回其中的 (ico, png) 路径"""
+        with span('worker_call:encode', cat='worker'):
+            return self.call("encode", path, output_dir, check=check)
+
+    def stop(self, timeout=5):
+        """通知工作进程退出，超时后强制结束（正在进行的请求立即以 WorkerCrashed 结束，不再重启）"""
+        self._stopping = True
+        try:
+            with self._lock:
+                if self._process is None:
+                    return
+                try:
+                    self._conn.send((0, "stop", ()))
+                    self._process.join(timeout)
+                except (OSError, ValueError):
+                    pass
+                self._kill()
+        finally:
+            self._stopping = False
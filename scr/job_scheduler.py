@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台任务模块 - 基于 QThreadPool 的任务调度
+
+界面中所有耗时的文件和图片操作都作为任务提交到线程池，支持优先级和取消。
+任务函数的第一个参数是 JobContext，通过它报告进度、检查取消；
+进度、结果和错误都以信号的形式回到主线程，界面在主线程中更新。
+"""
+
+import threading
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from config import JOB_MAX_THREADS, JOB_PRIORITY_NORMAL
+
+
+class JobCancelled(Exception):
+    """任务被取消"""
+
+
+class CancellationToken:
+    """取消标记，可在任意线程中设置和检查"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def is_cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise JobCancelled("任务已取消")
+
+
+class JobSignals(QObject):
+    """任务信号（在主线程中创建，跨线程发出时自动排队到主线程）"""
+    progress = pyqtSignal(int, str)
+    result = pyqtSignal(object)
+    error = pyqtSignal(object)
+    cancelled = pyqtSignal()
+    finished = pyqtSignal()
+
+
+class JobContext:
+    """传给任务函数的上下文"""
+
+    def __init__(self, token, signals):
+        self.token = token
+        self._signals = signals
+
+    def report(self, percent, text=''):
+        """报告进度，同时检查是否已取消（已取消时抛出 JobCancelled）"""
+        self.token.raise_if_cancelled()
+        self._signals.progress.emit(int(percent), text)
+
+    def raise_if_cancelled(self):
+        self.token.raise_if_cancelled()
+
+
+class Job(QRunnable):
+    """一个后台任务"""
+
+    def __init__(self, fn, args, kwargs, priority=JOB_PRIORITY_NORMAL):
+        super().__init__()
+        # 由调度器持有引用，避免线程池删除Python包装对象
+        self.setAutoDelete(False)
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.token = CancellationToken()
+        self.signals = JobSignals()
+
+    def cancel(self):
+        """请求取消任务（正在运行的任务在下一次检查时退出）"""
+        self.token.cancel()
+
+    def run(self):
+        try:
+            self.token.raise_if_cancelled()
+            result = self.fn(JobContext(self.token, self.signals), *self.args, **self.kwargs)
+            self.token.raise_if_cancelled()
+        except JobCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            # 底层函数可能把取消异常包装成其他异常，以取消标记为准
+            if self.token.is_cancelled:
+                self.signals.cancelled.emit()
+            else:
+                self.signals.error.emit(e)
+        else:
+            self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()
+
+
+class JobScheduler(QObject):
+    """任务调度器"""
+
+    def __init__(self, parent=None, max_threads=JOB_MAX_THREADS):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self._jobs = set()
+
+    def submit(self, fn, *args, priority=JOB_PRIORITY_NORMAL, on_progress=None, on_result=None,
+               on_error=None, on_cancelled=None, on_finished=None, **kwargs):
+        """提交任务，回调都在主线程中执行，返回 Job"""
+        job = Job(fn, args, kwargs, priority)
+        if on_progress:
+            job.signals.progress.connect(on_progress)
+        if on_result:
+            job.signals.result.connect(on_result)
+        if on_error:
+            job.signals.error.connect(on_error)
+        if on_cancelled:
+            job.signals.cancelled.connect(on_cancelled)
+        if on_finished:
+            job.signals.finished.connect(on_finished)
+        job.signals.finished.connect(lambda: self._jobs.discard(job))
+        self._jobs.add(job)
+        self.pool.start(job, priority)
+        return job
+
+    def cancel(self, job):
+        """取消任务，尚未开始的任务直接从队列中移除"""
+        job.cancel()
+        if self.pool.tryTake(job):
+            job.signals.cancelled.emit()
+            job.signals.finished.emit()
+
+    def cancel_all(self):
+        for job in list(self._jobs):
+            self.cancel(job)
+
+    def active_jobs(self):
+        return len(self._jobs)
+
+    def shutdown(self, timeout_ms=-1):
+        """取消所有任务并等待正在运行的任务退出"""
+        self.cancel_all()
+        return self.pool.waitForDone(timeout_ms)
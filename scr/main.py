@@ -6,41 +6,52 @@
 
 import sys
 import warnings
-from PyQt5.QtWidgets import QApplication, QMessageBox
-from PyQt5.QtCore import Qt
+import multiprocessing
 
 # 导入自定义模块
-from gui import SystemIconReplacer
-from utils import is_admin, run_as_admin, show_message
+from utils import show_message
+import tracing
 
 # 忽略警告
 warnings.filterwarnings('ignore')
 
+def parse_trace_option(argv):
+    """取出 --trace <输出文件> 参数并启用追踪，返回其余参数（交给Qt）"""
+    args = list(argv)
+    for index, arg in enumerate(args):
+        if arg == '--trace' and index + 1 < len(args):
+            tracing.enable(args[index + 1])
+            return args[:index] + args[index + 2:]
+        if arg.startswith('--trace='):
+            tracing.enable(arg.split('=', 1)[1])
+            return args[:index] + args[index + 1:]
+    return args
+
+def run_privileged_helper(argv):
+    """打包为exe后，管理员助手进程由 --privileged-helper <地址> <密钥文件> 进入，不加载界面"""
+    from privileged_helper import serve
+    serve(argv[2], argv[3])
+
 def main():
     """主函数"""
+    if len(sys.argv) == 4 and sys.argv[1] == '--privileged-helper':
+        run_privileged_helper(sys.argv)
+        return
+    argv = parse_trace_option(sys.argv)
+    
+    # 界面以普通用户身份运行，只有备份、写入和还原系统文件时才由管理员助手进程请求权限
+    from PyQt5.QtWidgets import QApplication
+    from gui import SystemIconReplacer
+    
     # 创建应用程序
-    app = QApplication(sys.argv)
+    app = QApplication(argv)
     app.setStyle('Fusion')
     
-    # 检查权限
-    if not is_admin():
-        ret = show_message(
-            None, '权限警告',
-            '此程序需要管理员权限才能替换系统文件。\n\n是否继续运行？',
-            'question'
-        )
-        
-        if ret == QMessageBox.No:
-            sys.exit(1)
-        
-        # 尝试以管理员身份重新运行
-        if run_as_admin():
-            sys.exit(0)
-    
     try:
         # 创建主窗口
-        window = SystemIconReplacer()
-        window.show()
+        with tracing.span('gui:startup', cat='gui'):
+            window = SystemIconReplacer()
+            window.show()
         
         # 运行应用程序
         sys.exit(app.exec_())
@@ -55,4 +66,6 @@ def main():
         sys.exit(1)
 
 if __name__ == '__main__':
+    # 打包为exe后，图片处理进程需要由此进入
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内存分析模块 - 记录 icon_processor 各阶段的内存峰值，并按 config.MEMORY_BUDGETS 检查
+
+以正常方式（线程池并行）运行 process_icon，通过 tracing.add_listener 在它已有的追踪区间
+（decode、convert、resize、mask、write_ico、save_png 及整个 process_icon）开始和结束时采样，每个阶段记录：
+- tracemalloc 峰值：Python对象、bytes 和 NumPy 数组的分配（Pillow 图片像素不经过 Python 分配器，不计入）；
+- 常驻内存增量：阶段结束时与开始时相比的常驻内存变化；
+- 常驻内存峰值：阶段内常驻内存的最高值减去开始时的值，包含 Pillow 图片像素
+  （Linux 上通过 /proc/self/clear_refs 重置高水位，其他平台为None）。
+峰值是进程整体的：并行执行的阶段（如各尺寸的缩放和蒙版）区间重叠，各自的峰值包含同时进行的其他阶段；
+同名区间有多个（每个尺寸一个）时各项取最大值。
+
+用法:
+    python memory_profile.py photo.jpg banner.png      # 输出各阶段内存
+    python memory_profile.py --check                   # 用合成图片检查预算，超出时退出码为1
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import tracemalloc
+
+from config import MEMORY_BUDGETS
+
+SCRIPT = os.path.abspath(__file__)
+SCRIPT_DIR = os.path.dirname(SCRIPT)
+MB = 1024 * 1024
+
+STAGES = ('decode', 'convert', 'resize', 'mask', 'write_ico', 'save_png', 'process_icon')
+# --check 使用的合成图片：(宽, 高, 模式, 格式)，覆盖各个预算档位
+CHECK_IMAGES = [
+    (1024, 1024, 'RGBA', 'PNG'),
+    (2048, 2048, 'RGBA', 'PNG'),
+    (4000, 4000, 'RGBA', 'PNG'),
+    (4096, 3072, 'RGB', 'JPEG'),
+    (6000, 6000, 'RGB', 'PNG'),
+    (8000, 6000, 'RGB', 'JPEG'),
+]
+
+
+def current_rss():
+    """返回当前常驻内存（字节），只支持Linux，其他平台返回None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss():
+    """返回常驻内存高水位（字节），只支持Linux，其他平台返回None"""
+    try:
+        with open('/proc/self/status') as f:
+            return int(re.search(r'VmHWM:\s+(\d+)\s+kB', f.read()).group(1)) * 1024
+    except (OSError, AttributeError):
+        return None
+
+
+def reset_peak_rss():
+    """把常驻内存高水位重置为当前值，成功时返回True"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _max(a, b):
+    if a is None or b is None:
+        return a if b is None else b
+    return max(a, b)
+
+
+class StageMemory:
+    """追踪区间监听器：在各阶段区间开始和结束时采样内存，结果为 {阶段: {...}}（单位MB）
+
+    tracemalloc 和常驻内存的峰值都只有一个全局值，每次采样时先把上次重置以来的峰值计入所有未结束的区间再重置，
+    因此嵌套或重叠的区间都能得到各自区间内的峰值。
+    """
+
+    def __init__(self, stages=STAGES):
+        self.stages = set(stages)
+        self.results = {}
+        self._open = {}
+        self._lock = threading.Lock()
+        self._peak_supported = reset_peak_rss()
+
+    def _fold_peaks(self):
+        traced_peak = tracemalloc.get_traced_memory()[1]
+        rss_peak = peak_rss() if self._peak_supported else None
+        for record in self._open.values():
+            record["traced_peak"] = max(record["traced_peak"], traced_peak)
+            record["rss_peak"] = _max(record["rss_peak"], rss_peak)
+        tracemalloc.reset_peak()
+        if self._peak_supported:
+            reset_peak_rss()
+
+    def __call__(self, span, entering):
+        if span.name not in self.stages:
+            return
+        with self._lock:
+            self._fold_peaks()
+            traced = tracemalloc.get_traced_memory()[0]
+            rss = current_rss()
+            if entering:
+                self._open[id(span)] = {"traced_before": traced, "traced_peak": traced, "rss_before": rss,
+                                        "rss_peak": rss if self._peak_supported else None}
+                return
+            record = self._open.pop(id(span), None)
+            if record is None:
+                return
+            rss_before = record["rss_before"]
+            measured = {
+                "tracemalloc_peak_mb": round((record["traced_peak"] - record["traced_before"]) / MB, 2),
+                "retained_mb": round((traced - record["traced_before"]) / MB, 2),
+                "rss_delta_mb": round((rss - rss_before) / MB, 2) if rss_before is not None else None,
+                "rss_peak_mb": (round((record["rss_peak"] - rss_before) / MB, 2)
+                                if record["rss_peak"] is not None and rss_before is not None else None),
+            }
+            previous = self.results.get(span.name)
+            if previous is not None:
+                measured = {key: _max(value, previous[key]) for key, value in measured.items()}
+            self.results[span.name] = measured
+
+
+def profile_icon(path, output_dir):
+    """运行 process_icon 并在各阶段的追踪区间采样内存，返回 {source_size, megapixels, stages}"""
+    from PIL import Image
+    import tracing
+    from icon_processor import process_icon
+
+    # 导入、蒙版缓存和首次调用的开销不计入任何阶段：先用一张小图完整运行一次
+    warmup_dir = os.path.join(output_dir, 'warmup')
+    os.makedirs(warmup_dir)
+    warmup_path = os.path.join(warmup_dir, 'warmup.png')
+    Image.new('RGBA', (512, 512), (200, 120, 40, 255)).save(warmup_path)
+    process_icon(warmup_path, warmup_dir)
+
+    started = tracemalloc.is_tracing()
+    if not started:
+        tracemalloc.start()
+    listener = StageMemory()
+    tracing.add_listener(listener)
+    try:
+        process_icon(path, output_dir)
+    finally:
+        tracing.remove_listener(listener)
+        if not started:
+            tracemalloc.stop()
+
+    with Image.open(path) as image:
+        source_size = image.size
+    return {
+        "source_size": list(source_size),
+        "megapixels": round(source_size[0] * source_size[1] / 1e6, 2),
+        "stages": listener.results,
+    }
+
+
+def budget_for(megapixels, budgets=MEMORY_BUDGETS):
+    """返回适用于该像素数的预算档位 (档位上限, {阶段: 预算})，超出所有档位时返回 (None, {})"""
+    for limit in sorted(budgets):
+        if megapixels <= limit:
+            return limit, budgets[limit]
+    return None, {}
+
+
+def check_budget(result, budgets=MEMORY_BUDGETS):
+    """按预算检查一次分析结果，返回超出预算的说明列表"""
+    limit, budget = budget_for(result["megapixels"], budgets)
+    if limit is None:
+        return [f"{result['megapixels']} 百万像素超出所有预算档位"]
+    violations = []
+    for stage, (traced_budget, rss_budget) in budget.items():
+        measured = result["stages"].get(stage)
+        if measured is None:
+            continue
+        if measured["tracemalloc_peak_mb"] > traced_budget:
+            violations.append(f"{stage}: tracemalloc峰值 {measured['tracemalloc_peak_mb']}MB "
+                              f"超出预算 {traced_budget}MB（≤{limit}百万像素档）")
+        if measured["rss_peak_mb"] is not None and measured["rss_peak_mb"] > rss_budget:
+            violations.append(f"{stage}: 常驻内存峰值 {measured['rss_peak_mb']}MB "
+                              f"超出预算 {rss_budget}MB（≤{limit}百万像素档）")
+    return violations
+
+
+def profile_in_subprocess(path):
+    """在新进程中分析一张图片，避免之前的分配和缓存影响结果"""
+    output = subprocess.run([sys.executable, SCRIPT, '--child', path], capture_output=True,
+                            check=True, text=True, cwd=SCRIPT_DIR).stdout
+    return json.loads(output)
+
+
+def format_profile(name, result, budget=None):
+    """把一张图片的分析结果格式化为文本，budget 为 {阶段: (tracemalloc预算, 常驻内存预算)}"""
+    width, height = result["source_size"]
+    lines = [f"{name}（{width}x{height}，{result['megapixels']} 百万像素）",
+             f"  {'阶段':<14}{'tracemalloc峰值':>16}{'保留':>10}{'RSS增量':>10}{'RSS峰值':>10}{'预算':>16}"]
+
+    def cell(value):
+        return f"{value:.1f}" if value is not None else '-'
+
+    for stage in STAGES:
+        item = result["stages"].get(stage)
+        if item is None:
+            continue
+        limits = (budget or {}).get(stage)
+        limit_text = f"{limits[0]}/{limits[1]}" if limits else '-'
+        lines.append(f"  {stage:<14}{cell(item['tracemalloc_peak_mb']):>16}{cell(item['retained_mb']):>10}"
+                     f"{cell(item['rss_delta_mb']):>10}{cell(item['rss_peak_mb']):>10}{limit_text:>16}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='icon_processor 各阶段内存分析')
+    parser.add_argument('images', nargs='*', help='要分析的图片')
+    parser.add_argument('--check', action='store_true', help='按 config.MEMORY_BUDGETS 检查，超出预算时退出码为1')
+    parser.add_argument('--json', metavar='PATH', help='把结果写入JSON文件')
+    parser.add_argument('--child', metavar='IMAGE', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        with tempfile.TemporaryDirectory(prefix='memory_profile_') as output_dir:
+            print(json.dumps(profile_icon(args.child, output_dir)))
+        return
+
+    with tempfile.TemporaryDirectory(prefix='memory_profile_') as directory:
+        images = list(args.images)
+        if not images:
+            if not args.check:
+                parser.error('请指定图片，或使用 --check 以合成图片检查预算')
+            from bench_icon_processor import synthetic_image
+            for width, height, mode, fmt in CHECK_IMAGES:
+                path = os.path.join(directory, f'{mode.lower()}_{width}x{height}.{fmt.lower()}')
+                synthetic_image(width, height, mode).save(path, fmt)
+                images.append(path)
+
+        results = {}
+        failures = []
+        for path in images:
+            name = os.path.basename(path)
+            result = profile_in_subprocess(path)
+            results[name] = result
+            _, budget = budget_for(result["megapixels"])
+            print(format_profile(name, result, budget))
+            if args.check:
+                violations = check_budget(result)
+                failures.extend(f"{name} {item}" for item in violations)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.check:
+        if failures:
+            print('\n超出内存预算:\n' + '\n'.join(f'  {item}' for item in failures), file=sys.stderr)
+            sys.exit(1)
+        print('\n所有阶段均在内存预算内', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PE校验和模块 - 计算、写入和验证可选头中的 CheckSum
+
+算法与 CheckSumMappedFile 相同：把整个文件按16位小端字求反码和（校验和字段视为0），
+再加上文件长度。求和在内存映射上用 NumPy 按块向量化完成，内存占用与文件大小无关。
+"""
+
+import mmap
+import struct
+
+import numpy as np
+
+from config import PE_CHECKSUM_CHUNK_SIZE
+from pe_resources import OPTIONAL_CHECKSUM_OFFSET
+
+
+def checksum_offset(buffer):
+    """返回可选头中校验和字段的文件偏移"""
+    if len(buffer) < 0x40 or bytes(buffer[:2]) != b'MZ':
+        raise ValueError("不是有效的PE文件（缺少MZ头）")
+    pe_offset = struct.unpack_from('<I', buffer, 0x3C)[0]
+    offset = pe_offset + 4 + 20 + OPTIONAL_CHECKSUM_OFFSET
+    if bytes(buffer[pe_offset:pe_offset + 4]) != b'PE\0\0' or offset + 4 > len(buffer):
+        raise ValueError("不是有效的PE文件（缺少PE签名）")
+    return offset
+
+
+def _fold(total):
+    """把累加值折叠为16位反码和"""
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return total
+
+
+def checksum_buffer(buffer, chunk_size=PE_CHECKSUM_CHUNK_SIZE):
+    """计算内存缓冲区（bytes、mmap等）的PE校验和"""
+    view = memoryview(buffer).cast('B')
+    # 出错时也要释放视图，否则调用方关闭mmap时会因仍有导出的缓冲区而失败
+    try:
+        size = len(view)
+        offset = checksum_offset(view)
+        chunk_size -= chunk_size % 2
+
+        total = 0
+        even_size = size - size % 2
+        for start in range(0, even_size, chunk_size):
+            end = min(start + chunk_size, even_size)
+            words = np.frombuffer(view[start:end], dtype='<u2')
+            # 每块最多 chunk_size/2 个字，uint64 累加不会溢出
+            total += int(words.sum(dtype=np.uint64))
+            del words
+        if size % 2:
+            total += view[size - 1]
+
+        # 校验和字段本身按0参与计算
+        total -= struct.unpack_from('<H', view, offset)[0] + struct.unpack_from('<H', view, offset + 2)[0]
+    finally:
+        view.release()
+    return (_fold(total) + size) & 0xFFFFFFFF
+
+
+def checksum_reference(buffer):
+    """逐字循环的参考实现，仅用于对照验证和基准测试"""
+    data = bytes(buffer)
+    offset = checksum_offset(data)
+    checksum = 0
+    for index in range(0, len(data) - 1, 2):
+        if offset <= index < offset + 4:
+            continue
+        checksum += data[index] | (data[index + 1] << 8)
+        checksum = (checksum & 0xFFFF) + (checksum >> 16)
+    if len(data) % 2:
+        checksum += data[-1]
+        checksum = (checksum & 0xFFFF) + (checksum >> 16)
+    checksum = (checksum & 0xFFFF) + (checksum >> 16)
+    return (checksum + len(data)) & 0xFFFFFFFF
+
+
+def compute_checksum(path, chunk_size=PE_CHECKSUM_CHUNK_SIZE):
+    """通过内存映射计算文件的PE校验和"""
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return checksum_buffer(mm, chunk_size)
+
+
+def read_checksum(path):
+    """读取文件中记录的校验和"""
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return struct.unpack_from('<I', mm, checksum_offset(mm))[0]
+
+
+def update_checksum(path, chunk_size=PE_CHECKSUM_CHUNK_SIZE):
+    """重新计算并写入校验和，返回新值"""
+    with open(path, 'r+b') as f:
+        with mmap.mmap(f.fileno(), 0) as mm:
+            value = checksum_buffer(mm, chunk_size)
+            struct.pack_into('<I', mm, checksum_offset(mm), value)
+            mm.flush()
+    return value
+
+
+def verify_checksum(path, chunk_size=PE_CHECKSUM_CHUNK_SIZE):
+    """验证校验和，返回 (是否一致, 记录值, 计算值)"""
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            stored = struct.unpack_from('<I', mm, checksum_offset(mm))[0]
+            computed = checksum_buffer(mm, chunk_size)
+    return stored == computed, stored, computed
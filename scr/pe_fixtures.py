@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成PE文件模块 - 生成带图标资源的最小PE32+ DLL，用于在非Windows环境下验证和测量
+
+生成的文件包含 .text（填充数据）、.rsrc（图标组等资源）和 .reloc 三个节，
+布局与 imageres.dll 一致（资源节之后紧跟重定位节）。
+
+用法:
+    python pe_fixtures.py fake_imageres.dll --size-mb 50 --groups 20
+"""
+
+import argparse
+import io
+import random
+import struct
+
+from PIL import Image
+
+from config import ICON_RESOURCE_ID, TARGET_SIZES
+from pe_resources import (RT_ICON, RT_GROUP_ICON, COFF_HEADER, SECTION_HEADER,
+                          IMAGE_DIRECTORY_ENTRY_RESOURCE, IMAGE_DIRECTORY_ENTRY_BASERELOC,
+                          PE32_PLUS_MAGIC, parse_ico, build_group_icon, layout_resource_tree)
+
+FILE_ALIGNMENT = 0x200
+SECTION_ALIGNMENT = 0x1000
+PE_OFFSET = 0x80
+OPTIONAL_HEADER = struct.Struct('<HBBIIIIIQIIHHHHHHIIIIHHQQQQII')
+LANG_EN_US = 1033
+FILL_CHUNK_SIZE = 1024 * 1024
+
+
+def _align(value, alignment):
+    return (value + alignment - 1) // alignment * alignment
+
+
+def make_test_ico(sizes=TARGET_SIZES, color=(0, 120, 215), seed=0):
+    """生成多尺寸测试ICO数据"""
+    rng = random.Random(seed)
+    largest = max(sizes)
+    img = Image.new('RGBA', largest, color + (255,))
+    # 加入随机像素，避免压缩后各尺寸数据完全相同
+    pixels = img.load()
+    for _ in range(64):
+        pixels[rng.randrange(largest[0]), rng.randrange(largest[1])] = (
+            rng.randrange(256), rng.randrange(256), rng.randrange(256), 255)
+    buffer = io.BytesIO()
+    img.save(buffer, 'ICO', sizes=list(sizes))
+    return buffer.getvalue()
+
+
+def make_icon_groups(count, seed=0):
+    """生成 count 个图标组：启动图标组为完整尺寸，其余为 32/16 像素的小图标组"""
+    groups = {ICON_RESOURCE_ID: make_test_ico(seed=seed)}
+    for i in range(1, count):
+        groups[ICON_RESOURCE_ID + i] = make_test_ico(sizes=[(32, 32), (16, 16)], seed=seed + i)
+    return groups
+
+
+def build_resource_tree(icon_groups, lang=LANG_EN_US, extra_resources=None):
+    """由 {组ID: ICO数据} 生成资源树，RT_ICON 的ID按顺序分配"""
+    icons = {}
+    groups = {}
+    next_id = 1
+    for group_id, ico_data in icon_groups.items():
+        entries = parse_ico(ico_data)
+        icon_ids = list(range(next_id, next_id + len(entries)))
+        next_id += len(entries)
+        for entry, icon_id in zip(entries, icon_ids):
+            icons[icon_id] = {lang: (entry.data, 0)}
+        groups[group_id] = {lang: (build_group_icon(entries, icon_ids), 0)}
+
+    tree = {RT_ICON: icons, RT_GROUP_ICON: groups}
+    for type_key, names in (extra_resources or {}).items():
+        tree[type_key] = {name: {lang: (data, 0)} for name, data in names.items()}
+    return tree
+
+
+def _fill_bytes(size, seed):
+    """生成确定性的伪随机填充数据块"""
+    return random.Random(seed).randbytes(min(size, FILL_CHUNK_SIZE))
+
+
+def write_synthetic_dll(path, icon_groups=None, target_size=0, lang=LANG_EN_US, seed=0,
+                        extra_resources=None):
+    """写出合成DLL，target_size 为期望的大致文件大小（字节），通过 .text 填充达到"""
+    if icon_groups is None:
+        icon_groups = {ICON_RESOURCE_ID: make_test_ico(seed=seed)}
+    if extra_resources is None:
+        extra_resources = {'MUI': {1: b'synthetic-mui-data'}}
+
+    section_count = 3
+    headers_size = _align(PE_OFFSET + 4 + COFF_HEADER.size + OPTIONAL_HEADER.size + 16 * 8 +
+                          section_count * SECTION_HEADER.size, FILE_ALIGNMENT)
+
+    tree = build_resource_tree(icon_groups, lang, extra_resources)
+
+    # .text
+    text_rva = SECTION_ALIGNMENT
+    text_raw = headers_size
+    text_size = max(FILE_ALIGNMENT, _align(max(0, target_size - headers_size), FILE_ALIGNMENT))
+
+    # .rsrc（先按占位RVA计算大小，再用实际RVA布局）
+    rsrc_rva = text_rva + _align(text_size, SECTION_ALIGNMENT)
+    header, blobs, rsrc_size = layout_resource_tree(tree, rsrc_rva)
+    rsrc_raw = text_raw + text_size
+    rsrc_raw_size = _align(rsrc_size, FILE_ALIGNMENT)
+    if target_size:
+        # 扣除资源节后重新计算填充，使文件总大小接近目标
+        text_size = max(FILE_ALIGNMENT, _align(max(0, target_size - headers_size - rsrc_raw_size -
+                                                   FILE_ALIGNMENT), FILE_ALIGNMENT))
+        rsrc_rva = text_rva + _align(text_size, SECTION_ALIGNMENT)
+        header, blobs, rsrc_size = layout_resource_tree(tree, rsrc_rva)
+        rsrc_raw = text_raw + text_size
+        rsrc_raw_size = _align(rsrc_size, FILE_ALIGNMENT)
+
+    # .reloc：一个只包含块头的重定位块
+    reloc_rva = rsrc_rva + _align(rsrc_size, SECTION_ALIGNMENT)
+    reloc_data = struct.pack('<II', text_rva, 8)
+    reloc_raw = rsrc_raw + rsrc_raw_size
+    reloc_raw_size = FILE_ALIGNMENT
+    size_of_image = reloc_rva + SECTION_ALIGNMENT
+
+    directories = [(0, 0)] * 16
+    directories[IMAGE_DIRECTORY_ENTRY_RESOURCE] = (rsrc_rva, rsrc_size)
+    directories[IMAGE_DIRECTORY_ENTRY_BASERELOC] = (reloc_rva, len(reloc_data))
+
+    head = bytearray(headers_size)
+    head[0:2] = b'MZ'
+    struct.pack_into('<I', head, 0x3C, PE_OFFSET)
+    head[PE_OFFSET:PE_OFFSET + 4] = b'PE\0\0'
+    offset = PE_OFFSET + 4
+    COFF_HEADER.pack_into(head, offset, 0x8664, section_count, 0, 0, 0,
+                          OPTIONAL_HEADER.size + 16 * 8, 0x2022)
+    offset += COFF_HEADER.size
+    OPTIONAL_HEADER.pack_into(
+        head, offset, PE32_PLUS_MAGIC, 14, 0, text_size, rsrc_raw_size + reloc_raw_size, 0,
+        0, text_rva, 0x180000000, SECTION_ALIGNMENT, FILE_ALIGNMENT, 10, 0, 10, 0, 10, 0, 0,
+        size_of_image, headers_size, 0, 2, 0x160, 0x40000, 0x1000, 0x100000, 0x1000, 0, 16)
+    offset += OPTIONAL_HEADER.size
+    for rva, size in directories:
+        struct.pack_into('<II', head, offset, rva, size)
+        offset += 8
+    for name, virtual_size, rva, raw_size, raw, characteristics in (
+            (b'.text', text_size, text_rva, text_size, text_raw, 0x60000020),
+            (b'.rsrc', rsrc_size, rsrc_rva, rsrc_raw_size, rsrc_raw, 0x40000040),
+            (b'.reloc', len(reloc_data), reloc_rva, reloc_raw_size, reloc_raw, 0x42000040)):
+        SECTION_HEADER.pack_into(head, offset, name, virtual_size, rva, raw_size, raw,
+                                 0, 0, 0, 0, characteristics)
+        offset += SECTION_HEADER.size
+
+    with open(path, 'wb') as f:
+        f.write(head)
+
+        # 流式写出填充数据，避免大文件占用内存
+        chunk = _fill_bytes(text_size, seed)
+        remaining = text_size
+        while remaining:
+            piece = chunk[:remaining]
+            f.write(piece)
+            remaining -= len(piece)
+
+        section = bytearray(rsrc_raw_size)
+        section[:len(header)] = header
+        for blob_offset, data in blobs:
+            section[blob_offset:blob_offset + len(data)] = data
+        f.write(section)
+
+        f.write(reloc_data.ljust(reloc_raw_size, b'\0'))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成带图标资源的合成PE32+ DLL')
+    parser.add_argument('output', help='输出文件路径')
+    parser.add_argument('--size-mb', type=float, default=1, help='期望的文件大小（MB）')
+    parser.add_argument('--groups', type=int, default=1, help='图标组数量（包含启动图标组）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    args = parser.parse_args()
+
+    groups = make_icon_groups(args.groups, args.seed)
+    write_synthetic_dll(args.output, groups, int(args.size_mb * 1024 * 1024), seed=args.seed)
+    print(f"已生成: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PE资源读取模块 - 内存映射PE文件并解析 .rsrc 资源目录
+
+只读取头部和资源目录结构，图标数据以 memoryview 切片形式返回，不复制文件内容，
+即使是几十MB的 imageres.dll 也能快速取出当前的启动图标。
+"""
+
+import mmap
+import struct
+from collections import namedtuple
+
+from config import ICON_RESOURCE_ID
+
+# 资源类型
+RT_ICON = 3
+RT_GROUP_ICON = 14
+
+IMAGE_DIRECTORY_ENTRY_RESOURCE = 2
+IMAGE_DIRECTORY_ENTRY_SECURITY = 4
+IMAGE_DIRECTORY_ENTRY_BASERELOC = 5
+
+PE32_MAGIC = 0x10B
+PE32_PLUS_MAGIC = 0x20B
+
+# 结构格式
+DOS_HEADER_SIZE = 64
+COFF_HEADER = struct.Struct('<HHIIIHH')
+SECTION_HEADER = struct.Struct('<8sIIIIIIHHI')
+DATA_DIRECTORY = struct.Struct('<II')
+RESOURCE_DIRECTORY = struct.Struct('<IIHHHH')
+RESOURCE_DIRECTORY_ENTRY = struct.Struct('<II')
+RESOURCE_DATA_ENTRY = struct.Struct('<IIII')
+ICON_DIR = struct.Struct('<HHH')
+ICON_DIR_ENTRY = struct.Struct('<BBBBHHII')
+GROUP_ICON_DIR_ENTRY = struct.Struct('<BBBBHHIH')
+
+# 可选头中各字段相对可选头起始位置的偏移
+OPTIONAL_CHECKSUM_OFFSET = 64
+OPTIONAL_SIZE_OF_IMAGE_OFFSET = 56
+OPTIONAL_SIZE_OF_HEADERS_OFFSET = 60
+OPTIONAL_FILE_ALIGNMENT_OFFSET = 36
+OPTIONAL_SECTION_ALIGNMENT_OFFSET = 32
+
+Section = namedtuple('Section', 'name virtual_size virtual_address raw_size raw_offset characteristics header_offset')
+ResourceData = namedtuple('ResourceData', 'rva size codepage offset entry_offset')
+IconEntry = namedtuple('IconEntry', 'width height color_count planes bit_count icon_id data')
+
+
+class PEImage:
+    """只读内存映射的PE文件
+
+    返回的 memoryview 切片直接引用映射内存，关闭前需先释放。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"文件为空，不是有效的PE文件: {path}")
+        self.view = memoryview(self._mmap)
+        try:
+            self._parse_headers()
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """释放映射"""
+        if self._mmap is None:
+            return
+        self.view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # 调用方仍持有切片时由垃圾回收负责解除映射
+            pass
+        self._mmap = None
+        self._file.close()
+
+    @property
+    def size(self):
+        return len(self._mmap)
+
+    def _unpack(self, fmt, offset):
+        """在指定偏移处解析结构，越界时给出明确错误"""
+        if offset < 0 or offset + fmt.size > len(self._mmap):
+            raise ValueError(f"PE结构越界: 偏移 {offset:#x}")
+        return fmt.unpack_from(self._mmap, offset)
+
+    def _parse_headers(self):
+        """解析DOS头、COFF头、可选头和节表"""
+        if self.size < DOS_HEADER_SIZE or self._mmap[:2] != b'MZ':
+            raise ValueError(f"不是有效的PE文件（缺少MZ头）: {self.path}")
+        self.pe_offset = struct.unpack_from('<I', self._mmap, 0x3C)[0]
+        if self._mmap[self.pe_offset:self.pe_offset + 4] != b'PE\0\0':
+            raise ValueError(f"不是有效的PE文件（缺少PE签名）: {self.path}")
+
+        coff_offset = self.pe_offset + 4
+        (self.machine, section_count, _, _, _,
+         optional_size, self.characteristics) = self._unpack(COFF_HEADER, coff_offset)
+
+        self.optional_offset = coff_offset + COFF_HEADER.size
+        self.magic = self._unpack(struct.Struct('<H'), self.optional_offset)[0]
+        if self.magic == PE32_MAGIC:
+            directory_offset = self.optional_offset + 96
+        elif self.magic == PE32_PLUS_MAGIC:
+            directory_offset = self.optional_offset + 112
+        else:
+            raise ValueError(f"未知的可选头类型: {self.magic:#x}")
+
+        self.section_alignment, self.file_alignment = self._unpack(
+            struct.Struct('<II'), self.optional_offset + OPTIONAL_SECTION_ALIGNMENT_OFFSET)
+        self.size_of_image, self.size_of_headers, self.checksum = self._unpack(
+            struct.Struct('<III'), self.optional_offset + OPTIONAL_SIZE_OF_IMAGE_OFFSET)
+        self.checksum_offset = self.optional_offset + OPTIONAL_CHECKSUM_OFFSET
+
+        directory_count = self._unpack(struct.Struct('<I'), directory_offset - 4)[0]
+        self.data_directory_offset = directory_offset
+        self.data_directories = [
+            self._unpack(DATA_DIRECTORY, directory_offset + i * DATA_DIRECTORY.size)
+            for i in range(min(directory_count, 16))
+        ]
+
+        self.section_table_offset = self.optional_offset + optional_size
+        self.sections = []
+        for i in range(section_count):
+            header_offset = self.section_table_offset + i * SECTION_HEADER.size
+            (name, virtual_size, virtual_address, raw_size, raw_offset,
+             _, _, _, _, characteristics) = self._unpack(SECTION_HEADER, header_offset)
+            self.sections.append(Section(
+                name.rstrip(b'\0').decode('ascii', 'replace'), virtual_size, virtual_address,
+                raw_size, raw_offset, characteristics, header_offset
+            ))
+
+    def data_directory(self, index):
+        """返回数据目录 (rva, size)，不存在时为 (0, 0)"""
+        if index < len(self.data_directories):
+            return self.data_directories[index]
+        return 0, 0
+
+    def section_for_rva(self, rva):
+        """返回包含该RVA的节"""
+        for section in self.sections:
+            span = max(section.virtual_size, section.raw_size)
+            if section.virtual_address <= rva < section.virtual_address + span:
+                return section
+        return None
+
+    def rva_to_offset(self, rva):
+        """将RVA转换为文件偏移"""
+        section = self.section_for_rva(rva)
+        if section is None:
+            if rva < self.size_of_headers:
+                return rva
+            raise ValueError(f"RVA不在任何节中: {rva:#x}")
+        return section.raw_offset + (rva - section.virtual_address)
+
+    def resource_section(self):
+        """返回资源目录所在的节"""
+        rva, size = self.data_directory(IMAGE_DIRECTORY_ENTRY_RESOURCE)
+        if not rva or not size:
+            return None
+        return self.section_for_rva(rva)
+
+    def resources(self):
+        """解析资源目录树，返回 {类型: {名称: {语言: ResourceData}}}
+
+        名称和类型为整数ID或字符串。
+        """
+        rva, size = self.data_directory(IMAGE_DIRECTORY_ENTRY_RESOURCE)
+        if not rva or not size:
+            return {}
+        root = self.rva_to_offset(rva)
+        visited = set()
+        return self._read_directory(root, root, 0, visited)
+
+    def _read_name(self, root, offset):
+        """读取资源目录中的UTF-16字符串名称"""
+        length = self._unpack(struct.Struct('<H'), root + offset)[0]
+        start = root + offset + 2
+        return bytes(self.view[start:start + length * 2]).decode('utf-16-le')
+
+    def _read_directory(self, root, offset, depth, visited):
+        """递归读取资源目录（类型 → 名称 → 语言 三层）"""
+        if offset in visited or depth > 2:
+            raise ValueError("资源目录结构异常（存在循环或层级过深）")
+        visited.add(offset)
+
+        _, _, _, _, named_count, id_count = self._unpack(RESOURCE_DIRECTORY, offset)
+        result = {}
+        entry_offset = offset + RESOURCE_DIRECTORY.size
+        for i in range(named_count + id_count):
+            name_field, data_field = self._unpack(
+                RESOURCE_DIRECTORY_ENTRY, entry_offset + i * RESOURCE_DIRECTORY_ENTRY.size)
+            if name_field & 0x80000000:
+                key = self._read_name(root, name_field & 0x7FFFFFFF)
+            else:
+                key = name_field & 0xFFFF
+
+            if data_field & 0x80000000:
+                result[key] = self._read_directory(root, root + (data_field & 0x7FFFFFFF), depth + 1, visited)
+            else:
+                data_entry_offset = root + data_field
+                data_rva, data_size, codepage, _ = self._unpack(RESOURCE_DATA_ENTRY, data_entry_offset)
+                result[key] = ResourceData(
+                    data_rva, data_size, codepage, self.rva_to_offset(data_rva), data_entry_offset)
+        return result
+
+    def resource_bytes(self, data):
+        """返回资源数据的零拷贝切片"""
+        if data.offset + data.size > self.size:
+            raise ValueError(f"资源数据越界: RVA {data.rva:#x}")
+        return self.view[data.offset:data.offset + data.size]
+
+
+def _pick_language(languages, lang=None):
+    """在语言节点中选择指定语言，未指定时取第一个"""
+    if not languages:
+        return None, None
+    if lang is not None and lang in languages:
+        return lang, languages[lang]
+    first = sorted(languages, key=str)[0]
+    return first, languages[first]
+
+
+def parse_group_icon(data):
+    """解析 RT_GROUP_ICON 数据，返回 [(width, height, colors, planes, bits, bytes_in_res, icon_id)]"""
+    reserved, icon_type, count = ICON_DIR.unpack_from(data, 0)
+    if icon_type != 1:
+        raise ValueError("图标组类型无效")
+    entries = []
+    for i in range(count):
+        width, height, colors, _, planes, bits, size, icon_id = GROUP_ICON_DIR_ENTRY.unpack_from(
+            data, ICON_DIR.size + i * GROUP_ICON_DIR_ENTRY.size)
+        entries.append((width or 256, height or 256, colors, planes, bits, size, icon_id))
+    return entries
+
+
+def build_group_icon(entries, icon_ids):
+    """根据图标条目和分配的ID生成 RT_GROUP_ICON 数据"""
+    data = bytearray(ICON_DIR.pack(0, 1, len(entries)))
+    for entry, icon_id in zip(entries, icon_ids):
+        data += GROUP_ICON_DIR_ENTRY.pack(
+            entry.width % 256, entry.height % 256, entry.color_count, 0,
+            entry.planes, entry.bit_count, len(entry.data), icon_id)
+    return bytes(data)
+
+
+def read_icon_group(pe, group_id=ICON_RESOURCE_ID, lang=None):
+    """读取图标组及其 RT_ICON 数据（零拷贝切片）
+
+    返回 (语言, 组数据ResourceData, [IconEntry])。
+    """
+    resources = pe.resources()
+    groups = resources.get(RT_GROUP_ICON, {})
+    if group_id not in groups:
+        raise KeyError(f"未找到图标组: {group_id}")
+    lang, group_data = _pick_language(groups[group_id], lang)
+
+    icons = resources.get(RT_ICON, {})
+    entries = []
+    for width, height, colors, planes, bits, _, icon_id in parse_group_icon(pe.resource_bytes(group_data)):
+        _, icon_data = _pick_language(icons.get(icon_id, {}), lang)
+        if icon_data is None:
+            raise KeyError(f"图标组 {group_id} 引用的图标不存在: {icon_id}")
+        entries.append(IconEntry(width, height, colors, planes, bits, icon_id, pe.resource_bytes(icon_data)))
+    return lang, group_data, entries
+
+
+def parse_ico(data):
+    """解析ICO文件数据，返回 [IconEntry]（icon_id为None）"""
+    data = memoryview(data)
+    reserved, icon_type, count = ICON_DIR.unpack_from(data, 0)
+    if reserved != 0 or icon_type != 1 or count == 0:
+        raise ValueError("不是有效的ICO文件")
+    entries = []
+    for i in range(count):
+        width, height, colors, _, planes, bits, size, offset = ICON_DIR_ENTRY.unpack_from(
+            data, ICON_DIR.size + i * ICON_DIR_ENTRY.size)
+        if offset + size > len(data):
+            raise ValueError("ICO文件数据不完整")
+        entries.append(IconEntry(width or 256, height or 256, colors, planes, bits, None,
+                                 data[offset:offset + size]))
+    return entries
+
+
+def build_ico(entries):
+    """将 [IconEntry] 组装为ICO文件数据"""
+    header = bytearray(ICON_DIR.pack(0, 1, len(entries)))
+    offset = ICON_DIR.size + ICON_DIR_ENTRY.size * len(entries)
+    for entry in entries:
+        header += ICON_DIR_ENTRY.pack(
+            entry.width % 256, entry.height % 256, entry.color_count, 0,
+            entry.planes, entry.bit_count, len(entry.data), offset)
+        offset += len(entry.data)
+    return b''.join([bytes(header)] + [bytes(entry.data) for entry in entries])
+
+
+def extract_icon_group(path, group_id=ICON_RESOURCE_ID, largest_only=False):
+    """从PE文件中取出图标组并组装为ICO数据
+
+    largest_only 为True时只保留最大的一张，便于直接用于预览。
+    """
+    with PEImage(path) as pe:
+        _, _, entries = read_icon_group(pe, group_id)
+        selected = entries
+        if largest_only:
+            selected = [max(entries, key=lambda e: (e.width * e.height, e.bit_count))]
+        ico = build_ico(selected)
+        for entry in entries:
+            entry.data.release()
+        return ico
+
+
+def _sorted_keys(keys):
+    """资源目录要求字符串名称在前（按名称排序），整数ID在后（升序）"""
+    named = sorted((k for k in keys if isinstance(k, str)), key=lambda k: k.upper())
+    ids = sorted(k for k in keys if not isinstance(k, str))
+    return named + ids
+
+
+def _align(value, alignment):
+    return (value + alignment - 1) // alignment * alignment
+
+
+def layout_resource_tree(tree, section_rva):
+    """计算资源节布局
+
+    tree 的结构为 {类型: {名称: {语言: (数据, 代码页)}}}，数据可以是 memoryview。
+    返回 (目录头部 bytearray, [(节内偏移, 数据)], 节总大小)，
+    调用方按偏移写出数据即可得到完整的资源节，不需要把数据拼接到内存中。
+    """
+    # 广度优先分配目录表位置：根 → 类型 → 名称
+    directories = [(tree, 0)]
+    index = 0
+    while index < len(directories):
+        node, depth = directories[index]
+        if depth < 2:
+            for key in _sorted_keys(node):
+                directories.append((node[key], depth + 1))
+        index += 1
+
+    offset = 0
+    directory_offsets = []
+    for node, _ in directories:
+        directory_offsets.append(offset)
+        offset += RESOURCE_DIRECTORY.size + RESOURCE_DIRECTORY_ENTRY.size * len(node)
+
+    # 字符串名称
+    string_offsets = {}
+    for node, _ in directories:
+        for key in node:
+            if isinstance(key, str) and key not in string_offsets:
+                string_offsets[key] = offset
+                offset += 2 + len(key.encode('utf-16-le'))
+    offset = _align(offset, 4)
+
+    # 数据项描述
+    leaves = []
+    for node, depth in directories:
+        if depth == 2:
+            for key in _sorted_keys(node):
+                leaves.append(node[key])
+    data_entry_start = offset
+    offset += RESOURCE_DATA_ENTRY.size * len(leaves)
+
+    # 数据本身按8字节对齐
+    blobs = []
+    for data, _ in leaves:
+        offset = _align(offset, 8)
+        blobs.append((offset, data))
+        offset += len(data)
+    total_size = offset
+
+    header = bytearray(data_entry_start + RESOURCE_DATA_ENTRY.size * len(leaves))
+    child_index = 1
+    leaf_index = 0
+    for (node, depth), dir_offset in zip(directories, directory_offsets):
+        keys = _sorted_keys(node)
+        named_count = sum(1 for k in keys if isinstance(k, str))
+        RESOURCE_DIRECTORY.pack_into(header, dir_offset, 0, 0, 0, 0, named_count, len(keys) - named_count)
+        for i, key in enumerate(keys):
+            if isinstance(key, str):
+                name_field = 0x80000000 | string_offsets[key]
+            else:
+                name_field = key & 0xFFFF
+            if depth < 2:
+                data_field = 0x80000000 | directory_offsets[child_index]
+                child_index += 1
+            else:
+                data_field = data_entry_start + leaf_index * RESOURCE_DATA_ENTRY.size
+                leaf_index += 1
+            RESOURCE_DIRECTORY_ENTRY.pack_into(
+                header, dir_offset + RESOURCE_DIRECTORY.size + i * RESOURCE_DIRECTORY_ENTRY.size,
+                name_field, data_field)
+
+    for key, string_offset in string_offsets.items():
+        encoded = key.encode('utf-16-le')
+        struct.pack_into('<H', header, string_offset, len(key))
+        header[string_offset + 2:string_offset + 2 + len(encoded)] = encoded
+
+    for i, ((data, codepage), (blob_offset, _)) in enumerate(zip(leaves, blobs)):
+        RESOURCE_DATA_ENTRY.pack_into(
+            header, data_entry_start + i * RESOURCE_DATA_ENTRY.size,
+            section_rva + blob_offset, len(data), codepage, 0)
+
+    return header, blobs, total_size
@@ -0,0 +1,576 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+管理员助手进程模块 - 只在独立的提权进程中执行需要管理员权限的文件操作
+
+界面进程始终以普通用户身份运行（启动快，图片解码也不带管理员权限），
+第一次需要备份、写入或还原系统文件时才启动助手进程：
+- Windows 上通过 ShellExecuteW("runas") 提权启动（弹出UAC提示），其他平台以普通用户身份启动，
+  作为测试和基准测试的替身；
+- 界面进程在本地地址（Windows命名管道、POSIX的Unix套接字）上监听，助手进程启动后连接回来，
+  建立 PRIVILEGED_HELPER_CONNECTIONS 个连接（每个连接同时只执行一个请求），连接全部断开后退出。
+  由普通用户创建管道、管理员进程连接，双方都有访问权限；反过来普通用户进程无权打开管理员创建的管道；
+- 连接用 multiprocessing.connection 的 HMAC 握手认证，密钥经只有当前用户可读的临时文件传递，助手进程读取后删除；
+- 请求和响应都是紧凑的二进制格式（不使用pickle，提权进程不反序列化任意对象）：
+  请求 = 操作码(1字节) + 参数个数(1字节) + 参数，响应 = 状态(1字节) + 字段个数(1字节) + 字段，
+  参数和字段都是 长度(2字节) + UTF-8 文本；
+- 不信任界面进程传来的路径和文件：只允许操作 config.TARGET_FILE，备份只写入 config.SYSTEM_BACKUP_DIR
+  （Windows上只有管理员可写）并记录SHA-256；写入前新文件先复制到该目录，必须是有效的PE文件，
+  且与当前系统文件（必须已备份）相比只替换了启动图标组及其图标；还原只接受备份仓库中的清单，
+  其内容必须是助手进程记录过的备份，恢复时逐块校验；
+- 创建系统还原点同样需要管理员权限，也在助手进程中执行。
+
+用法（由 PrivilegedHelper 自动启动，无需手动运行）:
+    python privileged_helper.py --serve ADDRESS KEY_FILE
+"""
+
+import os
+import secrets
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+from config import (TARGET_FILE, BACKUP_STORE_DIR, SYSTEM_BACKUP_DIR, SYSTEM_BACKUP_KEEP, ICON_CACHE_TIMEOUT,
+                    PRIVILEGED_HELPER_START_TIMEOUT, PRIVILEGED_HELPER_MAX_MESSAGE, PRIVILEGED_HELPER_CONNECTIONS)
+
+OP_PING = 0
+OP_BACKUP = 1
+OP_WRITE = 2
+OP_RESTORE = 3
+OP_RESTORE_POINT = 4
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+# 最终响应之前发送的进度消息：[已完成字节数, 总字节数]
+STATUS_PROGRESS = 2
+
+HEADER = struct.Struct('<BB')
+FIELD_LENGTH = struct.Struct('<H')
+CONNECT_RETRY_INTERVAL = 0.05
+
+# 可以原样传回界面进程的异常类型，其他异常统一为 Exception
+_ERROR_TYPES = {cls.__name__: cls for cls in (FileNotFoundError, PermissionError, ValueError, OSError)}
+
+
+def encode_message(code, fields):
+    """编码请求或响应：code(1字节) + 字段个数(1字节) + [长度(2字节) + UTF-8]"""
+    parts = [HEADER.pack(code, len(fields))]
+    for field in fields:
+        data = str(field).encode('utf-8')
+        parts.append(FIELD_LENGTH.pack(len(data)))
+        parts.append(data)
+    return b''.join(parts)
+
+
+def decode_message(data):
+    """解码消息，返回 (code, [字段])，格式错误时抛出 ValueError"""
+    if len(data) < HEADER.size:
+        raise ValueError("消息过短")
+    code, count = HEADER.unpack_from(data)
+    offset = HEADER.size
+    fields = []
+    for _ in range(count):
+        if offset + FIELD_LENGTH.size > len(data):
+            raise ValueError("消息被截断")
+        (length,) = FIELD_LENGTH.unpack_from(data, offset)
+        offset += FIELD_LENGTH.size
+        if offset + length > len(data):
+            raise ValueError("消息被截断")
+        fields.append(data[offset:offset + length].decode('utf-8'))
+        offset += length
+    if offset != len(data):
+        raise ValueError("消息末尾有多余数据")
+    return code, fields
+
+
+def _same_path(a, b):
+    return os.path.normcase(os.path.abspath(a)) == os.path.normcase(os.path.abspath(b))
+
+
+def _is_within(path, directory):
+    """path 是否位于 directory 之中（解析符号链接后比较）"""
+    path = os.path.normcase(os.path.realpath(path))
+    directory = os.path.normcase(os.path.realpath(directory))
+    return os.path.commonpath([path, directory]) == directory
+
+
+def _check_target(target_path):
+    """只允许操作配置中的系统文件"""
+    if not _same_path(target_path, TARGET_FILE):
+        raise PermissionError(f"不允许操作该文件: {target_path}")
+
+
+_TRUSTED_OWNERS = ('S-1-5-32-544', 'S-1-5-18')  # Administrators、SYSTEM
+_ADMIN_ONLY_ACL = ("*S-1-5-32-544:(OI)(CI)F", "*S-1-5-18:(OI)(CI)F", "*S-1-5-32-545:(OI)(CI)RX")
+FILE_ATTRIBUTE_REPARSE_POINT = 0x400
+_protected = set()
+_protect_lock = threading.Lock()
+
+
+def _owner_sid(path):
+    """返回文件或目录所有者的SID字符串（仅Windows）"""
+    import ctypes
+
+    advapi32 = ctypes.windll.advapi32
+    kernel32 = ctypes.windll.kernel32
+    owner = ctypes.c_void_p()
+    descriptor = ctypes.c_void_p()
+    # SE_FILE_OBJECT = 1, OWNER_SECURITY_INFORMATION = 1
+    error = advapi32.GetNamedSecurityInfoW(ctypes.c_wchar_p(path), 1, 1, ctypes.byref(owner),
+                                           None, None, None, ctypes.byref(descriptor))
+    if error:
+        raise ctypes.WinError(error)
+    try:
+        text = ctypes.c_void_p()
+        if not advapi32.ConvertSidToStringSidW(owner, ctypes.byref(text)):
+            raise ctypes.WinError()
+        try:
+            return ctypes.wstring_at(text.value)
+        finally:
+            kernel32.LocalFree(text)
+    finally:
+        kernel32.LocalFree(descriptor)
+
+
+def _is_trusted_directory(path):
+    """目录是否由管理员或SYSTEM所有且不是重解析点（普通用户无法把所有者设为其他账户）"""
+    if os.lstat(path).st_file_attributes & FILE_ATTRIBUTE_REPARSE_POINT:
+        return False
+    return _owner_sid(path) in _TRUSTED_OWNERS
+
+
+def _icacls(*args, timeout=ICON_CACHE_TIMEOUT):
+    result = subprocess.run(["icacls", *args, "/Q"], capture_output=True, text=True, timeout=timeout)
+    if result.returncode != 0:
+        raise PermissionError(f"无法设置备份目录的权限: {(result.stdout + result.stderr).strip()}")
+
+
+def _protect_directory(directory):
+    """创建助手进程的备份目录并确保只有管理员和SYSTEM可写（普通用户只读），之后才能信任其中的记录
+
+    Windows上（目录直接位于由系统所有的ProgramData下）：
+    - 已存在但不是由管理员或SYSTEM所有的目录可能是普通用户预先创建的，其中的记录可能是伪造的，整个移走；
+    - 取得整个目录树的所有权、重置所有文件的权限，再去掉继承的权限（新的权限会传播到其中的文件），
+      任何一步失败都抛出 PermissionError；
+    - 由本进程新建的目录在设置权限前的短暂时间内普通用户也可写入，设置权限后清空其中的内容。
+    每个进程只需处理一次：设置权限后普通用户无法再改动目录。
+    """
+    with _protect_lock:
+        if directory in _protected:
+            return
+        if os.name == 'nt':
+            if os.path.lexists(directory) and not _is_trusted_directory(directory):
+                os.replace(directory, f"{directory}.untrusted-{time.strftime('%Y%m%d-%H%M%S')}")
+            created = not os.path.isdir(directory)
+            os.makedirs(directory, exist_ok=True)
+            _icacls(directory, "/setowner", "*S-1-5-32-544", "/T")
+            _icacls(directory, "/reset", "/T")
+            _icacls(directory, "/inheritance:r", "/grant:r", *_ADMIN_ONLY_ACL)
+            if created:
+                for name in os.listdir(directory):
+                    path = os.path.join(directory, name)
+                    if os.path.isdir(path) and not os.path.islink(path):
+                        shutil.rmtree(path)
+                    else:
+                        os.remove(path)
+        else:
+            os.makedirs(directory, exist_ok=True)
+        _protected.add(directory)
+
+
+def recorded_backup_hashes(backup_dir=SYSTEM_BACKUP_DIR):
+    """助手进程备份过的所有内容的SHA-256，按备份时间从旧到新（最早的一份即原始系统文件）
+
+    完整副本可能已被清理，校验记录一直保留；备份目录普通用户可读，界面进程也用它判断能否还原。
+    """
+    from system_ops import read_backup_hash
+
+    if not os.path.isdir(backup_dir):
+        return []
+    records = sorted((os.path.join(backup_dir, name) for name in os.listdir(backup_dir)
+                      if name.endswith('.backup.sha256')), key=os.path.getmtime)
+    hashes = [read_backup_hash(path[:-len('.sha256')]) for path in records]
+    return [digest for digest in hashes if digest]
+
+
+def _prune_backups(current_path, keep=SYSTEM_BACKUP_KEEP):
+    """只保留最早的一份（原始系统文件）、刚完成的一份和最新的几份完整副本"""
+    backups = sorted((os.path.join(SYSTEM_BACKUP_DIR, name) for name in os.listdir(SYSTEM_BACKUP_DIR)
+                      if name.endswith('.backup')), key=lambda path: os.path.getmtime(path + '.sha256'))
+    for path in backups[1:len(backups) - max(keep - 1, 0)]:
+        if not _same_path(path, current_path):
+            os.remove(path)
+
+
+def _handle_ping():
+    return [os.getpid()]
+
+
+def _handle_backup(target_path, backup_dir, progress=None):
+    from system_ops import backup_system_file, read_backup_hash
+
+    _check_target(target_path)
+    if not _same_path(backup_dir, SYSTEM_BACKUP_DIR):
+        raise PermissionError(f"不允许备份到该目录: {backup_dir}")
+    _protect_directory(SYSTEM_BACKUP_DIR)
+    staging = os.path.join(SYSTEM_BACKUP_DIR, f'staging_{os.getpid()}')
+    try:
+        staged = backup_system_file(target_path, staging, progress)
+        sha256 = read_backup_hash(staged)
+        # 按内容命名，同一内容只保留一份，不同版本（原始文件、每次替换前的文件）各自记录
+        name = f"{os.path.basename(target_path)}.{sha256[:16]}.backup"
+        backup_path = os.path.join(SYSTEM_BACKUP_DIR, name)
+        os.replace(staged, backup_path)
+        # 同一内容再次备份时保留原有记录，记录的时间顺序即各版本第一次出现的顺序
+        if read_backup_hash(backup_path) != sha256:
+            with open(backup_path + '.sha256', 'w', encoding='utf-8') as f:
+                f.write(f"{sha256}  {name}\n")
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    _prune_backups(backup_path)
+    return [backup_path, sha256]
+
+
+def _handle_write(source_path, target_path):
+    from system_ops import replace_system_file, verify_icon_only_change
+    from file_copy import copy_file_hashed, sha256_file
+
+    _check_target(target_path)
+    if not os.path.isfile(source_path):
+        raise FileNotFoundError(f"新文件不存在: {source_path}")
+    _protect_directory(SYSTEM_BACKUP_DIR)
+    # 当前系统文件必须已由助手进程备份，之后才能还原
+    if sha256_file(target_path) not in recorded_backup_hashes():
+        raise PermissionError("系统文件尚未备份，拒绝写入")
+    # 先复制到只有管理员可写的目录再检查和写入，检查之后新文件不会再被普通用户进程改动
+    staged = os.path.join(SYSTEM_BACKUP_DIR, f'write_{os.getpid()}.dll')
+    try:
+        copy_file_hashed(source_path, staged)
+        verify_icon_only_change(staged, target_path, SYSTEM_BACKUP_DIR)
+        old_path, sha256 = replace_system_file(staged, target_path)
+    finally:
+        if os.path.exists(staged):
+            os.remove(staged)
+    return [old_path or '', sha256]
+
+
+def _handle_restore(manifest_path, target_path):
+    from backup_store import load_manifest, restore_backup
+    from system_ops import replace_system_file
+
+    _check_target(target_path)
+    if not _is_within(manifest_path, os.path.join(BACKUP_STORE_DIR, 'manifests')):
+        raise PermissionError(f"只能从备份仓库还原: {manifest_path}")
+    _protect_directory(SYSTEM_BACKUP_DIR)
+    # 清单在普通用户可写的目录中，核对之后可能被替换：只用记录中的哈希校验恢复结果
+    expected = load_manifest(manifest_path)["sha256"]
+    if expected not in recorded_backup_hashes():
+        raise PermissionError("该备份不是由助手进程记录的系统文件，拒绝还原")
+    staged = os.path.join(SYSTEM_BACKUP_DIR, f'restore_{os.getpid()}.dll')
+    try:
+        # 写入只有管理员可写的目录，逐块校验，整体哈希必须等于助手进程的记录
+        restore_backup(manifest_path, staged, expected_sha256=expected)
+        old_path, sha256 = replace_system_file(staged, target_path)
+    finally:
+        if os.path.exists(staged):
+            os.remove(staged)
+    return [old_path or '', sha256]
+
+
+def _handle_restore_point():
+    from system_ops import create_restore_point
+
+    return [int(create_restore_point())]
+
+
+# 接受 progress 参数、会在最终响应之前发送进度消息的操作
+_PROGRESS_OPS = {OP_BACKUP}
+
+_HANDLERS = {
+    OP_PING: (_handle_ping, 0),
+    OP_BACKUP: (_handle_backup, 2),
+    OP_WRITE: (_handle_write, 2),
+    OP_RESTORE: (_handle_restore, 2),
+    OP_RESTORE_POINT: (_handle_restore_point, 0),
+}
+
+
+def handle_request(data, send_progress=None):
+    """处理一条请求，返回编码后的响应（任何错误都作为错误响应返回）
+
+    send_progress(已完成, 总数) 用于在处理过程中发送进度消息，只有 _PROGRESS_OPS 中的操作会调用。
+    """
+    try:
+        op, args = decode_message(data)
+        if op not in _HANDLERS:
+            raise ValueError(f"未知的操作: {op}")
+        handler, argc = _HANDLERS[op]
+        if len(args) != argc:
+            raise ValueError(f"操作 {op} 需要 {argc} 个参数，收到 {len(args)} 个")
+        if op in _PROGRESS_OPS:
+            return encode_message(STATUS_OK, handler(*args, progress=send_progress))
+        return encode_message(STATUS_OK, handler(*args))
+    except Exception as e:
+        return encode_message(STATUS_ERROR, [type(e).__name__, str(e)])
+
+
+def _serve_connection(conn):
+    """依次处理一个连接上的请求，直到连接断开"""
+    with conn:
+        while True:
+            try:
+                data = conn.recv_bytes(PRIVILEGED_HELPER_MAX_MESSAGE)
+            except (EOFError, OSError):
+                break
+            conn.send_bytes(handle_request(data, lambda done, total: conn.send_bytes(
+                encode_message(STATUS_PROGRESS, [done, total]))))
+
+
+def serve(address, key_file, connections=PRIVILEGED_HELPER_CONNECTIONS):
+    """助手进程入口：读取并删除密钥文件，连接到界面进程并处理请求，所有连接断开后退出"""
+    with open(key_file, 'rb') as f:
+        authkey = f.read()
+    os.remove(key_file)
+
+    # 连接的同时预先导入文件操作模块，第一个请求不再承担导入时间
+    threading.Thread(target=__import__, args=('system_ops',), daemon=True).start()
+    threads = []
+    for _ in range(connections):
+        conn = Client(address, authkey=authkey)
+        thread = threading.Thread(target=_serve_connection, args=(conn,), daemon=True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+
+def _helper_command(address, key_file):
+    """启动助手进程的命令（打包为exe后由 main.py 的 --privileged-helper 参数进入）"""
+    if getattr(sys, 'frozen', False):
+        return [sys.executable, '--privileged-helper', address, key_file]
+    return [sys.executable, os.path.abspath(__file__), '--serve', address, key_file]
+
+
+class PrivilegedHelper:
+    """管理员助手进程的客户端，第一次调用时启动助手进程
+
+    可以在多个线程中调用：每个调用占用一个空闲连接，连接都在使用中时等待。
+    """
+
+    def __init__(self, elevate=None, start_timeout=PRIVILEGED_HELPER_START_TIMEOUT):
+        # 只有Windows需要提权，其他平台以普通用户身份运行替身
+        self.elevate = os.name == 'nt' if elevate is None else elevate
+        self.start_timeout = start_timeout
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+        self._process = None
+        self._connections = []
+        self._idle = []
+        self._closed = False
+
+    def start(self):
+        """启动助手进程并等待其连接（已启动时直接返回）"""
+        with self._lock:
+            self._ensure_started()
+
+    def _ensure_started(self):
+        if self._closed:
+            raise ConnectionError("助手进程已关闭")
+        if self._connections:
+            return
+        private_dir = tempfile.mkdtemp(prefix='icon_replacer_helper_')
+        try:
+            if os.name == 'nt':
+                address = rf'\\.\pipe\icon_replacer_{secrets.token_hex(8)}'
+            else:
+                # 临时目录只有当前用户可以访问，套接字文件放在其中
+                address = os.path.join(private_dir, 'helper.sock')
+            authkey = secrets.token_bytes(32)
+            key_file = os.path.join(private_dir, 'key')
+            fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(authkey)
+            with Listener(address, authkey=authkey) as listener:
+                self._launch(_helper_command(address, key_file))
+                self._connections = self._accept(listener, address, authkey)
+            self._idle = list(self._connections)
+        except Exception:
+            # 未能连接的助手进程不再等待其退出
+            if self._process is not None:
+                self._process.kill()
+            self._reset()
+            raise
+        finally:
+            # 连接建立后套接字文件和密钥文件都不再需要
+            shutil.rmtree(private_dir, ignore_errors=True)
+
+    def _launch(self, command):
+        if not self.elevate:
+            self._process = subprocess.Popen(command)
+            return
+        import ctypes
+        params = subprocess.list2cmdline(command[1:])
+        # 返回值不大于32表示启动失败（如用户在UAC提示中选择了“否”）
+        result = ctypes.windll.shell32.ShellExecuteW(None, "runas", command[0], params, None, 0)
+        if result <= 32:
+            raise PermissionError(f"无法以管理员身份启动助手进程（错误码 {result}），可能是用户拒绝了权限请求")
+
+    def _accept(self, listener, address, authkey):
+        """等待助手进程建立所有连接，超时或助手进程提前退出时抛出异常"""
+        state = {"done": False, "failure": None}
+        lock = threading.Lock()
+
+        def watchdog():
+            deadline = time.monotonic() + self.start_timeout
+            while True:
+                time.sleep(CONNECT_RETRY_INTERVAL)
+                if self._closed:
+                    failure = ConnectionError("助手进程已关闭，不再等待其连接")
+                elif self._process is not None and self._process.poll() is not None:
+                    failure = ConnectionError(f"助手进程启动失败（退出码 {self._process.returncode}）")
+                elif time.monotonic() >= deadline:
+                    failure = TimeoutError(f"助手进程在 {self.start_timeout} 秒内未能连接")
+                else:
+                    with lock:
+                        if state["done"]:
+                            return
+                    continue
+                with lock:
+                    if state["done"]:
+                        return
+                    state["failure"] = failure
+                # accept() 无法设置超时，自己连接一次把它唤醒
+                try:
+                    Client(address, authkey=authkey).close()
+                except Exception:
+                    pass
+                return
+
+        threading.Thread(target=watchdog, daemon=True).start()
+        connections = []
+        try:
+            while len(connections) < PRIVILEGED_HELPER_CONNECTIONS:
+                connections.append(listener.accept())
+                with lock:
+                    if state["failure"] is not None:
+                        raise state["failure"]
+            with lock:
+                if state["failure"] is not None:
+                    raise state["failure"]
+                state["done"] = True
+            return connections
+        except Exception:
+            for conn in connections:
+                conn.close()
+            raise
+
+    def call(self, op, *args, progress_callback=None):
+        """执行一个请求，返回响应字段列表，助手进程中的错误以相应类型的异常抛出
+
+        progress_callback(已完成, 总数) 接收助手进程在最终响应之前发送的进度消息。
+        """
+        with self._lock:
+            while True:
+                self._ensure_started()
+                if self._idle:
+                    break
+                self._released.wait()
+            conn = self._idle.pop()
+        try:
+            conn.send_bytes(encode_message(op, args))
+            while True:
+                # 等待响应时定期检查是否已关闭，关闭窗口时不必等到助手进程中的操作完成
+                while not conn.poll(CONNECT_RETRY_INTERVAL):
+                    if self._closed:
+                        raise ConnectionError("助手进程已关闭")
+                status, fields = decode_message(conn.recv_bytes(PRIVILEGED_HELPER_MAX_MESSAGE))
+                if status != STATUS_PROGRESS:
+                    break
+                if progress_callback:
+                    done, total = fields
+                    progress_callback(int(done), int(total))
+        except (EOFError, OSError) as e:
+            # 助手进程已经退出，下次调用时重新启动
+            self.stop()
+            raise ConnectionError(f"与助手进程的连接已断开: {str(e)}")
+        with self._lock:
+            if conn in self._connections:
+                self._idle.append(conn)
+                self._released.notify()
+        if status != STATUS_OK:
+            name, message = fields
+            raise _ERROR_TYPES.get(name, Exception)(message)
+        return fields
+
+    def ping(self):
+        """返回助手进程的pid"""
+        return int(self.call(OP_PING)[0])
+
+    def backup(self, target_path, backup_dir, progress_callback=None):
+        """备份系统文件，返回备份路径（与 system_ops.backup_system_file 接口相同）
+
+        backup_dir 只能是 config.SYSTEM_BACKUP_DIR，备份按内容命名；
+        progress_callback(已复制字节数, 总字节数) 接收助手进程转发的复制进度。
+        """
+        backup_path, _ = self.call(OP_BACKUP, target_path, backup_dir, progress_callback=progress_callback)
+        return backup_path
+
+    def write(self, source_path, target_path):
+        """用新文件替换系统文件，返回值同 system_ops.replace_system_file"""
+        old_path, sha256 = self.call(OP_WRITE, source_path, target_path)
+        return old_path or None, sha256
+
+    def restore(self, manifest_path, target_path):
+        """用备份仓库中的清单还原系统文件（必须是助手进程记录过的备份），返回值同 system_ops.replace_system_file"""
+        old_path, sha256 = self.call(OP_RESTORE, manifest_path, target_path)
+        return old_path or None, sha256
+
+    def create_restore_point(self):
+        """创建系统还原点，失败时返回False（与 system_ops.create_restore_point 相同）"""
+        return self.call(OP_RESTORE_POINT)[0] == '1'
+
+    def _reset(self):
+        connections, self._connections, self._idle = self._connections, [], []
+        for conn in connections:
+            conn.close()
+        # 等待在空闲连接上的调用重新检查（之后会重新启动助手进程）
+        self._released.notify_all()
+        process, self._process = self._process, None
+        if process is not None:
+            try:
+                process.wait(5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def stop(self):
+        """断开所有连接，助手进程随之退出"""
+        with self._lock:
+            self._reset()
+
+    def close(self):
+        """关闭客户端：正在进行的调用和启动等待很快以 ConnectionError 结束，之后不再启动助手进程
+
+        助手进程中已经开始的操作（如写入系统文件）会执行完，发现连接断开后退出。
+        """
+        self._closed = True
+        with self._lock:
+            # 不等待助手进程退出，它发现连接断开后自行退出
+            self._process = None
+            self._reset()
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == '--serve':
+        serve(sys.argv[2], sys.argv[3])
+    else:
+        print(__doc__)
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+替换流程模块 - 以依赖图的形式并发执行替换前的准备工作
+
+每个阶段声明自己依赖的阶段，依赖都完成后立即在线程池中开始，
+因此图标编码、系统文件备份和创建还原点可以同时进行。
+运行结束后报告实际耗时以及各阶段耗时之和（即顺序执行的耗时）。
+"""
+
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from config import TARGET_FILE, BACKUP_STORE_DIR, SYSTEM_BACKUP_DIR
+from utils import format_file_size
+from artifact_cache import process_icon_cached
+from backup_store import store_file
+from ico_optimizer import optimize_ico_file
+from system_ops import backup_system_file, build_patched_dll, create_replace_script, create_restore_point
+from tracing import span
+
+# func(inputs, report): inputs 为 {依赖阶段名: 结果}，report(完成比例, 说明文字) 报告阶段内进度
+# optional 阶段失败时结果为None并记录错误，不中断整个流程
+Stage = namedtuple('Stage', 'name func deps weight optional')
+
+
+def stage(name, func, deps=(), weight=1.0, optional=False):
+    """创建阶段"""
+    return Stage(name, func, tuple(deps), weight, optional)
+
+
+class PipelineProgress:
+    """按阶段权重把各阶段的进度合并为总体进度"""
+
+    def __init__(self, stages, report=None):
+        self.weights = {s.name: s.weight for s in stages}
+        self.total = sum(self.weights.values()) or 1.0
+        self.fractions = dict.fromkeys(self.weights, 0.0)
+        self.report = report
+
+    def update(self, name, fraction, text=''):
+        self.fractions[name] = min(max(fraction, 0.0), 1.0)
+        if self.report:
+            done = sum(self.weights[n] * f for n, f in self.fractions.items())
+            self.report(done / self.total, text)
+
+    def reporter(self, name):
+        """返回某个阶段专用的进度函数"""
+        return lambda fraction, text='': self.update(name, fraction, text)
+
+
+def _check_graph(stages):
+    """检查阶段名唯一、依赖存在且无环"""
+    names = [s.name for s in stages]
+    if len(set(names)) != len(names):
+        raise ValueError("阶段名重复")
+    known = set(names)
+    for s in stages:
+        missing = [d for d in s.deps if d not in known]
+        if missing:
+            raise ValueError(f"阶段 {s.name} 依赖不存在的阶段: {', '.join(missing)}")
+    resolved = set()
+    remaining = list(stages)
+    while remaining:
+        ready = [s for s in remaining if all(d in resolved for d in s.deps)]
+        if not ready:
+            raise ValueError(f"阶段存在循环依赖: {', '.join(s.name for s in remaining)}")
+        resolved.update(s.name for s in ready)
+        remaining = [s for s in remaining if s.name not in resolved]
+
+
+def _run_stage(item, inputs, report):
+    """执行单个阶段，返回 (结果, 开始时间, 结束时间, 错误)"""
+    started = time.perf_counter()
+    try:
+        with span(f'stage:{item.name}', cat='pipeline'):
+            value = item.func(inputs, report)
+        error = None
+    except Exception as e:
+        if not item.optional:
+            raise
+        value, error = None, e
+    return value, started, time.perf_counter(), error
+
+
+def run_pipeline(stages, max_workers=None, progress=None, check=None):
+    """执行依赖图，返回 (各阶段结果, 报告)
+
+    progress(总体完成比例, 说明文字) 报告进度；check() 在等待期间周期调用，抛出异常即中止流程
+    （已在运行的阶段会在后台自然结束）。必需阶段失败时抛出该阶段的原始异常。
+    """
+    stages = list(stages)
+    _check_graph(stages)
+    tracker = PipelineProgress(stages, progress)
+    pending = {s.name: s for s in stages}
+    running = {}
+    results = {}
+    timings = {}
+    errors = {}
+
+    started = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=max_workers or len(stages) or 1)
+    try:
+        while pending or running:
+            for name, item in list(pending.items()):
+                if all(d in results for d in item.deps):
+                    del pending[name]
+                    inputs = {d: results[d] for d in item.deps}
+                    future = executor.submit(_run_stage, item, inputs, tracker.reporter(name))
+                    running[future] = item
+
+            done, _ = wait(running, timeout=0.1, return_when=FIRST_COMPLETED)
+            if check:
+                check()
+            for future in done:
+                item = running.pop(future)
+                value, begin, end, error = future.result()
+                results[item.name] = value
+                timings[item.name] = (begin - started, end - started)
+                if error is not None:
+                    errors[item.name] = str(error)
+                tracker.update(item.name, 1.0)
+    finally:
+        # 正常结束时所有阶段都已完成；出错或中止时不等待仍在运行的阶段
+        executor.shutdown(wait=not running, cancel_futures=True)
+
+    wall = time.perf_counter() - started
+    report = {
+        "wall_seconds": wall,
+        "sequential_seconds": sum(end - begin for begin, end in timings.values()),
+        "stages": timings,
+        "errors": errors,
+    }
+    return results, report
+
+
+def format_report(report):
+    """把运行报告格式化为文本"""
+    lines = [f"{'阶段':<16}{'开始(s)':>10}{'结束(s)':>10}{'耗时(s)':>10}"]
+    for name, (begin, end) in sorted(report["stages"].items(), key=lambda item: item[1][0]):
+        note = f"  失败: {report['errors'][name]}" if name in report["errors"] else ''
+        lines.append(f"{name:<16}{begin:>10.3f}{end:>10.3f}{end - begin:>10.3f}{note}")
+    wall, sequential = report["wall_seconds"], report["sequential_seconds"]
+    lines.append(f"总耗时 {wall:.3f}s，顺序执行约 {sequential:.3f}s，"
+                 f"节省 {max(sequential - wall, 0):.3f}s（{sequential / wall if wall else 1:.2f}x）")
+    return '\n'.join(lines)
+
+
+def _copy_progress(report, text):
+    """把字节进度转换为阶段进度"""
+    def callback(done, total):
+        report(done / total if total else 1.0, f'{text}... {format_file_size(done)} / {format_file_size(total)}')
+    return callback
+
+
+def build_replace_stages(source_path, output_dir, target_path=TARGET_FILE, session=None,
+                         store_dir=BACKUP_STORE_DIR, restore_point=True, encode_icon=None, helper=None,
+                         optimize=False):
+    """构建替换流程的依赖图
+
+    encode_icon(source_path, output_dir) 返回 (ico, png)，用于把图标编码交给图片处理进程，默认在本进程中处理。
+    helper 为 PrivilegedHelper 时，备份系统文件和创建还原点在管理员助手进程中执行，默认在本进程中执行。
+    encode（图标编码）、backup（备份系统文件）、restore_point（创建还原点）互不依赖，同时开始；
+    optimize=True 时加入 optimize 阶段：依赖 encode，把缩小后的ICO写入 output_dir，结果为 (ICO路径, 优化报告)，
+    失败时沿用原ICO；store 依赖 backup，patch 依赖 encode（和 optimize）及 backup，script 在其他阶段全部完成后生成。
+    """
+    def encode(inputs, report):
+        report(0.0, '正在处理图标...')
+        if encode_icon is not None:
+            return encode_icon(source_path, output_dir)
+        # 替换流程只需要ICO，预览直接使用内存中的图标，不再写出PNG
+        return process_icon_cached(source_path, output_dir, session=session, save_png=False)
+
+    def optimize_icon(inputs, report):
+        report(0.0, '正在优化图标体积...')
+        ico_path, _ = inputs['encode']
+        # 写入另一个文件，优化失败时原ICO保持完整
+        root, ext = os.path.splitext(ico_path)
+        optimized_path = f'{root}_optimized{ext}'
+        return optimized_path, optimize_ico_file(ico_path, optimized_path)
+
+    def icon_path(inputs):
+        """优先使用优化后的ICO"""
+        if inputs.get('optimize'):
+            return inputs['optimize'][0]
+        return inputs['encode'][0]
+
+    def backup(inputs, report):
+        if helper is not None:
+            # 助手进程只把备份写入自己的目录，并记录其SHA-256作为之后写入和还原的依据
+            return helper.backup(target_path, SYSTEM_BACKUP_DIR, _copy_progress(report, '正在备份系统文件'))
+        return backup_system_file(target_path, output_dir, _copy_progress(report, '正在备份系统文件'))
+
+    def store(inputs, report):
+        manifest_path, _ = store_file(inputs['backup'], store_dir, name=os.path.basename(target_path),
+                                      progress_callback=_copy_progress(report, '正在存入备份仓库'))
+        return manifest_path
+
+    def make_restore_point(inputs, report):
+        report(0.0, '正在创建系统还原点...')
+        if helper is not None:
+            return helper.create_restore_point()
+        return create_restore_point()
+
+    def patch(inputs, report):
+        report(0.0, '正在生成新的系统文件...')
+        return build_patched_dll(icon_path(inputs), inputs['backup'], output_dir)
+
+    def script(inputs, report):
+        report(0.0, '正在创建替换脚本...')
+        return create_replace_script(icon_path(inputs), inputs['backup'], target_path, output_dir, inputs['patch'])
+
+    icon_deps = ['encode', 'optimize'] if optimize else ['encode']
+    stages = [stage('encode', encode, weight=1.0)]
+    if optimize:
+        stages.append(stage('optimize', optimize_icon, ['encode'], weight=0.5, optional=True))
+    stages += [
+        stage('backup', backup, weight=3.0),
+        stage('store', store, ['backup'], weight=2.0, optional=True),
+        stage('patch', patch, icon_deps + ['backup'], weight=1.0, optional=True),
+    ]
+    script_deps = icon_deps + ['backup', 'store', 'patch']
+    if restore_point:
+        stages.append(stage('restore_point', make_restore_point, weight=2.0))
+        script_deps.append('restore_point')
+    stages.append(stage('script', script, script_deps, weight=0.5))
+    return stages
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+RGBA缓冲区模块 - PIL图片与QImage共享同一块像素内存
+
+处理后的图标以缓冲区的形式在进程内传递，预览直接从缓冲区构造QImage，
+不再经过 PNG 编码、写入磁盘和重新解码。
+"""
+
+from PIL import Image
+
+
+class RGBABuffer:
+    """按行紧密排列的RGBA像素缓冲区
+
+    image 是直接映射在 data 上的PIL图片，对它的 paste/putalpha 等原地操作会直接写入缓冲区；
+    qimage() 返回引用同一块内存的QImage，不复制像素。
+    """
+
+    def __init__(self, size, data=None):
+        self.size = (int(size[0]), int(size[1]))
+        nbytes = self.size[0] * self.size[1] * 4
+        self.data = bytearray(nbytes) if data is None else data
+        if len(memoryview(self.data).cast('B')) != nbytes:
+            raise ValueError(f"缓冲区大小与图片尺寸 {self.size[0]}x{self.size[1]} 不符")
+        self.image = Image.frombuffer('RGBA', self.size, self.data, 'raw', 'RGBA', 0, 1)
+        # frombuffer 得到的图片默认只读，写入前会先复制；清除标记使写操作落在共享内存上
+        self.image.readonly = 0
+        self._qimage = None
+
+    @classmethod
+    def from_image(cls, image):
+        """把PIL图片复制到新的缓冲区"""
+        buffer = cls(image.size)
+        buffer.image.paste(image if image.mode == 'RGBA' else image.convert('RGBA'), (0, 0))
+        return buffer
+
+    @property
+    def width(self):
+        return self.size[0]
+
+    @property
+    def height(self):
+        return self.size[1]
+
+    def qimage(self):
+        """返回引用同一块内存的QImage（缓冲区需比QImage存活更久，由本对象持有）"""
+        if self._qimage is None:
+            from PyQt5.QtGui import QImage
+
+            self._qimage = QImage(self.data, self.width, self.height, self.width * 4, QImage.Format_RGBA8888)
+        return self._qimage
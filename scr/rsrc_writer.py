@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+资源节重建模块 - 不依赖Resource Hacker，直接替换PE文件中的图标组
+
+读取原文件的资源树，用新ICO替换指定的 RT_GROUP_ICON 及其 RT_ICON，
+重新布局 .rsrc 节并修正节大小、后续节的文件偏移/虚拟地址和数据目录，
+最后按节流式写出新的DLL，原文件内容只通过内存映射切片读取。
+
+新图标的每个条目都能放进原有数据项时走快速路径：复制文件后只改写这些字节范围，
+耗时只与图标大小有关。
+"""
+
+import mmap
+import os
+import shutil
+import struct
+
+from config import ICON_RESOURCE_ID
+from pe_resources import (PEImage, RT_ICON, RT_GROUP_ICON, DATA_DIRECTORY,
+                          read_icon_group,
+                          IMAGE_DIRECTORY_ENTRY_RESOURCE, IMAGE_DIRECTORY_ENTRY_SECURITY,
+                          OPTIONAL_SIZE_OF_IMAGE_OFFSET, OPTIONAL_CHECKSUM_OFFSET,
+                          parse_ico, parse_group_icon, build_group_icon, layout_resource_tree)
+
+IMAGE_SCN_MEM_DISCARDABLE = 0x02000000
+OPTIONAL_SIZE_OF_INITIALIZED_DATA_OFFSET = 8
+COPY_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def _align(value, alignment):
+    return (value + alignment - 1) // alignment * alignment
+
+
+def load_resource_tree(pe):
+    """将PE中的资源树转换为布局用的 {类型: {名称: {语言: (数据切片, 代码页)}}}"""
+    tree = {}
+    for type_key, names in pe.resources().items():
+        tree[type_key] = {}
+        for name_key, languages in names.items():
+            tree[type_key][name_key] = {
+                lang: (pe.resource_bytes(data), data.codepage)
+                for lang, data in languages.items()
+            }
+    return tree
+
+
+def replace_group_in_tree(tree, ico_entries, group_id=ICON_RESOURCE_ID, lang=None):
+    """在资源树中用新的图标条目替换图标组，返回使用的语言和新图标ID列表
+
+    只删除仅被该图标组引用的旧 RT_ICON，释放的ID优先复用。
+    """
+    groups = tree.setdefault(RT_GROUP_ICON, {})
+    icons = tree.setdefault(RT_ICON, {})
+    if group_id not in groups:
+        raise KeyError(f"未找到图标组: {group_id}")
+    languages = groups[group_id]
+    if lang is None or lang not in languages:
+        lang = sorted(languages, key=str)[0]
+
+    old_ids = [entry[-1] for entry in parse_group_icon(languages[lang][0])]
+
+    # 其他图标组仍在引用的图标必须保留
+    shared = set()
+    for other_id, other_languages in groups.items():
+        for other_lang, (data, _) in other_languages.items():
+            if other_id == group_id and other_lang == lang:
+                continue
+            shared.update(entry[-1] for entry in parse_group_icon(data))
+
+    freed = []
+    for icon_id in old_ids:
+        if icon_id in shared or icon_id not in icons:
+            continue
+        icons[icon_id].pop(lang, None)
+        if not icons[icon_id]:
+            del icons[icon_id]
+            freed.append(icon_id)
+
+    new_ids = []
+    next_id = max([k for k in icons if isinstance(k, int)] + [0]) + 1
+    for entry in ico_entries:
+        if freed:
+            icon_id = freed.pop(0)
+        else:
+            while next_id in icons or next_id in new_ids:
+                next_id += 1
+            icon_id = next_id
+            next_id += 1
+        if icon_id > 0xFFFF:
+            raise ValueError("图标资源ID已用尽")
+        icons.setdefault(icon_id, {})[lang] = (entry.data, 0)
+        new_ids.append(icon_id)
+
+    languages[lang] = (build_group_icon(ico_entries, new_ids), languages[lang][1])
+    return lang, new_ids
+
+
+def _copy_range(view, start, end, output):
+    """按块把映射中的一段数据写到输出文件"""
+    while start < end:
+        stop = min(end, start + COPY_CHUNK_SIZE)
+        output.write(view[start:stop])
+        start = stop
+
+
+def _write_padding(output, size):
+    """写出指定长度的零填充"""
+    while size > 0:
+        piece = min(size, COPY_CHUNK_SIZE)
+        output.write(bytes(piece))
+        size -= piece
+
+
+def plan_layout(pe, rsrc_section, new_size):
+    """计算重建后的节表
+
+    返回 ({节索引: (虚拟地址, 虚拟大小, 文件偏移, 文件大小)}, 虚拟地址偏移量, 文件偏移量, 后续节索引)。
+    """
+    ordered = sorted(range(len(pe.sections)), key=lambda i: pe.sections[i].virtual_address)
+    file_ordered = sorted((i for i in ordered if pe.sections[i].raw_size),
+                          key=lambda i: pe.sections[i].raw_offset)
+    if [i for i in ordered if pe.sections[i].raw_size] != file_ordered:
+        raise ValueError("节在文件中的顺序与虚拟地址顺序不一致，无法重建资源节")
+
+    rsrc_index = pe.sections.index(rsrc_section)
+    position = ordered.index(rsrc_index)
+    following = ordered[position + 1:]
+
+    new_raw_size = _align(new_size, pe.file_alignment)
+    raw_delta = new_raw_size - rsrc_section.raw_size
+
+    va_delta = 0
+    if following:
+        available = pe.sections[following[0]].virtual_address - rsrc_section.virtual_address
+        needed = _align(new_size, pe.section_alignment)
+        if needed > available:
+            # 只有可丢弃的节（如 .reloc）只通过数据目录引用，可以整体后移
+            for i in following:
+                if not pe.sections[i].characteristics & IMAGE_SCN_MEM_DISCARDABLE:
+                    raise ValueError(f"资源节之后存在不可移动的节: {pe.sections[i].name}")
+            va_delta = needed - available
+
+    layout = {}
+    for i, section in enumerate(pe.sections):
+        if i == rsrc_index:
+            layout[i] = (section.virtual_address, new_size, section.raw_offset, new_raw_size)
+        elif i in following:
+            raw_offset = section.raw_offset + raw_delta if section.raw_size else section.raw_offset
+            layout[i] = (section.virtual_address + va_delta, section.virtual_size, raw_offset, section.raw_size)
+        else:
+            layout[i] = (section.virtual_address, section.virtual_size, section.raw_offset, section.raw_size)
+    return layout, va_delta, raw_delta, following
+
+
+def rebuild_resource_section(pe, tree, output_path):
+    """按新的资源树重建资源节并流式写出完整的PE文件"""
+    rsrc_rva, _ = pe.data_directory(IMAGE_DIRECTORY_ENTRY_RESOURCE)
+    rsrc_section = pe.resource_section()
+    if rsrc_section is None or rsrc_section.virtual_address != rsrc_rva:
+        raise ValueError("资源目录不在资源节起始位置，无法重建资源节")
+
+    header, blobs, new_size = layout_resource_tree(tree, rsrc_section.virtual_address)
+    layout, va_delta, raw_delta, following = plan_layout(pe, rsrc_section, new_size)
+
+    # 更新头部：节表、数据目录、映像大小、初始化数据大小，校验和清零（由后续步骤重新计算）
+    head = bytearray(pe.view[:pe.size_of_headers])
+    for i, section in enumerate(pe.sections):
+        virtual_address, virtual_size, raw_offset, raw_size = layout[i]
+        struct.pack_into('<IIII', head, section.header_offset + 8,
+                         virtual_size, virtual_address, raw_size, raw_offset)
+
+    moved_ranges = [(pe.sections[i].virtual_address,
+                     pe.sections[i].virtual_address + max(pe.sections[i].virtual_size, pe.sections[i].raw_size))
+                    for i in following]
+    certificate_offset = None
+    for index, (rva, size) in enumerate(pe.data_directories):
+        entry_offset = pe.data_directory_offset + index * DATA_DIRECTORY.size
+        if index == IMAGE_DIRECTORY_ENTRY_RESOURCE:
+            DATA_DIRECTORY.pack_into(head, entry_offset, rva, new_size)
+        elif index == IMAGE_DIRECTORY_ENTRY_SECURITY:
+            # 证书表使用文件偏移；修改后签名必然失效，直接移除
+            if rva and size:
+                certificate_offset = rva
+            DATA_DIRECTORY.pack_into(head, entry_offset, 0, 0)
+        elif va_delta and rva and any(start <= rva < end for start, end in moved_ranges):
+            DATA_DIRECTORY.pack_into(head, entry_offset, rva + va_delta, size)
+
+    size_of_image = max(_align(va + vsize, pe.section_alignment) for va, vsize, _, _ in layout.values())
+    struct.pack_into('<I', head, pe.optional_offset + OPTIONAL_SIZE_OF_IMAGE_OFFSET, size_of_image)
+    initialized_offset = pe.optional_offset + OPTIONAL_SIZE_OF_INITIALIZED_DATA_OFFSET
+    initialized = struct.unpack_from('<I', head, initialized_offset)[0]
+    struct.pack_into('<I', head, initialized_offset, max(0, initialized + raw_delta) & 0xFFFFFFFF)
+    struct.pack_into('<I', head, pe.optional_offset + OPTIONAL_CHECKSUM_OFFSET, 0)
+
+    # 按文件顺序流式写出
+    file_sections = sorted((s for s in pe.sections if s.raw_size), key=lambda s: s.raw_offset)
+    source_end = max(s.raw_offset + s.raw_size for s in file_sections) if file_sections else pe.size_of_headers
+    overlay_end = pe.size
+    if certificate_offset is not None and certificate_offset >= source_end:
+        overlay_end = certificate_offset
+
+    try:
+        with open(output_path, 'wb') as output:
+            output.write(head)
+            position = pe.size_of_headers
+            for section in file_sections:
+                # 保留节之间原有的间隙数据
+                _copy_range(pe.view, position, section.raw_offset, output)
+                if section is rsrc_section:
+                    output.write(header)
+                    written = len(header)
+                    for blob_offset, data in blobs:
+                        _write_padding(output, blob_offset - written)
+                        output.write(data)
+                        written = blob_offset + len(data)
+                    _write_padding(output, layout[pe.sections.index(section)][3] - written)
+                else:
+                    _copy_range(pe.view, section.raw_offset, section.raw_offset + section.raw_size, output)
+                position = section.raw_offset + section.raw_size
+            _copy_range(pe.view, position, overlay_end, output)
+    except Exception:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+    return output_path
+
+
+def plan_inplace_patch(pe, ico_entries, group_id=ICON_RESOURCE_ID, lang=None):
+    """检查新图标能否原位写入现有的 RT_ICON 数据项
+
+    能写入时返回 [(数据项描述偏移, 数据文件偏移, 原容量, 新数据)] 和新的组数据，否则返回None。
+    """
+    resources = pe.resources()
+    lang, group_data, old_entries = read_icon_group(pe, group_id, lang)
+    if len(old_entries) != len(ico_entries):
+        return None
+
+    # 被其他图标组共用的图标不能原位改写
+    old_ids = {entry.icon_id for entry in old_entries}
+    for other_id, languages in resources.get(RT_GROUP_ICON, {}).items():
+        for other_lang, data in languages.items():
+            if other_id == group_id and other_lang == lang:
+                continue
+            if old_ids & {entry[-1] for entry in parse_group_icon(pe.resource_bytes(data))}:
+                return None
+
+    icons = resources.get(RT_ICON, {})
+    slots = [icons.get(entry.icon_id, {}).get(lang) for entry in old_entries]
+    for entry in old_entries:
+        entry.data.release()
+    if None in slots:
+        return None
+
+    # 大图标优先分配到容量最大的数据项
+    order_new = sorted(range(len(ico_entries)), key=lambda i: len(ico_entries[i].data), reverse=True)
+    order_slot = sorted(range(len(slots)), key=lambda i: slots[i].size, reverse=True)
+    writes = []
+    icon_ids = [None] * len(ico_entries)
+    for new_index, slot_index in zip(order_new, order_slot):
+        slot = slots[slot_index]
+        data = ico_entries[new_index].data
+        if len(data) > slot.size:
+            return None
+        writes.append((slot.entry_offset, slot.offset, slot.size, data))
+        icon_ids[new_index] = old_entries[slot_index].icon_id
+
+    new_group = build_group_icon(ico_entries, icon_ids)
+    if len(new_group) != group_data.size:
+        return None
+    writes.append((group_data.entry_offset, group_data.offset, group_data.size, new_group))
+    return writes
+
+
+def apply_inplace_patch(source_path, output_path, writes, checksum_offset, security_entry_offset):
+    """复制源文件后通过内存映射只改写图标数据范围和数据项大小"""
+    shutil.copyfile(source_path, output_path)
+    try:
+        with open(output_path, 'r+b') as f:
+            with mmap.mmap(f.fileno(), 0) as mm:
+                for entry_offset, data_offset, capacity, data in writes:
+                    mm[data_offset:data_offset + len(data)] = data
+                    # 清零剩余部分，避免残留旧图标数据
+                    mm[data_offset + len(data):data_offset + capacity] = bytes(capacity - len(data))
+                    struct.pack_into('<I', mm, entry_offset + 4, len(data))
+                # 签名必然失效，校验和由后续步骤重新计算
+                DATA_DIRECTORY.pack_into(mm, security_entry_offset, 0, 0)
+                struct.pack_into('<I', mm, checksum_offset, 0)
+                mm.flush()
+    except Exception:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+    return output_path
+
+
+def patch_icon_group(source_path, ico_path, output_path, group_id=ICON_RESOURCE_ID, lang=None):
+    """替换图标组：能原位写入时只改写图标字节，否则重建整个资源节
+
+    返回使用的方式: 'inplace' 或 'rebuild'。
+    """
+    try:
+        with open(ico_path, 'rb') as f:
+            ico_entries = parse_ico(f.read())
+        with PEImage(source_path) as pe:
+            writes = plan_inplace_patch(pe, ico_entries, group_id, lang)
+            checksum_offset = pe.checksum_offset
+            security_entry_offset = pe.data_directory_offset + IMAGE_DIRECTORY_ENTRY_SECURITY * DATA_DIRECTORY.size
+        if writes is not None:
+            apply_inplace_patch(source_path, output_path, writes, checksum_offset, security_entry_offset)
+            return 'inplace'
+    except FileNotFoundError as e:
+        raise FileNotFoundError(f"文件不存在: {str(e)}")
+    except KeyError as e:
+        raise ValueError(f"资源不存在: {str(e)}")
+
+    replace_icon_group(source_path, ico_path, output_path, group_id, lang)
+    return 'rebuild'
+
+
+def replace_icon_group(source_path, ico_path, output_path, group_id=ICON_RESOURCE_ID, lang=None):
+    """用ICO文件替换PE文件中的图标组，结果写入新文件"""
+    try:
+        with open(ico_path, 'rb') as f:
+            ico_entries = parse_ico(f.read())
+        with PEImage(source_path) as pe:
+            tree = load_resource_tree(pe)
+            replace_group_in_tree(tree, ico_entries, group_id, lang)
+            rebuild_resource_section(pe, tree, output_path)
+            del tree
+        return output_path
+    except FileNotFoundError as e:
+        raise FileNotFoundError(f"文件不存在: {str(e)}")
+    except KeyError as e:
+        raise ValueError(f"资源不存在: {str(e)}")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+形状蒙版模块 - 基于有符号距离场生成抗锯齿蒙版，并按 (形状, 尺寸, 参数) 缓存
+"""
+
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+from config import MASK_SHAPE, MASK_SHAPE_PARAMS, MASK_CACHE_SIZE
+
+
+def _pixel_grid(size):
+    """返回以图像中心为原点的像素中心坐标（可广播的行、列向量）"""
+    width, height = size
+    x = np.arange(width, dtype=np.float32) + 0.5 - width / 2.0
+    y = np.arange(height, dtype=np.float32) + 0.5 - height / 2.0
+    return x[np.newaxis, :], y[:, np.newaxis]
+
+
+def _sdf_circle(x, y, half_w, half_h):
+    """圆形（非正方形尺寸时为椭圆）的近似距离场"""
+    scale = min(half_w, half_h)
+    return (np.sqrt((x / half_w) ** 2 + (y / half_h) ** 2) - 1.0) * scale
+
+
+def _sdf_rounded_rect(x, y, half_w, half_h, radius):
+    """圆角矩形距离场，radius为圆角半径占短边一半的比例"""
+    r = max(0.0, min(1.0, radius)) * min(half_w, half_h)
+    qx = np.abs(x) - (half_w - r)
+    qy = np.abs(y) - (half_h - r)
+    outside = np.sqrt(np.maximum(qx, 0.0) ** 2 + np.maximum(qy, 0.0) ** 2)
+    inside = np.minimum(np.maximum(qx, qy), 0.0)
+    return outside + inside - r
+
+
+def _sdf_squircle(x, y, half_w, half_h, exponent):
+    """超椭圆距离场（以归一化p范数近似）"""
+    n = max(2.0, float(exponent))
+    scale = min(half_w, half_h)
+    norm = (np.abs(x / half_w) ** n + np.abs(y / half_h) ** n) ** (1.0 / n)
+    return (norm - 1.0) * scale
+
+
+def _sdf_ring(x, y, half_w, half_h, thickness):
+    """圆环距离场，thickness为环宽占半径的比例"""
+    width = max(0.0, min(1.0, thickness)) * min(half_w, half_h)
+    circle = _sdf_circle(x, y, half_w, half_h)
+    return np.abs(circle + width / 2.0) - width / 2.0
+
+
+_SDF_FUNCTIONS = {
+    'circle': _sdf_circle,
+    'rounded_rect': _sdf_rounded_rect,
+    'squircle': _sdf_squircle,
+    'ring': _sdf_ring,
+}
+
+SHAPES = tuple(_SDF_FUNCTIONS)
+
+
+@lru_cache(maxsize=MASK_CACHE_SIZE)
+def _build_mask(shape, size, params):
+    """根据距离场生成抗锯齿蒙版（结果被缓存，调用方不得修改）"""
+    x, y = _pixel_grid(size)
+    distance = _SDF_FUNCTIONS[shape](x, y, size[0] / 2.0, size[1] / 2.0, **dict(params))
+    # 像素中心距离边界半个像素以内按距离线性过渡，得到覆盖率
+    coverage = np.clip(0.5 - distance, 0.0, 1.0)
+    return Image.fromarray(np.rint(coverage * 255).astype(np.uint8), 'L')
+
+
+def get_mask(shape=MASK_SHAPE, size=(256, 256), **params):
+    """获取指定形状和尺寸的蒙版，未给出的参数使用配置中的默认值"""
+    if shape not in _SDF_FUNCTIONS:
+        raise ValueError(f"不支持的蒙版形状: {shape}，可选: {', '.join(SHAPES)}")
+    merged = dict(MASK_SHAPE_PARAMS.get(shape, {}))
+    merged.update(params)
+    return _build_mask(shape, (int(size[0]), int(size[1])), tuple(sorted(merged.items())))
+
+
+def mask_cache_info():
+    """返回蒙版缓存命中统计"""
+    return _build_mask.cache_info()
+
+
+def clear_mask_cache():
+    """清空蒙版缓存"""
+    _build_mask.cache_clear()
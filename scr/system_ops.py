@@ -5,13 +5,24 @@
 """
 
 import os
-import shutil
 import subprocess
-from config import TARGET_FILE, SYSTEM32_PATH
+from config import TARGET_FILE, SYSTEM32_PATH, ICON_RESOURCE_ID, RESTORE_POINT_TIMEOUT, ICON_CACHE_TIMEOUT
+from rsrc_writer import patch_icon_group
+from pe_resources import PEImage, extract_icon_group
+from pe_checksum import update_checksum, verify_checksum
+from file_copy import copy_file_hashed, sha256_file
+from tracing import traced
 
+MOVEFILE_DELAY_UNTIL_REBOOT = 0x4
 
-def backup_system_file(target_path, backup_dir):
-    """备份系统文件"""
+
+@traced()
+def backup_system_file(target_path, backup_dir, progress_callback=None):
+    """备份系统文件
+
+    复制时同时计算SHA-256并写入同名 .sha256 文件；
+    progress_callback(已复制字节数, 总字节数) 用于报告进度。
+    """
     try:
         if not os.path.exists(target_path):
             raise FileNotFoundError(f"目标文件不存在: {target_path}")
@@ -23,12 +34,15 @@ def backup_system_file(target_path, backup_dir):
         if not os.path.exists(backup_dir):
             os.makedirs(backup_dir, exist_ok=True)
         
-        # 尝试复制文件
-        shutil.copy2(target_path, backup_path)
+        # 单遍复制并计算哈希
+        copied, sha256 = copy_file_hashed(target_path, backup_path, progress_callback)
         
-        if not os.path.exists(backup_path):
+        if not os.path.exists(backup_path) or os.path.getsize(backup_path) != copied:
             raise Exception("备份文件创建失败")
         
+        with open(backup_path + '.sha256', 'w', encoding='utf-8') as f:
+            f.write(f"{sha256}  {backup_filename}\n")
+        
         return backup_path
         
     except PermissionError:
@@ -47,12 +61,197 @@ def backup_system_file(target_path, backup_dir):
         raise Exception(f"备份系统文件失败: {str(e)}")
 
 
-def create_replace_script(icon_path, backup_path, target_path, output_dir):
-    """创建替换脚本"""
+def read_backup_hash(backup_path):
+    """读取备份时记录的SHA-256，不存在时返回None"""
+    try:
+        with open(backup_path + '.sha256', 'r', encoding='utf-8') as f:
+            return f.read().split()[0]
+    except (OSError, IndexError):
+        return None
+
+
+@traced()
+def build_patched_dll(icon_path, source_path, output_dir, group_id=ICON_RESOURCE_ID):
+    """生成替换了启动图标的新系统文件（原文件不会被修改）
+
+    新图标能放进原有资源数据项时只原位改写图标字节，否则重建整个资源节。
+    """
+    try:
+        patched_path = os.path.join(output_dir, os.path.basename(TARGET_FILE) + '.new')
+        patch_icon_group(source_path, icon_path, patched_path, group_id)
+        
+        # 修改后重新计算校验和并验证
+        update_checksum(patched_path)
+        verify_modified_file(patched_path)
+        return patched_path
+        
+    except FileNotFoundError as e:
+        raise FileNotFoundError(f"生成新系统文件失败: {str(e)}")
+    except ValueError as e:
+        raise ValueError(f"系统文件资源结构不受支持: {str(e)}")
+    except Exception as e:
+        raise Exception(f"生成新系统文件失败: {str(e)}")
+
+
+def _take_ownership(target_path, timeout=ICON_CACHE_TIMEOUT):
+    """取得系统文件的所有权并授予管理员完全控制（仅Windows，与替换脚本相同）"""
+    if os.name != 'nt':
+        return
+    subprocess.run(["takeown", "/f", target_path], capture_output=True, timeout=timeout)
+    subprocess.run(["icacls", target_path, "/grant", "Administrators:F"], capture_output=True, timeout=timeout)
+
+
+def discard_old_file(old_path):
+    """删除替换下来的原文件，仍被占用时安排在重启时删除，返回是否要等到重启后才删除"""
+    try:
+        os.remove(old_path)
+        return False
+    except OSError:
+        if os.name != 'nt':
+            raise
+    import ctypes
+    if not ctypes.windll.kernel32.MoveFileExW(old_path, None, MOVEFILE_DELAY_UNTIL_REBOOT):
+        raise ctypes.WinError()
+    return True
+
+
+@traced()
+def replace_system_file(source_path, target_path):
+    """用新文件替换系统文件，返回 (等待重启后删除的原文件路径，已删除时为None, 新文件的SHA-256)
+
+    正在使用的DLL无法覆盖但可以改名：先把原文件改名为 .old，再复制新文件，复制失败时改回原文件；
+    成功后删除 .old，仍被占用（系统进程已加载原DLL）时用 MoveFileEx 安排在重启时删除。
+    """
+    try:
+        if not os.path.isfile(source_path):
+            raise FileNotFoundError(f"新文件不存在: {source_path}")
+        if not os.path.exists(target_path):
+            raise FileNotFoundError(f"目标文件不存在: {target_path}")
+        
+        _take_ownership(target_path)
+        old_path = target_path + '.old'
+        try:
+            if os.path.exists(old_path):
+                os.remove(old_path)
+        except OSError:
+            # 上一次替换留下的 .old 仍被占用时换一个名字
+            old_path = f"{target_path}.{os.getpid()}.old"
+        os.replace(target_path, old_path)
+        
+        try:
+            _, sha256 = copy_file_hashed(source_path, target_path)
+        except Exception:
+            if os.path.exists(target_path):
+                os.remove(target_path)
+            os.replace(old_path, target_path)
+            raise
+        try:
+            pending = discard_old_file(old_path)
+        except OSError:
+            # 新文件已经就位，原文件删不掉只是多占一些空间，下次替换时会再尝试
+            pending = True
+        return (old_path if pending else None), sha256
+        
+    except PermissionError:
+        raise PermissionError(f"无法替换系统文件（需要管理员权限）: {target_path}")
+    except FileNotFoundError as e:
+        raise FileNotFoundError(f"替换系统文件失败: {str(e)}")
+    except Exception as e:
+        raise Exception(f"替换系统文件失败: {str(e)}")
+
+
+@traced()
+def restore_system_file(backup_path, target_path):
+    """用备份还原系统文件（备份必须与备份时记录的SHA-256一致），返回值同 replace_system_file"""
+    expected = read_backup_hash(backup_path)
+    if expected is None:
+        raise ValueError(f"备份缺少校验文件，拒绝还原: {backup_path}.sha256")
+    actual = sha256_file(backup_path)
+    if actual != expected:
+        raise ValueError(f"备份文件已损坏或被修改（SHA-256 不一致）: {backup_path}")
+    return replace_system_file(backup_path, target_path)
+
+
+def verify_icon_only_change(candidate_path, base_path, work_dir, group_id=ICON_RESOURCE_ID):
+    """确认新系统文件与原文件相比只替换了图标组及其图标，否则抛出 PermissionError
+
+    从新文件中取出图标组，按生成新系统文件的相同步骤在 work_dir 中用原文件重新生成一份，
+    两者的SHA-256必须一致（生成过程是确定的，任何其他改动都会导致不一致）。
+    """
+    ico_path = os.path.join(work_dir, f'verify_{os.getpid()}.ico')
+    expected_path = os.path.join(work_dir, f'verify_{os.getpid()}.dll')
+    try:
+        try:
+            with PEImage(candidate_path):
+                pass
+            ico = extract_icon_group(candidate_path, group_id)
+        except (ValueError, KeyError) as e:
+            raise PermissionError(f"新文件不是有效的系统文件: {str(e)}")
+        with open(ico_path, 'wb') as f:
+            f.write(ico)
+        patch_icon_group(base_path, ico_path, expected_path, group_id)
+        update_checksum(expected_path)
+        if sha256_file(expected_path) != sha256_file(candidate_path):
+            raise PermissionError("新文件除启动图标外还有其他改动，拒绝写入")
+    finally:
+        for path in (ico_path, expected_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def verify_modified_file(file_path):
+    """验证修改后的系统文件：PE校验和必须与内容一致"""
+    ok, stored, computed = verify_checksum(file_path)
+    if not ok:
+        raise ValueError(f"PE校验和不一致: 记录值 {stored:#010x}，实际值 {computed:#010x}\n文件: {file_path}")
+    return True
+
+
+@traced()
+def create_replace_script(icon_path, backup_path, target_path, output_dir, patched_path=None):
+    """创建替换脚本（提供新系统文件时自动替换，否则给出手动步骤）"""
     try:
         script_path = os.path.join(output_dir, 'replace_icon.bat')
         
-        script_content = f'''
+        if patched_path:
+            script_content = f'''
+@echo off
+echo Windows开机图标替换脚本
+echo ===================================
+echo.
+echo 此脚本需要以管理员身份运行！
+echo.
+
+REM 取得文件所有权
+echo 正在取得文件所有权...
+takeown /f "{target_path}" >nul 2>&1
+icacls "{target_path}" /grant Administrators:F >nul 2>&1
+
+echo.
+echo 正在备份原文件...
+copy "{target_path}" "{backup_path}" /y >nul 2>&1
+
+REM 正在使用的DLL无法覆盖但可以重命名，先移走原文件再复制新文件
+echo.
+echo 正在替换系统文件...
+move /y "{target_path}" "{target_path}.old" >nul 2>&1
+copy /y "{patched_path}" "{target_path}" >nul 2>&1
+if errorlevel 1 (
+    echo 替换失败，正在恢复原文件...
+    move /y "{target_path}.old" "{target_path}" >nul 2>&1
+) else (
+    echo 替换成功！
+    REM 原文件仍被系统进程占用时删不掉，保留到下次替换或手动删除
+    del /f /q "{target_path}.old" >nul 2>&1
+    ie4uinit.exe -show >nul 2>&1
+)
+
+echo.
+echo 操作完成！可能需要重启电脑才能生效。
+pause
+'''
+        else:
+            script_content = f'''
 @echo off
 echo Windows开机图标替换脚本
 echo ===================================
@@ -136,22 +335,24 @@ def get_system_info():
         return f"获取系统信息失败: {str(e)}"
 
 
-def clear_icon_cache():
+def clear_icon_cache(timeout=ICON_CACHE_TIMEOUT):
     """清除图标缓存"""
     try:
         # 使用ie4uinit.exe清除图标缓存
-        subprocess.run(["ie4uinit.exe", "-show"], capture_output=True, check=True)
+        subprocess.run(["ie4uinit.exe", "-show"], capture_output=True, check=True, timeout=timeout)
         return True
     except Exception as e:
         return False
 
 
-def create_restore_point(description="图标替换前备份"):
-    """创建系统还原点"""
+@traced()
+def create_restore_point(description="图标替换前备份", timeout=RESTORE_POINT_TIMEOUT):
+    """创建系统还原点（超时或失败时返回False）"""
     try:
         # 使用wmic创建系统还原点
+        # 不经过shell：超时后直接结束wmic本身。Windows上命令行原样传给wmic，其他系统（替身程序）按空格拆分
         cmd = f"wmic.exe /Namespace:\\\\root\\default Path SystemRestore Call CreateRestorePoint \"{description}\", 100, 7"
-        subprocess.run(cmd, shell=True, capture_output=True, check=True)
+        subprocess.run(cmd if os.name == 'nt' else cmd.split(), capture_output=True, check=True, timeout=timeout)
         return True
     except Exception as e:
         return False
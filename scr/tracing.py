@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+追踪模块 - 记录各阶段的耗时区间，导出为 Chrome trace-event JSON 和汇总表
+
+设置环境变量 ICON_REPLACER_TRACE=<输出文件> 或在命令行传入 --trace <输出文件> 即可启用：
+- 未启用时 span() 只做一次布尔判断并返回共享的空对象，几乎没有开销；
+- 启用后子进程（图片处理进程、批处理进程）继承环境变量，各自写入 <输出文件名>.<pid>.json；
+- 进程退出时写出追踪文件，主进程另在标准错误输出汇总表；
+- add_listener() 注册的监听器在每个区间开始和结束时调用，未启用追踪时也生效（memory_profile.py 用它按阶段采样内存）。
+生成的文件可以在 chrome://tracing 或 https://ui.perfetto.dev 中打开。
+
+用法:
+    python tracing.py trace.json trace.*.json            # 汇总多个追踪文件
+    python tracing.py trace.json trace.*.json --merge all.json
+"""
+
+import atexit
+import functools
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+from multiprocessing.util import Finalize, register_after_fork
+
+from config import TRACE_ENV_VAR, TRACE_OWNER_ENV_VAR
+
+_enabled = False
+_path = None
+_saved = False
+_events = []
+_thread_names = {}
+_listeners = []
+
+
+class _NullSpan:
+    """未启用追踪时使用的空区间"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """一个耗时区间，退出时记录（抛出异常时在参数中记下异常类型）"""
+    __slots__ = ('name', 'cat', 'args', 'start')
+
+    def __init__(self, name, cat, args):
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        for listener in _listeners:
+            listener(self, True)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        for listener in _listeners:
+            listener(self, False)
+        if not _enabled:
+            return False
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        thread = threading.current_thread()
+        _thread_names[thread.ident] = thread.name
+        # list.append 在GIL下是原子的，多线程记录无需加锁
+        _events.append((self.name, self.cat, self.start, end - self.start, thread.ident, self.args))
+        return False
+
+    def set(self, **args):
+        """补充区间参数（如处理后才知道的大小）"""
+        self.args.update(args)
+
+
+def span(name, cat='app', **args):
+    """返回记录耗时区间的上下文管理器，args 会显示在追踪查看器中"""
+    if not _enabled and not _listeners:
+        return _NULL_SPAN
+    return _Span(name, cat, args)
+
+
+def traced(name=None, cat='app'):
+    """函数装饰器：每次调用记录一个区间（默认以函数名命名）"""
+    def decorator(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled and not _listeners:
+                return func(*args, **kwargs)
+            with _Span(label, cat, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def is_enabled():
+    return _enabled
+
+
+def add_listener(listener):
+    """注册区间监听器 listener(区间, 是否开始)，可能在多个线程中同时调用"""
+    _listeners.append(listener)
+
+
+def remove_listener(listener):
+    _listeners.remove(listener)
+
+
+def _child_path(path):
+    """子进程写入带pid后缀的文件，避免覆盖主进程的结果"""
+    root, ext = os.path.splitext(path)
+    return f'{root}.{os.getpid()}{ext or ".json"}'
+
+
+def enable(path):
+    """启用追踪，进程退出时写入path（同时设置环境变量，之后启动的子进程也会启用）"""
+    global _enabled, _path
+    path = os.path.abspath(path)
+    os.environ[TRACE_ENV_VAR] = path
+    if _enabled:
+        return
+    # 第一个启用追踪的进程是主进程，继承了环境变量的其他进程都写入各自的文件
+    owner = os.environ.setdefault(TRACE_OWNER_ENV_VAR, str(os.getpid()))
+    _enabled = True
+    _path = path if owner == str(os.getpid()) else _child_path(path)
+    atexit.register(_save_at_exit)
+
+
+def _after_fork(_=None):
+    """multiprocessing 子进程启动后调用：丢弃fork继承来的记录，退出时写出自己的文件"""
+    global _path, _saved
+    if not _enabled:
+        return
+    _events.clear()
+    _thread_names.clear()
+    _path, _saved = _child_path(os.environ[TRACE_ENV_VAR]), False
+    # multiprocessing 结束子进程时不一定执行atexit（fork启动时直接 os._exit），改用终结器
+    Finalize(None, _save_at_exit, exitpriority=0)
+
+
+def _save_at_exit():
+    global _saved
+    if _saved:
+        return
+    _saved = True
+    try:
+        save(_path)
+        if _path == os.environ.get(TRACE_ENV_VAR) and _events:
+            print(format_summary(summarize(export()["traceEvents"])), file=sys.stderr)
+            print(f"追踪已保存: {_path}", file=sys.stderr)
+    except Exception as e:
+        print(f"保存追踪失败: {str(e)}", file=sys.stderr)
+
+
+def export():
+    """把当前进程的记录导出为 Chrome trace-event 格式的字典（时间单位为微秒）"""
+    pid = os.getpid()
+    events = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+               "args": {"name": f"{multiprocessing.current_process().name} ({pid})"}}]
+    for tid, thread_name in list(_thread_names.items()):
+        events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread_name}})
+    for name, cat, start, duration, tid, args in list(_events):
+        events.append({"name": name, "cat": cat, "ph": "X", "ts": start / 1000, "dur": duration / 1000,
+                       "pid": pid, "tid": tid, "args": args})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def save(path):
+    """写出当前进程的追踪文件"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(export(), f, ensure_ascii=False, default=str)
+
+
+def load_events(paths):
+    """读取并合并多个追踪文件的事件"""
+    events = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            events.extend(json.load(f)["traceEvents"])
+    return events
+
+
+def summarize(events):
+    """按区间名称汇总，返回 [{name, count, total_ms, mean_ms, max_ms}]，按总耗时降序"""
+    rows = {}
+    for event in events:
+        if event.get("ph") != "X":
+            continue
+        row = rows.setdefault(event["name"], {"name": event["name"], "count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        duration = event["dur"] / 1000
+        row["count"] += 1
+        row["total_ms"] += duration
+        row["max_ms"] = max(row["max_ms"], duration)
+    for row in rows.values():
+        row["mean_ms"] = row["total_ms"] / row["count"]
+    return sorted(rows.values(), key=lambda row: row["total_ms"], reverse=True)
+
+
+def format_summary(rows):
+    """把汇总结果格式化为文本"""
+    lines = [f"{'区间':<32}{'次数':>8}{'总耗时(ms)':>14}{'平均(ms)':>12}{'最长(ms)':>12}"]
+    for row in rows:
+        lines.append(f"{row['name']:<32}{row['count']:>8}{row['total_ms']:>14.2f}"
+                     f"{row['mean_ms']:>12.2f}{row['max_ms']:>12.2f}")
+    return '\n'.join(lines)
+
+
+register_after_fork(_after_fork, _after_fork)
+
+if os.environ.get(TRACE_ENV_VAR):
+    enable(os.environ[TRACE_ENV_VAR])
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='汇总或合并追踪文件')
+    parser.add_argument('files', nargs='+', help='追踪文件（Chrome trace-event JSON）')
+    parser.add_argument('--merge', metavar='PATH', help='把所有文件的事件合并写入一个追踪文件')
+    args = parser.parse_args()
+
+    events = load_events(args.files)
+    print(format_summary(summarize(events)))
+    if args.merge:
+        with open(args.merge, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
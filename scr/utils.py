@@ -5,33 +5,18 @@
 """
 
 import sys
-import ctypes
 import tempfile
 import shutil
 import os
 from pathlib import Path
-from PyQt5.QtWidgets import QMessageBox, QApplication
 
+# PyQt5 仅在实际需要时导入，保证无界面批处理可在非Windows环境运行
 
-def is_admin():
-    """检查是否以管理员身份运行"""
-    try:
-        return ctypes.windll.shell32.IsUserAnAdmin()
-    except Exception as e:
-        print(f"检查管理员权限时出错: {e}")
-        return False
 
-
-def run_as_admin():
-    """尝试以管理员身份重新运行程序"""
-    try:
-        ctypes.windll.shell32.ShellExecuteW(
-            None, "runas", sys.executable, " ".join(sys.argv), None, 1
-        )
-        return True
-    except Exception as e:
-        print(f"以管理员身份重新运行失败: {e}")
-        return False
+def resource_path(*parts):
+    """返回随程序分发的资源文件路径（PyInstaller 打包后位于解压目录，否则位于项目根目录）"""
+    base = getattr(sys, '_MEIPASS', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    return os.path.normpath(os.path.join(base, *parts))
 
 
 def create_temp_dir(prefix=""):
@@ -55,8 +40,13 @@ def cleanup_temp_dir(temp_dir):
     return True
 
 
-def show_message(parent, title, message, message_type='information', details=None, buttons=QMessageBox.Ok):
+def show_message(parent, title, message, message_type='information', details=None, buttons=None):
     """显示消息框，支持详细信息和自定义按钮"""
+    from PyQt5.QtWidgets import QMessageBox
+    
+    if buttons is None:
+        buttons = QMessageBox.Ok
+    
     msg_box = QMessageBox(parent)
     msg_box.setWindowTitle(title)
     msg_box.setText(message)
@@ -88,6 +78,8 @@ def show_message(parent, title, message, message_type='information', details=Non
 
 def show_confirmation(parent, title, message):
     """显示确认对话框"""
+    from PyQt5.QtWidgets import QMessageBox
+    
     msg_box = QMessageBox(parent)
     msg_box.setWindowTitle(title)
     msg_box.setText(message)
@@ -114,13 +106,22 @@ def safe_copy(source, destination):
 def get_file_info(file_path):
     """获取文件信息"""
     try:
+        # 只读取文件头，探测模块不支持的格式才交给PIL
+        from image_probe import probe_image
+        probe = probe_image(file_path)
+        if probe is not None:
+            return {
+                "size": probe.size,
+                "format": probe.format,
+                "mode": probe.mode
+            }
         from PIL import Image
-        img = Image.open(file_path)
-        return {
-            "size": img.size,
-            "format": img.format,
-            "mode": img.mode
-        }
+        with Image.open(file_path) as img:
+            return {
+                "size": img.size,
+                "format": img.format,
+                "mode": img.mode
+            }
     except Exception as e:
         raise Exception(f"获取文件信息失败: {str(e)}")
 